@@ -1,17 +1,46 @@
 from argparse import ArgumentParser
 from datetime import datetime
-from os import makedirs, remove
-from os.path import isdir, isfile, join
+from os import makedirs, urandom
+from os.path import isdir, join
 
 import ray
+import ray.rllib.ppo.ppo
 from ray.rllib import ppo
+from ray.rllib.ppo.ppo_evaluator import PPOEvaluator
 from ray.tune.registry import register_env, get_registry
 
 from pokebattle_rl_env import PokeBattleEnv
+from pokebattle_rl_env.matchmaking import connect_matchmaker, start_matchmaker
+from pokebattle_rl_env.shared_observations import SharedObservationRing, pack_observations
 from pokebattle_rl_env.showdown_simulator import ShowdownSimulator
 
 # works only with by placing rollout.py at rllib/ppo/rollout.py
 
+OBSERVATION_KEYS = ('observations',)  # The observation columns of the sample batches of PPOEvaluator
+
+
+class SharedObservationEvaluator(PPOEvaluator):
+    """A PPOEvaluator that writes the observations of the sample batches of a remote worker into a
+    SharedObservationRing, so that only their sequence numbers are sent to the learner (see rollout.py). The ring holds
+    twice the steps of a training batch and of a sample, so the learner can concatenate a training batch before the
+    worker wraps around."""
+    def __init__(self, registry, env_creator, config, logdir, is_remote):
+        super().__init__(registry, env_creator, config, logdir, is_remote)
+        self.observation_ring = None
+        if is_remote:
+            capacity = 2 * (config['timesteps_per_batch'] + max(config['horizon'], config['min_steps_per_task']))
+            self.observation_ring = SharedObservationRing(capacity, self.env.observation_space.shape)
+
+    def sample(self):
+        samples = super().sample()
+        if self.observation_ring is not None:
+            pack_observations(samples.data, self.observation_ring, keys=OBSERVATION_KEYS)
+        return samples
+
+    def observation_ring_spec(self):
+        return self.observation_ring.spec
+
+
 parser = ArgumentParser()
 parser.add_argument('-o', '--output', type=str, default='', help='Path to the output directory for the learned model')
 parser.add_argument('-i', '--iterations', type=int, default=1000, help='Amount of iterations to train the model in')
@@ -19,6 +48,9 @@ parser.add_argument('-s', '--save-iterations', type=int, default=10, help='Amoun
 parser.add_argument('-b', '--batch-steps', type=int, default=200, help='The amount of steps to collect for each training batch')
 parser.add_argument('-w', '--workers', type=int, default=2, help='The number of actors to use.')
 parser.add_argument('-r', '--restore', type=str, default=None, help='The directory to restore a saved model from')
+parser.add_argument('-p', '--self-play', action='store_true', help='Let the workers (on this host) battle each other')
+parser.add_argument('-m', '--shared-observations', action='store_true',
+                    help='Send the observations of the workers (on this host) through shared memory')
 args = parser.parse_args()
 
 output_path = join(args.output, datetime.today().strftime('%Y-%m-%d-%H-%M-%S'))
@@ -26,11 +58,18 @@ logging_path = join(output_path, 'log.txt')
 if not isdir(output_path):
     makedirs(output_path)
 
-if isfile('usernames'):
-    remove('usernames')
-
 env_creator_name = "PokeBattleEnv-v0"
-register_env(env_creator_name, lambda config: PokeBattleEnv(ShowdownSimulator(self_play=False, logging_file=logging_path)))
+if args.self_play:
+    # One matchmaker pairs the agents of all worker processes
+    matchmaker_authkey = urandom(16)
+    matchmaker_manager = start_matchmaker(authkey=matchmaker_authkey)
+    matchmaker_address = matchmaker_manager.address
+    register_env(env_creator_name, lambda config: PokeBattleEnv(ShowdownSimulator(
+        self_play=True, logging_file=logging_path,
+        matchmaker=connect_matchmaker(matchmaker_address, matchmaker_authkey))))
+else:
+    register_env(env_creator_name, lambda config: PokeBattleEnv(ShowdownSimulator(self_play=False,
+                                                                                  logging_file=logging_path)))
 
 ray.init()
 config = ppo.DEFAULT_CONFIG.copy()
@@ -40,7 +79,17 @@ config['horizon'] = 500
 config['min_steps_per_task'] = 1
 config['gamma'] = 1
 config['model']['fcnet_hiddens'] = [2000, 500, 100]
+if args.shared_observations:
+    # Used by PPOAgent to create its evaluators
+    ray.rllib.ppo.ppo.PPOEvaluator = SharedObservationEvaluator
+    ray.rllib.ppo.ppo.RemotePPOEvaluator = ray.remote(SharedObservationEvaluator)
 agent = ppo.PPOAgent(config=config, env=env_creator_name, registry=get_registry())
+if args.shared_observations:
+    # Read by collect_samples in rollout.py, in the order of agent.remote_evaluators
+    agent.config['observation_rings'] = [
+        SharedObservationRing.attach(spec)
+        for spec in ray.get([evaluator.observation_ring_spec.remote() for evaluator in agent.remote_evaluators])]
+    agent.config['observation_keys'] = OBSERVATION_KEYS
 
 if args.restore is not None:
     agent.restore(args.restore)
@@ -0,0 +1,25 @@
+from os.path import dirname, join
+from timeit import repeat
+
+from pokebattle_rl_env.replay import read_protocol_log
+
+BATTLE_EXAMPLE = join(dirname(dirname(__file__)), 'battle_example.txt')
+
+
+def read_frames(path=BATTLE_EXAMPLE):
+    """Reads the frames received from the server (prefixed by `<< `) out of a protocol log like `battle_example.txt`.
+    Frames sent to the server (prefixed by `>> `) are skipped."""
+    with open(path, 'r', encoding='utf-8') as file:
+        return [msg for kind, msg in read_protocol_log(file.read()) if kind == 'recv']
+
+
+def read_battle_frames(path=BATTLE_EXAMPLE):
+    """Returns the frames of :func:`read_frames` up to and including the first frame announcing the winner."""
+    frames = read_frames(path)
+    end = next((i for i, frame in enumerate(frames) if '\n|win|' in frame), len(frames) - 1)
+    return frames[:end + 1]
+
+
+def time_per_call(func, number, repetitions=5):
+    """Returns the best time per call of `func` in seconds out of `repetitions` runs of `number` calls each."""
+    return min(repeat(func, number=number, repeat=repetitions)) / number
@@ -0,0 +1,30 @@
+"""Compares the list-based reference encoder with :class:`pokebattle_rl_env.game_state.StateEncoder` on the states of
+a recorded battle.
+
+Usage: python -m benchmarks.encoder
+"""
+import numpy as np
+
+from benchmarks.common import read_battle_frames, time_per_call
+from pokebattle_rl_env.game_state import StateEncoder, state_to_list
+from pokebattle_rl_env.showdown_simulator import ShowdownSimulator
+
+
+def main():
+    simulator = ShowdownSimulator()
+    simulator.username = 'fsedfs'
+    for frame in read_battle_frames():
+        simulator._parse_message(frame)
+    state = simulator.state
+    encoder = StateEncoder()
+    reference = np.array(state_to_list(state), dtype=np.float32)
+    assert np.array_equal(encoder.encode(state), reference)
+    reference_time = time_per_call(lambda: np.array(state_to_list(state)), number=20)
+    encoder_time = time_per_call(lambda: encoder.encode(state), number=500)
+    print(f'observation size: {encoder.size}, non-zero entries: {np.count_nonzero(reference)}')
+    print(f'reference encoder: {reference_time * 1e3:.3f} ms')
+    print(f'StateEncoder: {encoder_time * 1e3:.3f} ms ({reference_time / encoder_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Replays `battle_example.txt` through the table-driven :meth:`ShowdownSimulator._parse_message` and through the
+previous `elif` chain, asserts that both produce identical game states and compares their speed.
+
+Usage: python -m benchmarks.parser
+"""
+from logging import debug, warning
+
+import numpy as np
+
+from benchmarks.common import read_battle_frames, time_per_call
+from pokebattle_rl_env.game_state import BattleEffect
+from pokebattle_rl_env.poke_data_queries import ability_name_to_id
+from pokebattle_rl_env.showdown_simulator import ShowdownSimulator, parse_auxiliary_info, parse_boost, \
+    parse_damage_heal, parse_field, parse_item, parse_mega, parse_move, parse_replace, parse_sideeffect, \
+    parse_specieschange, parse_start_end, parse_status, parse_switch, read_state_json, ident_to_pokemon
+
+USERNAME = 'fsedfs'
+
+
+class LegacyShowdownSimulator(ShowdownSimulator):
+    """:class:`ShowdownSimulator` with the `elif`-chain message parser it used before the handler table."""
+    def _parse_message(self, msg):
+        if self.room_id is None and '|init|battle' in msg:
+            self.room_id = msg.split('\n')[0][1:]
+        end = False
+        if not msg.startswith(f'>{self.room_id}'):
+            return False
+        debug(msg)
+        msgs = msg.split('\n')
+        for msg in msgs:
+            info = msg.split('|')
+            if len(info) < 2:
+                continue
+            if info[1] == 'player':
+                if info[3] == self.username:
+                    self.player_short = info[2]
+                    self.state.player.name = info[3]
+                else:
+                    self.opponent = info[3]
+                    self.state.opponent.name = self.opponent
+                    self.opponent_short = info[2]
+            elif info[1] == 'win':
+                winner = msg[len('|win|'):]
+                self.state.state = 'win' if winner == self.state.player.name else 'loss'
+                end = True
+            elif info[1] == 'tie':
+                self.state.state = 'tie'
+                end = True
+            elif info[1] == 'turn':
+                self.state.turn = int(info[2])
+                if self.state.turn == 1:
+                    self.state.state = 'ongoing'
+                end = True
+            elif info[1] == 'html':
+                if info[2] == "<div class=\"broadcast-red\"><b>The battle crashed</b><br />Don't worry, we're working on fixing it.</div>":
+                    self.state.state = 'tie'
+                    end = True
+            elif info[1] == 'request':
+                if info[2].startswith('{"wait":true') and False:  # ToDo: Start battle on first action?
+                    end = True
+                elif info[2] != '' and not info[2].startswith('{"wait":true'):
+                    read_state_json(info[2], self.state)
+                    end = self.state.player.force_switch
+            elif info[1] == 'replace':
+                parse_replace(info, self.state, self.opponent_short)
+            elif info[1] == 'move':
+                parse_move(info, self.state, self.opponent_short)
+            elif info[1] == 'upkeep':
+                for effect in self.state.field_effects + self.state.player_conditions + self.state.opponent_conditions:
+                    effect.turn += 1
+                for pokemon in self.state.player.pokemon + self.state.opponent.pokemon:
+                    for status in pokemon.statuses:
+                        status.turn += 1
+                    if pokemon.statuses:
+                        self.state.mark_dirty(pokemon)
+                pass
+            elif info[1] == 'error':
+                warning(msg)
+            elif info[1] == 'switch' or info[1] == 'drag':
+                parse_switch(info, self.state, self.opponent_short)
+            elif info[1] == '-boost':
+                parse_boost(info, self.state, self.opponent_short)
+            elif info[1] == '-unboost':
+                parse_boost(info, self.state, self.opponent_short, unboost=True)
+            elif info[1] == '-damage' or info[1] == '-heal':
+                parse_damage_heal(info, self.state, self.opponent_short)
+            elif info[1] == '-status':
+                parse_status(info, self.state, self.opponent_short)
+            elif info[1] == '-curestatus':
+                parse_status(info, self.state, self.opponent_short, cure=True)
+            elif info[1] == '-message':
+                if 'lost due to inactivity.' in info[2] or 'forfeited.' in info[2]:
+                    self.state.forfeited = True
+            elif info[1] == '-start':
+                parse_start_end(info, self.state, self.opponent_short)
+            elif info[1] == '-end':
+                parse_start_end(info, self.state, self.opponent_short, start=False)
+            elif info[1] == '-sidestart':
+                parse_sideeffect(info, self.state, self.opponent_short)
+            elif info[1] == '-sideend':
+                parse_sideeffect(info, self.state, self.opponent_short, start=False)
+            elif info[1] == '-weather':
+                if info[2] == 'none':
+                    self.state.weather = None
+                else:
+                    if self.state.weather is not None and info[2] == self.state.weather.name and len(info) > 3 and\
+                       info[3] == '[upkeep]':
+                        self.state.weather.turn += 1
+                    else:
+                        self.state.weather = BattleEffect(info[2])
+            elif info[1] == '-fieldstart':
+                parse_field(info, self.state)
+            elif info[1] == '-fieldend':
+                parse_field(info, self.state, start=False)
+            elif info[1] == '-ability':
+                pokemon = ident_to_pokemon(info[2], self.state, self.opponent_short)
+                ability = ability_name_to_id(info[3])
+                pokemon.ability = ability
+                self.state.mark_dirty(pokemon)
+            elif info[1] == 'endability':
+                pokemon = ident_to_pokemon(info[2], self.state, self.opponent_short)
+                pokemon.ability = None
+                self.state.mark_dirty(pokemon)
+            elif info[1] == 'detailschange':
+                parse_specieschange(info, self.state, self.opponent_short)
+            elif info[1] == '-formechange':
+                parse_specieschange(info, self.state, self.opponent_short, details=True)
+            elif info[1] == '-transform':
+                pokemon = ident_to_pokemon(info[2], self.state, self.opponent_short)
+                to_pokemon = ident_to_pokemon(info[3], self.state, self.opponent_short)
+                pokemon.change_species(to_pokemon.species)
+                pokemon.transformed = True
+                self.state.mark_dirty(pokemon)
+            elif info[1] == '-mega':
+                parse_mega(info, self.state, self.opponent_short)
+            elif info[1] == '-item':
+                parse_item(info, self.state, self.opponent_short)
+            elif info[1] == '-enditem':
+                parse_item(info, self.state, self.opponent_short, start=False)
+            elif info[1] == '-zpower':
+                if self.opponent_short in msg:
+                    self.state.opponent.z_used = True
+                else:
+                    self.state.player.z_used = True
+            # ToDo: |-zpower|POKEMON |move|POKEMON|MOVE|TARGET|[zeffect]
+            if '[of]' in msg:
+                parse_auxiliary_info(info, self.state, self.opponent_short)
+        return end
+
+
+def state_signature(state):
+    """Returns everything of `state` that is relevant for comparing two parsers."""
+    pokemon = [(p.name, p.species, p.health, p.max_health, p.ability, p.item, [s.name for s in p.statuses],
+                [m.id for m in p.moves]) for p in state.player.pokemon + state.opponent.pokemon]
+    return state.state, state.turn, state.forfeited, pokemon, state.to_array().tobytes()
+
+
+def replay(simulator_class, frames):
+    simulator = simulator_class()
+    simulator.username = USERNAME
+    ends = [simulator._parse_message(frame) for frame in frames]
+    return simulator, ends
+
+
+def main():
+    frames = read_battle_frames()
+    np.random.seed(0)
+    legacy, legacy_ends = replay(LegacyShowdownSimulator, frames)
+    np.random.seed(0)
+    simulator, ends = replay(ShowdownSimulator, frames)
+    assert ends == legacy_ends
+    assert state_signature(simulator.state) == state_signature(legacy.state)
+    legacy_time = time_per_call(lambda: replay(LegacyShowdownSimulator, frames), number=20)
+    table_time = time_per_call(lambda: replay(ShowdownSimulator, frames), number=20)
+    print(f'{len(frames)} frames, identical game states')
+    print(f'elif chain: {len(frames) / legacy_time:.0f} frames/s')
+    print(f'handler table: {len(frames) / table_time:.0f} frames/s ({legacy_time / table_time:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
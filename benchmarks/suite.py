@@ -0,0 +1,194 @@
+"""Measures the latency of the components of a step and the end-to-end throughput of the environment, offline.
+
+Each benchmark reports named results with their unit. The results are printed and, with `--output`, appended as one
+JSON line (along with the commit and the versions of Python and NumPy) to a file, so that regressions can be tracked
+from commit to commit.
+
+Usage: python -m benchmarks.suite [--output results.jsonl] [--only parse encode ...]
+"""
+import platform
+import subprocess
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from json import dumps
+from time import perf_counter
+
+import numpy as np
+
+from benchmarks.common import BATTLE_EXAMPLE, read_battle_frames, time_per_call
+from pokebattle_rl_env.game_state import GameState, IndexEncoder, StateEncoder
+from pokebattle_rl_env.local_simulator import LocalSimulator
+from pokebattle_rl_env.pokebattle_env import PokeBattleEnv
+from pokebattle_rl_env.scripted_server import ScriptedShowdownServer, read_battle_scripts
+from pokebattle_rl_env.showdown_simulator import ShowdownSimulator, read_state_json
+
+USERNAME = 'fsedfs'
+
+
+class ReplayWebSocket:
+    """Stands in for the websocket of a :class:`ShowdownSimulator` by replaying recorded frames in a loop, ignoring
+    the commands sent."""
+    def __init__(self, frames):
+        self.frames = frames
+        self.position = 0
+
+    def send(self, cmd):
+        pass
+
+    def recv(self):
+        frame = self.frames[self.position]
+        self.position = (self.position + 1) % len(self.frames)
+        return frame
+
+
+def parsed_simulator(frames):
+    simulator = ShowdownSimulator()
+    simulator.username = USERNAME
+    for frame in frames:
+        simulator._parse_message(frame)
+    return simulator
+
+
+def last_request(frames):
+    """Returns the JSON of the last `|request|` asking for a move."""
+    frame = next(frame for frame in reversed(frames) if '\n|request|{"active"' in frame)
+    line = next(line for line in frame.split('\n') if line.startswith('|request|'))
+    return line[len('|request|'):]
+
+
+def bench_encode(frames):
+    state = parsed_simulator(frames).state
+    encoder = StateEncoder()
+    index_encoder = IndexEncoder()
+    return {
+        'encode.to_array': (time_per_call(state.to_array, number=200) * 1e6, 'us'),
+        'encode.state_encoder': (time_per_call(lambda: encoder.encode(state), number=500) * 1e6, 'us'),
+        'encode.index_encoder': (time_per_call(lambda: index_encoder.encode(state), number=500) * 1e6, 'us'),
+    }
+
+
+def bench_parse(frames):
+    def replay():
+        simulator = ShowdownSimulator()
+        simulator.username = USERNAME
+        for frame in frames:
+            simulator._parse_message(frame)
+    return {'parse.frames_per_second': (len(frames) / time_per_call(replay, number=20), 'frames/s')}
+
+
+def bench_request(frames):
+    request = last_request(frames)
+    state = parsed_simulator(frames).state
+    cache = {}
+    read_state_json(request, state, cache)
+    return {
+        'request.read_state_json': (time_per_call(lambda: read_state_json(request, state), number=500) * 1e6, 'us'),
+        'request.read_state_json_cached': (
+            time_per_call(lambda: read_state_json(request, state, cache), number=500) * 1e6, 'us'),
+    }
+
+
+def bench_actions(frames):
+    simulator = parsed_simulator(frames[:-1])  # Before the battle ended
+    return {
+        'actions.get_available_actions': (time_per_call(simulator.get_available_actions, number=2000) * 1e6, 'us'),
+        'actions.get_action_mask': (time_per_call(simulator.get_action_mask, number=2000) * 1e6, 'us'),
+    }
+
+
+def steps_per_second(env, reset, steps):
+    """Steps `env` with the first available action for `steps` steps and returns the number of steps per second."""
+    reset()
+    start = perf_counter()
+    for _ in range(steps):
+        _, _, done, _ = env.step(np.flatnonzero(env.action_mask[:9])[0])
+        if done:
+            reset()
+    return steps / (perf_counter() - start)
+
+
+def bench_step(frames, steps=2000):
+    simulator = ShowdownSimulator()
+    simulator.username = USERNAME
+    simulator.ws = ReplayWebSocket(frames)
+    showdown_env = PokeBattleEnv(simulator, action_mode='discrete')
+
+    def reset_showdown():
+        simulator.state = GameState()
+        simulator.room_id = None
+        simulator.request_cache = {}
+        simulator.ws.position = 0
+        simulator._update_state()
+        showdown_env.update_action_mask()
+
+    local_env = PokeBattleEnv(LocalSimulator(), action_mode='discrete')
+    local_env.seed(0)
+    return {
+        'step.showdown_replay': (steps_per_second(showdown_env, reset_showdown, steps), 'steps/s'),
+        'step.local_simulator': (steps_per_second(local_env, local_env.reset, steps), 'steps/s'),
+    }
+
+
+def bench_server(frames, steps=1000):
+    """Steps a :class:`ShowdownSimulator` connected to a local :class:`ScriptedShowdownServer` over a real
+    WebSocket."""
+    with open(BATTLE_EXAMPLE, 'r', encoding='utf-8') as file:
+        server = ScriptedShowdownServer(read_battle_scripts(file.read())[:1])
+    server.start()
+    env = PokeBattleEnv(ShowdownSimulator(connection=server.connection), action_mode='discrete')
+    try:
+        return {'step.scripted_server': (steps_per_second(env, env.reset, steps), 'steps/s')}
+    finally:
+        env.close()
+        server.stop()
+
+
+BENCHMARKS = {
+    'encode': bench_encode,
+    'parse': bench_parse,
+    'request': bench_request,
+    'actions': bench_actions,
+    'step': bench_step,
+    'server': bench_server,
+}
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names=None):
+    """Runs the benchmarks `names` (all by default) and returns a record of their results."""
+    frames = read_battle_frames()
+    results = {}
+    for name in names or BENCHMARKS:
+        for result, (value, unit) in BENCHMARKS[name](frames).items():
+            results[result] = {'value': value, 'unit': unit}
+    return {
+        'commit': current_commit(),
+        'time': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def main():
+    parser = ArgumentParser(description='Benchmarks the components of the environment')
+    parser.add_argument('-o', '--output', type=str, default=None, help='File to append the results to as a JSON line')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='The benchmarks to run')
+    args = parser.parse_args()
+    record = run(args.only)
+    for name, result in record['results'].items():
+        print(f'{name}: {result["value"]:.2f} {result["unit"]}')
+    if args.output is not None:
+        with open(args.output, 'a', encoding='utf-8') as file:
+            file.write(dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+    main()
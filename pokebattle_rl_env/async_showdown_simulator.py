@@ -0,0 +1,278 @@
+"""An asyncio backend for Pokemon Showdown, which runs many battles concurrently in a single process.
+
+A single :class:`AsyncShowdownClient` keeps one authenticated WebSocket connection open and routes the frames of each
+battle room (`>battle-...`) to the :class:`AsyncShowdownSimulator` playing in it. While one battle waits for its
+opponent, the others keep running, so one CPU core can drive dozens of battles instead of waiting on network
+round-trips. Use several clients as a pool to start more battles at once, as a client only searches for one battle at a
+time.
+
+Requires the `websockets <https://websockets.readthedocs.io>`_ package.
+"""
+import asyncio
+from collections import deque
+from logging import debug, info
+from ssl import CERT_NONE, create_default_context
+from time import perf_counter
+
+import websockets
+
+from pokebattle_rl_env.game_state import GameState
+from pokebattle_rl_env.showdown_simulator import DEFAULT_LOCAL_CONNECTION, ShowdownSimulator, attack_command, \
+    authenticate, switch_command
+
+DEFAULT_BATTLE_FORMAT = 'gen7unratedrandombattle'
+DEFAULT_SEARCH_TIMEOUT = 60
+
+
+def frame_room_id(msg):
+    """Returns the id of the room a frame belongs to or None if the frame does not belong to a room.
+
+    Examples:
+        >>> frame_room_id('>battle-gen7randombattle-1\\n|turn|2')
+        'battle-gen7randombattle-1'
+        >>> frame_room_id('|updateuser|fsedfs|1|1')
+    """
+    if not msg.startswith('>'):
+        return None
+    return msg.split('\n', 1)[0][1:]
+
+
+class AsyncShowdownClient:
+    """A connection to a Pokemon Showdown instance shared by many :class:`AsyncShowdownSimulator`.
+
+    Create and use clients from within a running event loop.
+
+    Attributes:
+        auth (str): The authentication method, see :attr:`ShowdownSimulator.auth`.
+        connection (:class:`pokebattle_rl_env.showdown_simulator.ShowdownConnection`): The Pokemon Showdown instance to
+            connect to.
+        battle_format (str): The format to search battles in.
+        username (str): The username of the logged in user.
+        battles (dict): Maps the ids of the rooms of ongoing battles to the simulators playing in them.
+        search_timeout (float): The maximum time in seconds to wait for the room of a searched battle, e.g. if the
+            server rejected the search.
+        connection_error (ConnectionError): Why the frames stopped being received, or None while connected. Battles
+            waiting for frames or rooms then raise it.
+    """
+    def __init__(self, auth='', connection=DEFAULT_LOCAL_CONNECTION, battle_format=DEFAULT_BATTLE_FORMAT,
+                 search_timeout=DEFAULT_SEARCH_TIMEOUT):
+        self.auth = auth
+        self.connection = connection
+        self.battle_format = battle_format
+        self.search_timeout = search_timeout
+        self.connection_error = None
+        self.username = None
+        self.password = None
+        self.ws = None
+        self.battles = {}
+        self.waiting = deque()
+        self.search_lock = None
+        self.receiver = None
+
+    async def connect(self):
+        """Connects to the WebSocket endpoint, logs in and starts routing received frames."""
+        ssl = None
+        if self.connection.ws_ssl:
+            ssl = create_default_context()
+            ssl.check_hostname = False
+            ssl.verify_mode = CERT_NONE
+        ws = await websockets.connect(self.connection.ws_url, ssl=ssl, max_size=None)
+        debug('Connected to Showdown socket')
+        msg = ''
+        while not msg.startswith('|challstr|'):
+            msg = await ws.recv()
+        challstr = msg[msg.find('|challstr|') + len('|challstr|'):]
+        loop = asyncio.get_event_loop()
+        self.username, self.password, assertion = await loop.run_in_executor(None, authenticate, self.auth, challstr,
+                                                                             self.connection.login_server)
+        await ws.send(f'|/trn {self.username},0,{assertion}')
+        msg = ''
+        while not msg.startswith('|updateuser|') and self.username not in msg:
+            msg = await ws.recv()
+            debug(msg)
+        info('Using username %s with password %s', self.username, self.password)
+        self.start(ws)
+
+    def start(self, ws):
+        """Starts routing the frames received on the already authenticated WebSocket `ws`."""
+        self.ws = ws
+        self.search_lock = asyncio.Lock()
+        self.receiver = asyncio.ensure_future(self._receive())
+
+    async def _receive(self):
+        error = None
+        try:
+            async for msg in self.ws:
+                self.route(msg)
+        except Exception as e:
+            error = e
+        finally:
+            self.disconnect(error)
+
+    def disconnect(self, cause=None):
+        """Wakes up all battles waiting for frames or rooms after the frames stopped being received, so that they raise
+        :attr:`connection_error` instead of waiting forever."""
+        self.connection_error = ConnectionError(f'Connection to Showdown lost: {cause!r}' if cause is not None else
+                                                'Connection to Showdown closed')
+        self.connection_error.__cause__ = cause
+        for battle in self.battles.values():
+            battle.frames.put_nowait(None)
+        for battle in self.waiting:
+            battle.room_assigned.set()
+
+    def route(self, msg):
+        """Passes a received frame to the simulator playing in the frame's room. A frame initializing a new battle room
+        is passed to the simulator waiting longest for a battle. Frames of other rooms are dropped."""
+        room_id = frame_room_id(msg)
+        if room_id is None:
+            debug(msg)
+            return
+        battle = self.battles.get(room_id)
+        if battle is None:
+            if '|init|battle' not in msg or not self.waiting:
+                return
+            battle = self.waiting.popleft()
+            battle.room_id = room_id
+            self.battles[room_id] = battle
+            battle.room_assigned.set()
+        battle.frames.put_nowait(msg)
+
+    async def send(self, msg):
+        debug(msg)
+        await self.ws.send(msg)
+
+    async def search(self, battle):
+        """Searches a battle for `battle` and waits until its room has been created.
+
+        Raises:
+            asyncio.TimeoutError: If no room was created within :attr:`search_timeout` seconds. The search is cancelled.
+            ConnectionError: If the connection was lost.
+        """
+        async with self.search_lock:
+            if self.connection_error is not None:
+                raise self.connection_error
+            battle.room_assigned = asyncio.Event()
+            self.waiting.append(battle)
+            await self.send('|/utm null')  # Team
+            await self.send(f'|/search {self.battle_format}')
+            try:
+                await asyncio.wait_for(battle.room_assigned.wait(), self.search_timeout)
+            except asyncio.TimeoutError:
+                if battle in self.waiting:
+                    self.waiting.remove(battle)
+                await self.send(f'|/cancelsearch {self.battle_format}')
+                raise
+            if self.connection_error is not None and battle in self.waiting:
+                self.waiting.remove(battle)
+                raise self.connection_error
+
+    def create_battle(self, battle_log=None):
+        """Returns a new :class:`AsyncShowdownSimulator` using this client, recording its battles to `battle_log`.
+        Call :meth:`AsyncShowdownSimulator.reset` to start its first battle."""
+        return AsyncShowdownSimulator(self, battle_log=battle_log)
+
+    async def close(self):
+        """Closes the connection to the WebSocket endpoint."""
+        if self.receiver is not None:
+            self.receiver.cancel()
+        await self.ws.close()
+        info('Connection to Showdown Socket closed')
+
+
+class AsyncShowdownSimulator(ShowdownSimulator):
+    """A :class:`pokebattle_rl_env.showdown_simulator.ShowdownSimulator` playing over a shared
+    :class:`AsyncShowdownClient`, with awaitable :meth:`act` and :meth:`reset`.
+
+    Only searching for battles is supported, not self play. Create instances with
+    :meth:`AsyncShowdownClient.create_battle`.
+
+    Attributes:
+        client (:class:`AsyncShowdownClient`): The client to play over.
+        frames (:class:`asyncio.Queue`): The frames of the current battle room not yet parsed.
+    """
+    def __init__(self, client, battle_log=None):
+        super().__init__(auth=client.auth, connection=client.connection, battle_log=battle_log)
+        self.client = client
+        self.username = client.username
+        self.frames = asyncio.Queue()
+        self.room_assigned = asyncio.Event()
+
+    async def act(self, action, modifiers):
+        self.state.player.force_switch = False
+        if action.mode == 'attack':
+            await self._send_choice(attack_command(self.room_id, action.number, 'mega' in modifiers, 'z' in modifiers))
+        elif action.mode == 'switch':
+            await self._send_choice(switch_command(self.room_id, action.number))
+            pokemon_list = self.state.player.pokemon
+            pokemon_list[0], pokemon_list[action.number - 1] = pokemon_list[action.number - 1], pokemon_list[0]
+        else:
+            raise ValueError(f'Invalid action mode {action.mode}')
+        await self._update_state()
+
+    async def _send_choice(self, cmd):
+        if self.battle_log is not None:
+            self.battle_log.record('send', cmd)
+        await self.client.send(cmd)
+
+    async def _next_frame(self):
+        """Waits for the next frame of the battle room.
+
+        Raises:
+            ConnectionError: If the connection of :attr:`client` was lost.
+        """
+        if self.frames.empty() and self.client.connection_error is not None:
+            raise self.client.connection_error
+        msg = await self.frames.get()
+        if msg is None:
+            self.frames.put_nowait(None)  # For later calls
+            raise self.client.connection_error
+        return msg
+
+    async def _update_state(self):
+        end = False
+        profiler = self.profiler
+        try:
+            while not end:
+                if profiler is None:
+                    msg = await self._next_frame()
+                    end = self._parse_message(msg)
+                else:
+                    start = perf_counter()
+                    msg = await self._next_frame()
+                    received = perf_counter()
+                    end = self._parse_message(msg)
+                    profiler.record('recv', received - start)
+                    profiler.record('parse', perf_counter() - received)
+                    profiler.count('frames')
+                    profiler.count('bytes_received', len(msg))
+        except Exception:
+            self._fail_battle_log()
+            raise
+
+    async def _leave(self):
+        if self.state.state == 'ongoing':
+            await self.client.send(f'{self.room_id}|/forfeit')
+        if self.room_id is not None:
+            await self.client.send(f'|/leave {self.room_id}')
+            del self.client.battles[self.room_id]
+            if self.battle_log is not None:
+                self.battle_log.finish(self.room_id)
+            self.room_id = None
+            self.state = GameState()
+            self.request_cache = {}
+            self.frames = asyncio.Queue()
+
+    async def reset(self):
+        """Leaves the current battle, if there is one, and waits until a new battle has started."""
+        await self._leave()
+        self.username = self.client.username
+        await self.client.search(self)
+        await self._update_state()
+        await self.client.send(f'{self.room_id}|/timer on')
+        debug('Playing against %s', self.opponent)
+
+    async def close(self):
+        """Leaves the current battle and writes the pending battle logs. The connection of :attr:`client` stays open."""
+        await self._leave()
+        if self.battle_log is not None:
+            self.battle_log.close()
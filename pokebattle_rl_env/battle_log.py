@@ -0,0 +1,130 @@
+"""Bounded per-battle logs of the Showdown protocol, written only for sampled or failed battles.
+
+A :class:`BattleLog` keeps the frames received and the commands sent in the current battle in a ring buffer of at most
+:attr:`BattleLog.capacity` entries. Recording a frame only appends a reference to it, the frames are formatted and
+written by a background thread once the battle is finished, and only if the battle was sampled (see
+:attr:`BattleLog.sample_rate`) or failed. Each log is written as a gzip-compressed file `<room id>.log.gz` in the
+format of `battle_example.txt`, so :func:`pokebattle_rl_env.replay.read_protocol_log` and
+:func:`pokebattle_rl_env.scripted_server.read_battle_scripts` can read it back::
+
+    simulator = ShowdownSimulator(battle_log=BattleLog('logs', sample_rate=0.01))
+"""
+import gzip
+from collections import deque
+from logging import warning
+from os import listdir, makedirs, remove
+from os.path import getmtime, join
+from queue import Queue
+from random import Random
+from threading import Thread
+
+DEFAULT_CAPACITY = 10000
+DEFAULT_MAX_FILES = 100
+LOG_SUFFIX = '.log.gz'
+DIRECTION_PREFIXES = {'recv': '<< ', 'send': '>> '}
+
+
+def format_protocol_log(events):
+    """Formats events like the ones returned by :func:`pokebattle_rl_env.replay.read_protocol_log` as a protocol log.
+
+    Examples:
+        >>> print(format_protocol_log([('recv', '>battle-1\\n|turn|1'), ('send', 'battle-1|/choose move 1|2')]))
+        << >battle-1
+        |turn|1
+        >> battle-1|/choose move 1|2
+    """
+    return '\n'.join(DIRECTION_PREFIXES[direction] + msg for direction, msg in events)
+
+
+class BattleLog:
+    """Records the protocol messages of the battles of one simulator, see the module documentation.
+
+    Attributes:
+        directory (str): The directory to write the logs to. Created if it does not exist.
+        capacity (int): The maximum number of messages kept per battle. Older messages of a battle are dropped.
+        sample_rate (float): The probability of writing the log of a battle that did not fail.
+        max_files (int): The maximum number of logs kept in :attr:`directory`. The oldest logs are removed first.
+        events (:class:`collections.deque`): The directions and messages recorded in the current battle.
+        failed (bool): Whether the current battle failed, e.g. due to an `|error|` message or an exception.
+    """
+    def __init__(self, directory, capacity=DEFAULT_CAPACITY, sample_rate=0.0, max_files=DEFAULT_MAX_FILES, seed=None):
+        self.directory = directory
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.random = Random(seed)
+        self.events = deque(maxlen=capacity)
+        self.failed = False
+        self.queue = Queue()
+        self.thread = None
+        makedirs(directory, exist_ok=True)
+        self.files = deque(sorted((join(directory, name) for name in listdir(directory) if name.endswith(LOG_SUFFIX)),
+                                  key=getmtime))
+
+    def record(self, direction, msg):
+        """Records a message of the current battle. `direction` is `'recv'` for received frames and `'send'` for sent
+        commands."""
+        self.events.append((direction, msg))
+
+    def fail(self):
+        """Marks the current battle as failed, so that its log is written when it is finished."""
+        self.failed = True
+
+    def finish(self, room_id):
+        """Ends the current battle in room `room_id` and hands its log to the writer thread if the battle was sampled or
+        failed. Recording starts over for the next battle."""
+        events, failed = self.events, self.failed
+        self.events = deque(maxlen=self.capacity)
+        self.failed = False
+        if not events or not (failed or self.random.random() < self.sample_rate):
+            return
+        if self.thread is None:
+            self.thread = Thread(target=self._write_logs, daemon=True)
+            self.thread.start()
+        self.queue.put((room_id, events))
+
+    def flush(self):
+        """Waits until the logs of all finished battles have been written."""
+        self.queue.join()
+
+    def close(self, room_id=None):
+        """Finishes the current battle (if `room_id` is given), writes all pending logs and stops the writer thread."""
+        if room_id is not None:
+            self.finish(room_id)
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _write_logs(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self._write_log(*item)
+            except OSError as error:
+                warning('Could not write battle log: %s', error)
+            finally:
+                self.queue.task_done()
+
+    def _write_log(self, room_id, events):
+        path = join(self.directory, room_id + LOG_SUFFIX)
+        with gzip.open(path, 'wt', encoding='utf-8') as file:
+            file.write(format_protocol_log(events))
+        if path in self.files:
+            self.files.remove(path)
+        self.files.append(path)
+        while len(self.files) > self.max_files:
+            oldest = self.files.popleft()
+            try:
+                remove(oldest)
+            except FileNotFoundError:
+                pass
+
+
+def read_battle_log(path):
+    """Returns the text of a log written by :class:`BattleLog`, e.g. to pass it to
+    :func:`pokebattle_rl_env.replay.read_protocol_log`."""
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return file.read()
@@ -1,3 +1,5 @@
+import numpy as np
+
 from pokebattle_rl_env.game_state import GameState
 from pokebattle_rl_env.poke_data_queries import items
 
@@ -11,11 +13,51 @@ class Action:
 default_actions = [Action(mode='attack', number=i) for i in range(1, 5)] + [Action(mode='switch', number=i) for i in
                                                                             range(2, 7)]
 default_action_modifiers = ['mega', 'z']
+NUM_ACTIONS = len(default_actions)
+
+
+def action_to_index(action):
+    """Returns the position of `action` in the action space of :class:`pokebattle_rl_env.pokebattle_env.PokeBattleEnv`
+    (moves 1-4 at 0-3, switches to pokemon 2-6 at 4-8).
+
+    Examples:
+        >>> action_to_index(Action('attack', 1)), action_to_index(Action('switch', 2))
+        (0, 4)
+    """
+    return action.number - 1 if action.mode == 'attack' else action.number + 2
+
+
+# The modifiers of each modifier index of :func:`modifiers_to_index`
+modifier_options = [[], ['mega'], ['z']]
+# action_table[modifier index][action index] holds the action and modifiers to pass to :meth:`BattleSimulator.act`
+action_table = [[(action, modifiers) for action in default_actions] for modifiers in modifier_options]
+
+
+def modifiers_to_index(modifiers):
+    """Returns 0 if `modifiers` is empty, 1 for a mega evolution and 2 for a z move.
+
+    Examples:
+        >>> modifiers_to_index([]), modifiers_to_index(['mega']), modifiers_to_index(['z'])
+        (0, 1, 2)
+    """
+    if 'mega' in modifiers:
+        return 1
+    if 'z' in modifiers:
+        return 2
+    return 0
 
 
 class BattleSimulator:
+    """The base class of the backends running battles.
+
+    Attributes:
+        state (:class:`pokebattle_rl_env.game_state.GameState`): The state of the current battle.
+        profiler (:class:`pokebattle_rl_env.profiling.Profiler`): Records the time spent receiving and parsing
+            messages, if not None.
+    """
     def __init__(self):
         self.state = GameState()
+        self.profiler = None
 
     def _attack(self, move, mega=False, z=False):
         raise NotImplementedError
@@ -23,26 +65,37 @@ class BattleSimulator:
     def _switch(self, pokemon):
         raise NotImplementedError
 
-    def get_available_actions(self):
-        actions = []
+    def get_action_mask(self):
+        """Returns which actions and modifiers are currently available.
+
+        Returns:
+            :class:`numpy.ndarray`: A boolean mask aligned with the action space of
+            :class:`pokebattle_rl_env.pokebattle_env.PokeBattleEnv`: the actions in the order of :func:`action_to_index`
+            followed by the modifiers in the order of :data:`default_action_modifiers`.
+        """
+        mask = np.zeros(NUM_ACTIONS + len(default_action_modifiers), dtype=bool)
+        for modifier in self.get_available_modifiers():
+            mask[NUM_ACTIONS + default_action_modifiers.index(modifier)] = True
         if all([p.unknown for p in self.state.player.pokemon]):
-            return default_actions
+            mask[:NUM_ACTIONS] = True
+            return mask
         active = self.state.player.pokemon[0]
         if not self.state.player.force_switch:
             if active.recharge:
-                actions.append(Action('attack', 1))
+                mask[0] = True
             else:
-                enabled_moves_ix = 1
                 for i in range(len(active.moves)):
                     if not active.moves[i].disabled:
-                        ix = enabled_moves_ix if active.locked_move_first_index else i + 1
-                        actions.append(Action('attack', ix))
+                        mask[0 if active.locked_move_first_index else i] = True
         if not active.trapped:
             for i in range(1, len(self.state.player.pokemon)):
-                pokemon = self.state.player.pokemon[i]
-                if pokemon.health > 0:
-                    actions.append(Action('switch', i + 1))
-        return actions
+                if self.state.player.pokemon[i].health > 0:
+                    mask[i + 3] = True
+        return mask
+
+    def get_available_actions(self):
+        mask = self.get_action_mask()
+        return [default_actions[i] for i in range(NUM_ACTIONS) if mask[i]]
 
     def get_available_modifiers(self):
         if all([p.unknown for p in self.state.player.pokemon]):
@@ -75,6 +128,14 @@ class BattleSimulator:
     def _update_state(self):
         raise NotImplementedError
 
+    def seed(self, seed=None):
+        """Seeds the randomness of the simulator, if it has any under its control.
+
+        Returns:
+            list: The seeds used.
+        """
+        return []
+
     def render(self, mode='human'):
         raise NotImplementedError
 
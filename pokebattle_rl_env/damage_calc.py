@@ -0,0 +1,170 @@
+"""Vectorized type effectiveness and damage range estimation.
+
+The type chart is compiled into a dense matrix once at import, so matchups are plain array lookups. Damage ranges are
+estimated with the damage formula of generation 7 (without abilities, items and critical hits) for all moves of an
+attacker against all pokemon of a team at once.
+"""
+import numpy as np
+
+from pokebattle_rl_env.game_state import calc_boosted_stat, calc_stat
+from pokebattle_rl_env.poke_data_queries import get_pokemon_by_species, moves, normalize_name, typechart
+
+TYPE_MULTIPLIERS = {0: 1, 1: 2, 2: .5, 3: 0}  # Codes of `damageTaken` in the type chart
+types = sorted(typechart)
+type_ids = {t: i for i, t in enumerate(types)}
+NO_TYPE = len(types)  # Id of the missing second type of mono-typed pokemon
+BOOST_MULTIPLIERS = np.array([calc_boosted_stat(1, boost) for boost in range(-6, 7)])
+# Keyed by normalized names, as the dex (e.g. `sunnyday`) and the protocol (e.g. `SunnyDay`) spell weathers differently
+WEATHER_TYPE_MULTIPLIERS = {
+    normalize_name('RainDance'): {'Water': 1.5, 'Fire': .5},
+    normalize_name('SunnyDay'): {'Fire': 1.5, 'Water': .5},
+}
+MAX_MOVES = 4
+MAX_POKEMON = 6
+
+
+def build_type_matrix():
+    """Builds the matrix of the damage multiplier of each attacking type (rows) against each defending type (columns).
+    The last column stands for no type and is always 1."""
+    matrix = np.ones((len(types), len(types) + 1))
+    for defending, entry in typechart.items():
+        for attacking, code in entry['damageTaken'].items():
+            if attacking in type_ids:
+                matrix[type_ids[attacking], type_ids[defending]] = TYPE_MULTIPLIERS[code]
+    return matrix
+
+
+type_matrix = build_type_matrix()
+# type_effectiveness_matrix[attacking, first defending, second defending] for pokemon with one or two types
+type_effectiveness_matrix = type_matrix[:, :, None] * type_matrix[:, None, :]
+
+
+def type_pair_ids(defender_types):
+    """Returns the ids of the (up to) two types of a pokemon, using :const:`NO_TYPE` for a missing type.
+
+    Examples:
+        >>> [types[i] for i in type_pair_ids(['Dragon', 'Ground'])]
+        ['Dragon', 'Ground']
+        >>> type_pair_ids(['Fire'])[1] == NO_TYPE
+        True
+    """
+    ids = [type_ids[t] for t in defender_types[:2]]
+    return ids + [NO_TYPE] * (2 - len(ids))
+
+
+def type_effectiveness(move_type, defender_types):
+    """Returns the damage multiplier of a move of type `move_type` against a pokemon of types `defender_types`.
+
+    Examples:
+        >>> type_effectiveness('Ground', ['Electric', 'Flying'])
+        0.0
+        >>> type_effectiveness('Ice', ['Dragon', 'Ground'])
+        4.0
+    """
+    first, second = type_pair_ids(defender_types)
+    return float(type_effectiveness_matrix[type_ids[move_type], first, second])
+
+
+def boost_multipliers(boosts):
+    """Vectorized :func:`pokebattle_rl_env.game_state.calc_boosted_stat` multipliers of an array of boost stages."""
+    return BOOST_MULTIPLIERS[np.clip(boosts, -6, 6) + 6]
+
+
+def pokemon_types(pokemon):
+    return pokemon.types or get_pokemon_by_species(pokemon.species)['types']
+
+
+def pokemon_stat(pokemon, stat):
+    """Returns the stat `stat` of `pokemon`, estimated from its base stats if unknown."""
+    if pokemon.stats and stat in pokemon.stats:
+        return pokemon.stats[stat]
+    return calc_stat(get_pokemon_by_species(pokemon.species)['baseStats'][stat], pokemon.level)
+
+
+def max_health(pokemon):
+    """Returns the maximum HP of `pokemon`, estimated from its base stats if only the percentage is known."""
+    if pokemon.max_health is not None and pokemon.max_health != 100:
+        return pokemon.max_health
+    return calc_stat(get_pokemon_by_species(pokemon.species)['baseStats']['hp'], pokemon.level, hp=True)
+
+
+def weather_type_multipliers(weather):
+    """Returns the damage multipliers of the move types boosted or weakened by the weather named `weather` in any
+    spelling.
+
+    Examples:
+        >>> weather_type_multipliers('SunnyDay') == weather_type_multipliers('sunnyday')
+        True
+        >>> weather_type_multipliers(None)
+        {}
+    """
+    if weather is None:
+        return {}
+    return WEATHER_TYPE_MULTIPLIERS.get(normalize_name(weather), {})
+
+
+def estimate_damage(attacker, defenders, weather=None):
+    """Estimates the damage range of every move of `attacker` against every pokemon of `defenders`.
+
+    Status moves, missing moves and unknown defenders are estimated to deal no damage.
+
+    Args:
+        attacker (:class:`pokebattle_rl_env.game_state.Pokemon`): The attacking pokemon.
+        defenders (list): The :class:`pokebattle_rl_env.game_state.Pokemon` to attack.
+        weather (str): The name of the current weather.
+
+    Returns:
+        tuple: The minimum and maximum damage of shape `(4, len(defenders))` as fractions of the maximum HP of the
+        defenders.
+    """
+    move_entries = [moves[move.id] for move in attacker.moves[:MAX_MOVES]]
+    damage_shape = (MAX_MOVES, len(defenders))
+    known = [not pokemon.unknown and pokemon.species is not None for pokemon in defenders]
+    if not move_entries or attacker.species is None or not any(known):
+        return np.zeros(damage_shape), np.zeros(damage_shape)
+    weather_multipliers = weather_type_multipliers(weather)
+    base_power = np.array([move['basePower'] if move['category'] != 'Status' else 0 for move in move_entries])
+    physical = np.array([move['category'] == 'Physical' for move in move_entries])
+    move_types = np.array([type_ids[move['type']] for move in move_entries])
+    attacker_types = pokemon_types(attacker)
+    move_modifiers = np.array([(1.5 if move['type'] in attacker_types else 1) * weather_multipliers.get(move['type'], 1)
+                               for move in move_entries])
+    burned = any(status.name == 'brn' for status in attacker.statuses)
+    move_modifiers[physical] *= .5 if burned else 1
+    boosts = attacker.stat_boosts
+    attack = np.where(physical, pokemon_stat(attacker, 'atk') * boost_multipliers(boosts['atk']),
+                      pokemon_stat(attacker, 'spa') * boost_multipliers(boosts['spa']))
+
+    defense = np.ones((2, len(defenders)))
+    defender_types = np.full((len(defenders), 2), NO_TYPE)
+    health = np.ones(len(defenders))
+    for i, pokemon in enumerate(defenders):
+        if not known[i]:
+            continue
+        defense[0, i] = pokemon_stat(pokemon, 'def') * boost_multipliers(pokemon.stat_boosts['def'])
+        defense[1, i] = pokemon_stat(pokemon, 'spd') * boost_multipliers(pokemon.stat_boosts['spd'])
+        defender_types[i] = type_pair_ids(pokemon_types(pokemon))
+        health[i] = max_health(pokemon)
+
+    defense = np.where(physical[:, None], defense[0], defense[1])
+    effectiveness = type_effectiveness_matrix[move_types[:, None], defender_types[:, 0], defender_types[:, 1]]
+    level_factor = np.floor(2 * attacker.level / 5 + 2)
+    base = np.floor(np.floor(level_factor * base_power[:, None] * attack[:, None] / defense) / 50) + 2
+    modifier = move_modifiers[:, None] * effectiveness
+    hits = (base_power[:, None] > 0) & (effectiveness > 0) & np.array(known)
+    minimum = np.where(hits, np.maximum(np.floor(base * .85 * modifier), 1), 0) / health
+    maximum = np.where(hits, np.maximum(np.floor(base * modifier), 1), 0) / health
+    pad = ((0, MAX_MOVES - len(move_entries)), (0, 0))
+    return np.pad(minimum, pad), np.pad(maximum, pad)
+
+
+def damage_ranges(state, opponent=False):
+    """Estimates the damage ranges of the moves of the active pokemon of the player against the team of the opponent (or
+    vice versa if `opponent` is True), see :func:`estimate_damage`.
+
+    Returns:
+        tuple: The minimum and maximum damage of shape `(4, 6)` as fractions of the maximum HP of the targets.
+    """
+    attacker, defender = (state.opponent, state.player) if opponent else (state.player, state.opponent)
+    weather = state.weather.name if state.weather is not None else None
+    return estimate_damage(attacker.pokemon[0], defender.pokemon[:MAX_POKEMON], weather)
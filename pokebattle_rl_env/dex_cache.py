@@ -0,0 +1,115 @@
+"""Compiled on-disk cache of the bundled Pokemon Showdown data.
+
+Parsing the bundled JSON files and deriving the effect tables takes a noticeable amount of time on every import. The
+compiled cache stores the parsed dex together with the derived tables in :mod:`marshal` format, keyed by a hash of the
+contents of the source JSON files (and the Python version, as the :mod:`marshal` format is version specific), so an
+edited source is never served stale. Hashing the sources takes a fraction of the time of parsing them. The cache file is
+memory-mapped when loaded, so the processes on one host decode it from the same page cache instead of each reading a
+private copy; the decoded objects themselves are private to each process.
+
+The cache directory defaults to `$XDG_CACHE_HOME/pokebattle_rl_env` (or `~/.cache/pokebattle_rl_env`) and can be
+changed by setting the `POKEBATTLE_DEX_CACHE` environment variable, e.g. for read-only or sandboxed home directories.
+Set it to an empty string to disable the cache. If the cache directory is not writable, the dex is silently compiled on
+every import instead.
+"""
+import marshal
+import sys
+from hashlib import sha1
+from json import loads
+from mmap import mmap, ACCESS_READ
+from os import environ, getpid, makedirs, remove, replace
+from os.path import expanduser, join
+from pkgutil import get_data
+
+DEX_SOURCES = {
+    'abilities': ('data/abilities.json', 'BattleAbilities'),
+    'items': ('data/items.json', 'BattleItems'),
+    'moves': ('data/moves.json', 'BattleMovedex'),
+    'pokedex': ('data/pokedex.json', 'BattlePokedex'),
+    'typechart': ('data/typechart.json', 'BattleTypeChart'),
+}
+DEFAULT_CACHE_DIR = join(environ.get('XDG_CACHE_HOME') or join(expanduser('~'), '.cache'), 'pokebattle_rl_env')
+
+
+def get_cache_dir():
+    """Returns the directory to store the compiled dex in or None if caching is disabled."""
+    cache_dir = environ.get('POKEBATTLE_DEX_CACHE', DEFAULT_CACHE_DIR)
+    return cache_dir if cache_dir else None
+
+
+def read_sources():
+    return {name: get_data('pokebattle_rl_env', path) for name, (path, _) in DEX_SOURCES.items()}
+
+
+def source_hash(sources):
+    """Hashes the raw source JSON files together with the :mod:`marshal` format the cache is written in."""
+    digest = sha1(f'{sys.version_info[0]}.{sys.version_info[1]}-{marshal.version}'.encode())
+    for name in sorted(sources):
+        digest.update(name.encode())
+        digest.update(sources[name])
+    return digest.hexdigest()
+
+
+def compile_dex(sources):
+    """Parses the source JSON files and derives the effect tables from the moves.
+
+    Returns:
+        dict: The parsed `abilities`, `items`, `moves`, `pokedex` and `typechart` as well as the derived `weathers`,
+        `side_conditions`, `terrains` and `pseudoWeathers`.
+    """
+    dex = {name: loads(sources[name])[key] for name, (_, key) in DEX_SOURCES.items()}
+    moves = dex['moves'].values()
+    dex['weathers'] = [move['weather'] for move in moves if 'weather' in move]
+    dex['side_conditions'] = [move['sideCondition'] for move in moves if 'sideCondition' in move]
+    dex['terrains'] = [move['terrain'] for move in moves if 'terrain' in move]
+    dex['pseudoWeathers'] = [move['pseudoWeather'] for move in moves if 'pseudoWeather' in move]
+    return dex
+
+
+def read_cache(path):
+    try:
+        with open(path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as buffer:
+            dex = marshal.loads(buffer)
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+    return dex if isinstance(dex, dict) else None
+
+
+def write_cache(path, dex):
+    tmp_path = f'{path}.{getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as file:
+            marshal.dump(dex, file)
+        replace(tmp_path, path)  # Atomic, so concurrently starting workers never read a partially written cache
+    except OSError:
+        try:
+            remove(tmp_path)
+        except OSError:
+            pass
+
+
+def load_dex(cache_dir=None):
+    """Loads the dex from the compiled cache, compiling and caching it first if the cache is missing or outdated.
+
+    Args:
+        cache_dir (str): The directory of the cache. Defaults to :func:`get_cache_dir`. If caching is disabled or the
+            directory is not writable, the dex is compiled from the source JSON files.
+
+    Returns:
+        dict: The compiled dex as returned by :func:`compile_dex`.
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    sources = read_sources()
+    if cache_dir is None:
+        return compile_dex(sources)
+    path = join(cache_dir, f'dex-{source_hash(sources)}.bin')
+    dex = read_cache(path)
+    if dex is None:
+        dex = compile_dex(sources)
+        try:
+            makedirs(cache_dir, exist_ok=True)
+        except OSError:
+            return dex
+        write_cache(path, dex)
+    return dex
@@ -9,13 +9,26 @@ from pokebattle_rl_env.poke_data_queries import abilities, ability_name_to_id, f
 DEFAULT_STAT_VALUE = 60
 
 
+def copy_slots(obj):
+    """Returns a shallow copy of an object using `__slots__` without calling its `__init__`."""
+    cls = obj.__class__
+    copy = cls.__new__(cls)
+    for slot in cls.__slots__:
+        setattr(copy, slot, getattr(obj, slot))
+    return copy
+
+
 class Item:
+    __slots__ = ('name', 'used')
+
     def __init__(self, name):
         self.name = name
         self.used = False
 
 
 class Move:
+    __slots__ = ('id', 'name', 'pp', 'disabled', 'type', 'target')
+
     def __init__(self, id=None, name=None, pp=None, disabled=False):  # id or name must be provided (xor, id is faster)
         if name is None:
             if id is None:
@@ -34,8 +47,15 @@ class Move:
         self.type = move['type']
         self.target = move['target']
 
+    def copy(self):
+        return copy_slots(self)
+
 
 class Pokemon:
+    __slots__ = ('species', 'health', 'max_health', 'statuses', 'gender', 'stats', 'stat_boosts', 'battle_stats',
+                 'moves', 'special_zmove_ix', 'ability', 'item', 'level', 'mega', 'trapped', 'recharge', 'transformed',
+                 'unknown', 'name', 'types', 'locked_move_first_index')
+
     def __init__(self, species=None, gender=None, ability=None, health=1.0, max_health=1.0, stats=None,
                  stat_boosts=None, battle_stats=None, moves=None, special_zmove_ix=None, item=None, name=None,
                  statuses=None, level=100, mega=False, trapped=False, recharge=False, unknown=False):
@@ -76,47 +96,48 @@ class Pokemon:
         self.locked_move_first_index = False
         self.update()
 
-    def update(self):
+    def update(self, random_state=np.random):
+        """Fills in the unknown gender, ability, stats and types from the dex entry of the species. An unknown gender
+        is sampled from the gender ratio of the species with `random_state`."""
         if self.species is not None:
             if self.gender is None:
-                pokemon = get_pokemon_by_species(self.species)
-                if 'gender' in pokemon:
-                    self.gender = pokemon['gender']
-                elif 'genderRatio' in pokemon:
-                    gender_prob = [.0] * 3
-                    for gender_r, ratio in pokemon['genderRatio'].items():
-                        if gender_r == 'F':
-                            gender_prob[0] = ratio
-                        elif gender_r == 'M':
-                            gender_prob[1] = ratio
-                        elif gender_r == 'N':
-                            gender_prob[2] = ratio
-                    self.gender = np.random.choice(genders, p=gender_prob)
+                self.gender = sample_gender(get_pokemon_by_species(self.species), random_state)
             if self.ability is None:
                 pokemon = get_pokemon_by_species(self.species)
                 self.ability = ability_name_to_id(pokemon['abilities']['0'])
             if self.stats is None:
                 pokemon = get_pokemon_by_species(self.species)
-                base_stats = pokemon['baseStats']
-                if 'hp' in base_stats:
-                    del base_stats['hp']
                 stats = {}
-                for stat, base in base_stats.items():
-                    stats[stat] = calc_stat(base, self.level)
+                for stat, base in pokemon['baseStats'].items():
+                    if stat != 'hp':  # The dex entry is shared, so don't delete from it
+                        stats[stat] = calc_stat(base, self.level)
                 self.stats = stats
             if self.types is None:
                 pokemon = get_pokemon_by_species(self.species)
                 self.types = pokemon['types']
 
-    def change_species(self, species):
+    def change_species(self, species, random_state=np.random):
         self.species = species
         self.ability = None
         self.stats = None
         self.types = None
-        self.update()
+        self.update(random_state)
+
+    def copy(self):
+        """Returns an independent copy of the pokemon, which is much faster than :func:`copy.deepcopy`."""
+        copy = copy_slots(self)
+        copy.statuses = [status.copy() for status in self.statuses]
+        copy.stats = dict(self.stats) if self.stats is not None else None
+        copy.stat_boosts = dict(self.stat_boosts)
+        copy.battle_stats = dict(self.battle_stats)
+        copy.moves = [move.copy() for move in self.moves]
+        copy.types = list(self.types) if self.types is not None else None
+        return copy
 
 
 class Trainer:
+    __slots__ = ('name', 'pokemon', 'force_switch', 'mega_used', 'z_used')
+
     def __init__(self, pokemon=None, name=None, mega_used=False, z_used=False):
         self.name = name
         if pokemon is None:
@@ -126,12 +147,40 @@ class Trainer:
         self.mega_used = mega_used
         self.z_used = z_used
 
+    def copy(self):
+        copy = copy_slots(self)
+        copy.pokemon = [pokemon.copy() for pokemon in self.pokemon]
+        return copy
+
 
 class BattleEffect:
+    __slots__ = ('name', 'turn')
+
     def __init__(self, name, turn=1):
         self.name = name
         self.turn = turn
 
+    def copy(self):
+        return BattleEffect(self.name, self.turn)
+
+
+def sample_gender(pokemon, random_state=np.random):
+    """Returns the gender of the dex entry `pokemon`, sampled from its gender ratio with `random_state` if the species
+    has no fixed gender, or None if the entry has neither."""
+    if 'gender' in pokemon:
+        return pokemon['gender']
+    if 'genderRatio' in pokemon:
+        gender_prob = [.0] * 3
+        for gender_r, ratio in pokemon['genderRatio'].items():
+            if gender_r == 'F':
+                gender_prob[0] = ratio
+            elif gender_r == 'M':
+                gender_prob[1] = ratio
+            elif gender_r == 'N':
+                gender_prob[2] = ratio
+        return random_state.choice(genders, p=gender_prob)
+    return None
+
 
 def calc_stat(base, level, hp=False):
     if hp:
@@ -195,7 +244,427 @@ def pokemon_list_to_array(pokemon_list):
     return state
 
 
+def state_to_list(state):
+    """The list-based reference implementation of :meth:`GameState.to_array`. :class:`StateEncoder` produces the
+    same layout and values and is used instead on the hot path."""
+    array = [state.turn / 100]
+    array.append(1 if state.player.mega_used else 0)
+    array.append(1 if state.player.z_used else 0)
+    player_conditions = [c.name for c in state.player_conditions]
+    for condition in side_conditions:
+        array.append(1 if condition in player_conditions else 0)
+    array.append(1 if state.opponent.mega_used else 0)
+    array.append(1 if state.opponent.z_used else 0)
+    opponent_conditions = [c.name for c in state.opponent_conditions]
+    for condition in side_conditions:
+        array.append(1 if condition in opponent_conditions else 0)
+    field_effect_turns = []
+    for effect in field_effects:
+        field_effect = next((f for f in state.field_effects if f.name == effect), None)
+        if field_effect is not None:
+            array.append(1)
+            field_effect_turns.append(field_effect.turn / 5)
+        else:
+            array.append(0)
+            field_effect_turns.append(0)
+    array += field_effect_turns
+    for weather in weathers:
+        array.append(1 if state.weather is not None and weather == state.weather.name else 0)
+    array.append(state.weather.turn if state.weather is not None else 0)
+    array += pokemon_list_to_array(state.player.pokemon)
+    array += pokemon_list_to_array(state.opponent.pokemon)
+    return array
+
+
+def index_map(keys, offset=0):
+    """Maps each key to the tuple of its positions (shifted by `offset`). Keys may occur multiple times in `keys`.
+
+    Examples:
+        >>> index_map(['a', 'b', 'a'], offset=10)
+        {'a': (10, 12), 'b': (11,)}
+    """
+    positions = {}
+    for i, key in enumerate(keys):
+        positions[key] = positions.get(key, ()) + (offset + i,)
+    return positions
+
+
+class StateEncoder:
+    """Encodes a :class:`GameState` into a flat `float32` array.
+
+    All category index maps and slice offsets are computed once on construction. :meth:`encode` then only scatters the
+    few non-zero entries of a state into a preallocated buffer instead of appending every one-hot entry to a list. The
+    layout and values are identical to :func:`state_to_list`.
+
+    Attributes:
+        size (int): The length of an encoded state.
+        pokemon_size (int): The length of the encoding of a single pokemon.
+        move_size (int): The length of the encoding of a single move slot.
+        buffer (:class:`numpy.ndarray`): The buffer :meth:`encode` writes into if no output array is passed.
+    """
+    num_move_slots = 4
+    stats = ['atk', 'def', 'spa', 'spd', 'spe']
+    battle_stats = ['accuracy', 'evasion']
+
+    def __init__(self):
+        # Move slot layout: one-hot move, pp, disabled, one-hot type, one-hot target
+        self.move_ids = index_map(moves)
+        self.move_pp = len(moves)
+        self.move_disabled = self.move_pp + 1
+        self.move_types = index_map(typechart, offset=self.move_disabled + 1)
+        self.move_targets = index_map(targets, offset=self.move_disabled + 1 + len(typechart))
+        self.move_size = len(moves) + 2 + len(typechart) + len(targets)
+
+        # Pokemon layout: health, one-hot gender, status flags, status turns, stats, battle stats, one-hot ability,
+        # types, one-hot item, mega, recharge, move slots
+        self.genders = index_map(genders, offset=1)
+        self.statuses = index_map(status_conditions, offset=1 + len(genders))
+        self.status_turns = len(status_conditions)
+        self.stat_offset = 1 + len(genders) + 2 * len(status_conditions)
+        self.battle_stat_offset = self.stat_offset + len(self.stats)
+        self.abilities = index_map(abilities, offset=self.battle_stat_offset + len(self.battle_stats))
+        self.types = index_map(typechart, offset=self.battle_stat_offset + len(self.battle_stats) + len(abilities))
+        self.items = index_map(items, offset=self.battle_stat_offset + len(self.battle_stats) + len(abilities) +
+                               len(typechart))
+        self.mega_offset = self.battle_stat_offset + len(self.battle_stats) + len(abilities) + len(typechart) + \
+            len(items)
+        self.move_offset = self.mega_offset + 2
+        self.pokemon_size = self.move_offset + self.num_move_slots * self.move_size
+
+        # State layout: turn, player mega/z, player side conditions, opponent mega/z, opponent side conditions, field
+        # effect flags, field effect turns, one-hot weather, weather turn, player pokemon, opponent pokemon
+        self.player_conditions = index_map(side_conditions, offset=3)
+        self.opponent_offset = 3 + len(side_conditions)
+        self.opponent_conditions = index_map(side_conditions, offset=self.opponent_offset + 2)
+        self.field_effects = index_map(field_effects, offset=self.opponent_offset + 2 + len(side_conditions))
+        self.field_effect_turns = len(field_effects)
+        self.weathers = index_map(weathers, offset=self.opponent_offset + 2 + len(side_conditions) +
+                                  2 * len(field_effects))
+        self.weather_turn_offset = self.opponent_offset + 2 + len(side_conditions) + 2 * len(field_effects) + \
+            len(weathers)
+        self.player_offset = self.weather_turn_offset + 1
+        self.opponent_pokemon_offset = self.player_offset + 6 * self.pokemon_size
+        self.size = self.opponent_pokemon_offset + 6 * self.pokemon_size
+        self.buffer = np.zeros(self.size, dtype=np.float32)
+
+    def encode(self, state, out=None):
+        """Encodes `state` into `out`.
+
+        Args:
+            state (:class:`GameState`): The state to encode.
+            out (:class:`numpy.ndarray`): The array of length :attr:`size` to write into. Defaults to :attr:`buffer`,
+                which is overwritten by the next call.
+
+        Returns:
+            :class:`numpy.ndarray`: `out`.
+        """
+        if out is None:
+            out = self.buffer
+        out.fill(0)
+        ix = []
+        values = []
+        self.encode_header(state, ix, values)
+        for i, pokemon in enumerate(state.player.pokemon + state.opponent.pokemon):
+            self.encode_pokemon(pokemon, self.pokemon_offset(i), ix, values)
+        out[ix] = values
+        return out
+
+    def pokemon_offset(self, slot):
+        """Returns the position of the encoding of the pokemon in `slot` (0-5 player, 6-11 opponent)."""
+        return self.player_offset + slot * self.pokemon_size
+
+    def encode_header(self, state, ix, values):
+        """Appends the indices and values of the non-zero entries of everything but the pokemon (turn, side conditions,
+        field effects and weather) to `ix` and `values`."""
+        ix.append(0)
+        values.append(state.turn / 100)
+        self._encode_side(state.player, state.player_conditions, 1, self.player_conditions, ix, values)
+        self._encode_side(state.opponent, state.opponent_conditions, self.opponent_offset, self.opponent_conditions,
+                          ix, values)
+        seen = set()
+        for effect in state.field_effects:
+            if effect.name in seen:
+                continue
+            seen.add(effect.name)
+            for i in self.field_effects.get(effect.name, ()):
+                ix += (i, i + self.field_effect_turns)
+                values += (1, effect.turn / 5)
+        if state.weather is not None:
+            for i in self.weathers.get(state.weather.name, ()):
+                ix.append(i)
+                values.append(1)
+            ix.append(self.weather_turn_offset)
+            values.append(state.weather.turn)
+
+    @staticmethod
+    def _encode_side(trainer, conditions, offset, condition_map, ix, values):
+        ix += (offset, offset + 1)
+        values += (1 if trainer.mega_used else 0, 1 if trainer.z_used else 0)
+        for condition in conditions:
+            for i in condition_map.get(condition.name, ()):
+                ix.append(i)
+                values.append(1)
+
+    def encode_pokemon(self, pokemon, offset, ix, values):
+        """Appends the indices and values of the non-zero entries of the encoding of `pokemon` to `ix` and `values`.
+
+        Args:
+            pokemon (:class:`Pokemon`): The pokemon to encode.
+            offset (int): The position of the pokemon's encoding in the encoded state.
+            ix (list): The indices to append to.
+            values (list): The values to append to.
+        """
+        ix.append(offset)
+        values.append(pokemon.health / pokemon.max_health if pokemon.max_health is not None else pokemon.health / 100)
+        for i in self.genders.get(pokemon.gender, ()):
+            ix.append(offset + i)
+            values.append(1)
+        seen = set()
+        for status in pokemon.statuses:
+            if status.name in seen:
+                continue
+            seen.add(status.name)
+            for i in self.statuses.get(status.name, ()):
+                ix += (offset + i, offset + i + self.status_turns)
+                values += (1, status.turn / 100)
+        stats = pokemon.stats
+        boosts = pokemon.stat_boosts
+        for i, stat in enumerate(self.stats):
+            ix.append(offset + self.stat_offset + i)
+            values.append(calc_boosted_stat(stats[stat] if stat in stats else DEFAULT_STAT_VALUE, boosts[stat]) / 10000)
+        for i, stat in enumerate(self.battle_stats):
+            ix.append(offset + self.battle_stat_offset + i)
+            values.append(pokemon.battle_stats[stat] / 10)
+        for i in self.abilities.get(pokemon.ability, ()):
+            ix.append(offset + i)
+            values.append(1)
+        for type in set(pokemon.types):
+            for i in self.types.get(type, ()):
+                ix.append(offset + i)
+                values.append(1)
+        for i in self.items.get(pokemon.item, ()):
+            ix.append(offset + i)
+            values.append(1)
+        if pokemon.mega:
+            ix.append(offset + self.mega_offset)
+            values.append(1)
+        if pokemon.recharge:
+            ix.append(offset + self.mega_offset + 1)
+            values.append(1)
+        for slot, move in enumerate(pokemon.moves[:self.num_move_slots]):
+            move_offset = offset + self.move_offset + slot * self.move_size
+            for i in self.move_ids.get(move.id, ()):
+                ix.append(move_offset + i)
+                values.append(1)
+            ix += (move_offset + self.move_pp, move_offset + self.move_disabled)
+            values += (move.pp / 64, 1 if move.disabled else 0)
+            for i in self.move_types.get(move.type, ()):
+                ix.append(move_offset + i)
+                values.append(1)
+            for i in self.move_targets.get(move.target, ()):
+                ix.append(move_offset + i)
+                values.append(1)
+
+
+class IncrementalStateEncoder(StateEncoder):
+    """A :class:`StateEncoder` that keeps its observation in a persistent buffer and only re-encodes the pokemon that
+    changed since the last call.
+
+    The parsers of :mod:`pokebattle_rl_env.showdown_simulator` mark every pokemon they modify via
+    :meth:`GameState.mark_dirty`. :meth:`encode` rewrites the slices of those pokemon and of pokemon that moved to
+    another slot (e.g. by switching), while the small header (turn, side conditions, field effects, weather) is always
+    re-encoded. Changes made to pokemon without marking them are missed, which is what :attr:`validate` is for.
+
+    Use one incremental encoder per :class:`GameState`, as :meth:`encode` clears the dirty pokemon of the state.
+
+    Attributes:
+        validate (bool): Whether to check every incremental result against a full re-encode. Raises an
+            :class:`AssertionError` on mismatch.
+    """
+    def __init__(self, validate=False):
+        super().__init__()
+        self.validate = validate
+        self.state = None
+        self.encoded_pokemon = [None] * 12
+        self.validation_buffer = np.zeros(self.size, dtype=np.float32) if validate else None
+
+    def encode(self, state):
+        """Updates :attr:`buffer` to the encoding of `state`.
+
+        Returns:
+            :class:`numpy.ndarray`: :attr:`buffer`, which is updated in place by the next call.
+        """
+        if state is not self.state:
+            self.state = state
+            self.encoded_pokemon = [None] * 12
+        buffer = self.buffer
+        buffer[:self.player_offset] = 0
+        ix = []
+        values = []
+        self.encode_header(state, ix, values)
+        dirty = state.dirty_pokemon
+        for i, pokemon in enumerate(state.player.pokemon + state.opponent.pokemon):
+            if pokemon is not self.encoded_pokemon[i] or pokemon in dirty:
+                offset = self.pokemon_offset(i)
+                buffer[offset:offset + self.pokemon_size] = 0
+                self.encode_pokemon(pokemon, offset, ix, values)
+                self.encoded_pokemon[i] = pokemon
+        dirty.clear()
+        buffer[ix] = values
+        if self.validate:
+            self.check(state)
+        return buffer
+
+    def check(self, state):
+        """Raises an :class:`AssertionError` if :attr:`buffer` differs from a full re-encode of `state`."""
+        expected = super().encode(state, out=self.validation_buffer)
+        mismatches = np.flatnonzero(expected != self.buffer)
+        if len(mismatches) > 0:
+            first = mismatches[0]
+            location = 'header' if first < self.player_offset else \
+                f'pokemon slot {(first - self.player_offset) // self.pokemon_size}'
+            raise AssertionError(f'Incremental observation differs from full re-encode at {len(mismatches)} positions, '
+                                 f'first at index {first} ({location})')
+
+
+def category_ids(keys):
+    """Maps each key to its id, reserving id 0 for missing or unknown values.
+
+    Examples:
+        >>> category_ids(['f', 'm', 'n'])
+        {'f': 1, 'm': 2, 'n': 3}
+    """
+    return {key: i + 1 for i, key in enumerate(keys)}
+
+
+class IndexEncoder:
+    """Encodes a :class:`GameState` into integer category ids and a small dense block of numeric features.
+
+    Instead of one-hot blocks over the move, item, ability and type vocabularies, every categorical attribute is encoded
+    as a single id (0 meaning none or unknown), which embedding-based policies can consume directly. The numeric block
+    holds the remaining features of :class:`StateEncoder` (health, statuses, stats, pp, side conditions, etc.).
+
+    Attributes:
+        category_sizes (:class:`numpy.ndarray`): The vocabulary size (including id 0) of each category id.
+        numeric_size (int): The length of the numeric block.
+        categories (:class:`numpy.ndarray`): The `int64` buffer :meth:`encode` writes the category ids into.
+        numeric (:class:`numpy.ndarray`): The `float32` buffer :meth:`encode` writes the numeric features into.
+    """
+    num_move_slots = StateEncoder.num_move_slots
+    stats = StateEncoder.stats
+    battle_stats = StateEncoder.battle_stats
+
+    def __init__(self):
+        self.genders = category_ids(genders)
+        self.abilities = category_ids(abilities)
+        self.items = category_ids(items)
+        self.types = category_ids(typechart)
+        self.moves = category_ids(moves)
+        self.targets = category_ids(targets)
+        self.weathers = category_ids(weathers)
+        self.statuses = index_map(status_conditions, offset=1)
+        self.status_turns = len(status_conditions)
+
+        # Categories: weather, then per pokemon gender, ability, item, 2 types and per move slot move, type and target
+        pokemon_categories = [len(genders), len(abilities), len(items), len(typechart), len(typechart)] + \
+            [len(moves)] * self.num_move_slots + [len(typechart)] * self.num_move_slots + \
+            [len(targets)] * self.num_move_slots
+        self.pokemon_categories = len(pokemon_categories)
+        self.category_sizes = np.array([len(weathers)] + pokemon_categories * 12, dtype=np.int64) + 1
+
+        # Numeric: turn, player mega/z, player side conditions, opponent mega/z, opponent side conditions, field effect
+        # flags, field effect turns, weather turn, then per pokemon health, status flags, status turns, stats, battle
+        # stats, mega, recharge and per move slot pp and disabled
+        self.player_conditions = index_map(side_conditions, offset=3)
+        self.opponent_offset = 3 + len(side_conditions)
+        self.opponent_conditions = index_map(side_conditions, offset=self.opponent_offset + 2)
+        self.field_effects = index_map(field_effects, offset=self.opponent_offset + 2 + len(side_conditions))
+        self.field_effect_turns = len(field_effects)
+        self.weather_turn_offset = self.opponent_offset + 2 + len(side_conditions) + 2 * len(field_effects)
+        self.stat_offset = 1 + 2 * len(status_conditions)
+        self.battle_stat_offset = self.stat_offset + len(self.stats)
+        self.mega_offset = self.battle_stat_offset + len(self.battle_stats)
+        self.move_offset = self.mega_offset + 2
+        self.pokemon_size = self.move_offset + 2 * self.num_move_slots
+        self.player_offset = self.weather_turn_offset + 1
+        self.numeric_size = self.player_offset + 12 * self.pokemon_size
+
+        self.categories = np.zeros(len(self.category_sizes), dtype=np.int64)
+        self.numeric = np.zeros(self.numeric_size, dtype=np.float32)
+
+    def encode(self, state):
+        """Encodes `state` into :attr:`categories` and :attr:`numeric`, which are overwritten by the next call.
+
+        Returns:
+            tuple: :attr:`categories` and :attr:`numeric`.
+        """
+        categories = self.categories
+        numeric = self.numeric
+        categories.fill(0)
+        numeric.fill(0)
+        numeric[0] = state.turn / 100
+        for trainer, conditions, offset, condition_map in [
+                (state.player, state.player_conditions, 1, self.player_conditions),
+                (state.opponent, state.opponent_conditions, self.opponent_offset, self.opponent_conditions)]:
+            numeric[offset] = 1 if trainer.mega_used else 0
+            numeric[offset + 1] = 1 if trainer.z_used else 0
+            for condition in conditions:
+                for i in condition_map.get(condition.name, ()):
+                    numeric[i] = 1
+        seen = set()
+        for effect in state.field_effects:
+            if effect.name in seen:
+                continue
+            seen.add(effect.name)
+            for i in self.field_effects.get(effect.name, ()):
+                numeric[i] = 1
+                numeric[i + self.field_effect_turns] = effect.turn / 5
+        if state.weather is not None:
+            categories[0] = self.weathers.get(state.weather.name, 0)
+            numeric[self.weather_turn_offset] = state.weather.turn
+        for i, pokemon in enumerate(state.player.pokemon + state.opponent.pokemon):
+            self.encode_pokemon(pokemon, 1 + i * self.pokemon_categories, self.player_offset + i * self.pokemon_size)
+        return categories, numeric
+
+    def encode_pokemon(self, pokemon, category_offset, numeric_offset):
+        categories = self.categories
+        numeric = self.numeric
+        categories[category_offset] = self.genders.get(pokemon.gender, 0)
+        categories[category_offset + 1] = self.abilities.get(pokemon.ability, 0)
+        categories[category_offset + 2] = self.items.get(pokemon.item, 0)
+        for i, type in enumerate(pokemon.types[:2]):
+            categories[category_offset + 3 + i] = self.types.get(type, 0)
+        numeric[numeric_offset] = \
+            pokemon.health / pokemon.max_health if pokemon.max_health is not None else pokemon.health / 100
+        seen = set()
+        for status in pokemon.statuses:
+            if status.name in seen:
+                continue
+            seen.add(status.name)
+            for i in self.statuses.get(status.name, ()):
+                numeric[numeric_offset + i] = 1
+                numeric[numeric_offset + i + self.status_turns] = status.turn / 100
+        for i, stat in enumerate(self.stats):
+            stat_value = pokemon.stats[stat] if stat in pokemon.stats else DEFAULT_STAT_VALUE
+            boosted_stat = calc_boosted_stat(stat_value, pokemon.stat_boosts[stat])
+            numeric[numeric_offset + self.stat_offset + i] = boosted_stat / 10000
+        for i, stat in enumerate(self.battle_stats):
+            numeric[numeric_offset + self.battle_stat_offset + i] = pokemon.battle_stats[stat] / 10
+        numeric[numeric_offset + self.mega_offset] = 1 if pokemon.mega else 0
+        numeric[numeric_offset + self.mega_offset + 1] = 1 if pokemon.recharge else 0
+        move_offset = category_offset + 5
+        for slot, move in enumerate(pokemon.moves[:self.num_move_slots]):
+            categories[move_offset + slot] = self.moves.get(move.id, 0)
+            categories[move_offset + self.num_move_slots + slot] = self.types.get(move.type, 0)
+            categories[move_offset + 2 * self.num_move_slots + slot] = self.targets.get(move.target, 0)
+            numeric[numeric_offset + self.move_offset + 2 * slot] = move.pp / 64
+            numeric[numeric_offset + self.move_offset + 2 * slot + 1] = 1 if move.disabled else 0
+
+
 class GameState:
+    __slots__ = ('state', 'player', 'opponent', 'weather', 'field_effects', 'player_conditions', 'opponent_conditions',
+                 'turn', 'forfeited', 'dirty_pokemon')
+
     def __init__(self):
         self.state = 'init'
         self.player = Trainer()
@@ -206,33 +675,27 @@ class GameState:
         self.opponent_conditions = []
         self.turn = 1
         self.forfeited = False
+        self.dirty_pokemon = set()  # Pokemon changed since the last incremental encoding
+
+    def copy(self):
+        """Returns an independent snapshot of the state, e.g. for replay buffers or search. Much faster than
+        :func:`copy.deepcopy`."""
+        copy = copy_slots(self)
+        copy.player = self.player.copy()
+        copy.opponent = self.opponent.copy()
+        copy.weather = self.weather.copy() if self.weather is not None else None
+        copy.field_effects = [effect.copy() for effect in self.field_effects]
+        copy.player_conditions = [condition.copy() for condition in self.player_conditions]
+        copy.opponent_conditions = [condition.copy() for condition in self.opponent_conditions]
+        copy.dirty_pokemon = set()
+        return copy
+
+    def mark_dirty(self, *pokemon):
+        """Marks the given pokemon as changed for :class:`IncrementalStateEncoder`."""
+        self.dirty_pokemon.update(pokemon)
 
     def to_array(self):
-        state = []
-        state.append(self.turn / 100)
-        state.append(1 if self.player.mega_used else 0)
-        state.append(1 if self.player.z_used else 0)
-        for condition in side_conditions:
-            state.append(1 if condition in self.player_conditions else 0)
-        state.append(1 if self.opponent.mega_used else 0)
-        state.append(1 if self.opponent.z_used else 0)
-        for condition in side_conditions:
-            state.append(1 if condition in self.opponent_conditions else 0)
-        field_effect_turns = []
-        for effect in field_effects:
-            field_effect = next((f for f in self.field_effects if f.name == effect), None)
-            if field_effect is not None:
-                state.append(1)
-                field_effect_turns.append(field_effect.turn / 5)
-            else:
-                state.append(0)
-                field_effect_turns.append(0)
-        state += field_effect_turns
-        for weather in weathers:
-            state.append(1 if self.weather is not None and weather == self.weather.name else 0)
-        state.append(self.weather.turn if self.weather is not None else 0)
-        state += pokemon_list_to_array(self.player.pokemon)
-        state += pokemon_list_to_array(self.opponent.pokemon)
-        state = np.array(state)
-        state[state is None] = 0
-        return state
+        return state_encoder.encode(self).copy()
+
+
+state_encoder = StateEncoder()
@@ -0,0 +1,434 @@
+"""A pure-Python battle engine for random singles, running in-process without a Pokemon Showdown server.
+
+The engine covers the common mechanics only: the damage formula (with critical hits, random rolls, STAB, type
+effectiveness, weather and burn), accuracy and evasion, priority and speed order, stat boosts, the major statuses,
+heal, drain and recoil moves, weather and switching. Teams consist of random fully evolved pokemon with random viable
+moves restricted to the mechanics above. Abilities, items, volatile statuses (e.g. confusion or flinching), entry
+hazards, mega evolutions and z moves are not simulated.
+"""
+from math import floor
+
+import numpy as np
+from gym.utils import seeding
+
+from pokebattle_rl_env.battle_simulator import Action, BattleSimulator
+from pokebattle_rl_env.damage_calc import type_effectiveness, weather_type_multipliers
+from pokebattle_rl_env.game_state import BattleEffect, GameState, Move, Pokemon, Trainer, calc_boosted_stat, calc_stat, \
+    sample_gender
+from pokebattle_rl_env.poke_data_queries import get_pokemon_by_species, moves, pokedex, typechart
+
+DEFAULT_LEVEL = 80
+MAX_TURNS = 1000
+WEATHER_TURNS = 5
+CRIT_CHANCES = [1 / 24, 1 / 8, 1 / 2, 1]
+MAJOR_STATUSES = ['brn', 'par', 'slp', 'frz', 'psn', 'tox']
+# Keys of the move dex whose mechanics the engine does not simulate
+UNSUPPORTED_MOVE_KEYS = {'volatileStatus', 'sideCondition', 'slotCondition', 'pseudoWeather', 'terrain', 'multihit',
+                         'stallingMove', 'selfdestruct', 'selfSwitch', 'forceSwitch', 'damage', 'ohko', 'isZ',
+                         'effect', 'secondaries', 'stealsBoosts', 'useTargetOffensive', 'mindBlownRecoil',
+                         'hasCustomRecoil', 'defensiveCategory', 'onBasePowerPriority', 'isNonstandard',
+                         'isUnreleased', 'sleepUsable'}
+RESIDUAL_DAMAGE = {'brn': 1 / 16, 'psn': 1 / 8}
+STRUGGLE = moves['struggle']
+
+
+def is_supported_move(move):
+    """Returns whether all mechanics of `move` are simulated by :class:`LocalSimulator`."""
+    if UNSUPPORTED_MOVE_KEYS.intersection(move) or 'charge' in move['flags'] or 'recharge' in move['flags']:
+        return False
+    if 'self' in move and set(move['self']) != {'boosts'}:
+        return False
+    if move['category'] == 'Status':
+        return any(key in move for key in ('status', 'boosts', 'heal', 'weather'))
+    return move['basePower'] > 0
+
+
+def is_random_species(pokemon):
+    """Returns whether `pokemon` is a fully evolved pokemon in its base or regional forme."""
+    if pokemon['num'] <= 0 or 'evos' in pokemon:
+        return False
+    return 'forme' not in pokemon or pokemon['forme'] == 'Alola'
+
+
+supported_moves = [move for move in moves.values() if move.get('isViable') and is_supported_move(move)]
+random_species = [pokemon['species'] for pokemon in pokedex.values() if is_random_species(pokemon)]
+
+
+def is_immune(pokemon, effect):
+    """Returns whether the types of `pokemon` make it immune to the status or weather `effect`."""
+    return any(typechart[t]['damageTaken'].get(effect) == 3 for t in pokemon.types)
+
+
+def major_status(pokemon):
+    return next((status for status in pokemon.statuses if status.name in MAJOR_STATUSES), None)
+
+
+def boost_stat(pokemon, stat, amount):
+    boosts = pokemon.stat_boosts if stat in pokemon.stat_boosts else pokemon.battle_stats
+    if stat in boosts:
+        boosts[stat] = max(-6, min(6, boosts[stat] + amount))
+
+
+def random_policy(simulator, actions):
+    """The default opponent policy of :class:`LocalSimulator`, choosing uniformly among `actions`."""
+    return actions[simulator.random_state.randint(len(actions))]
+
+
+class LocalSimulator(BattleSimulator):
+    """Simulates random singles battles against a scripted opponent in-process, see the module documentation for the
+    simulated mechanics.
+
+    The player sees the full state of its own team. Opponent pokemon are revealed when they are sent out, their moves
+    when they are used and their health in percent, like with
+    :class:`pokebattle_rl_env.showdown_simulator.ShowdownSimulator`.
+
+    Attributes:
+        state (:class:`pokebattle_rl_env.game_state.GameState`): The current state of the battle from the player's
+            perspective.
+        sides (list): The :class:`pokebattle_rl_env.game_state.Trainer` of the player and of the opponent holding the
+            full state of their teams. The active pokemon is always first.
+        team_size (int): The number of pokemon per team.
+        level (int): The level of all pokemon.
+        opponent_policy (callable): Chooses the opponent's action, given the simulator and the list of the opponent's
+            available :class:`pokebattle_rl_env.battle_simulator.Action`. Defaults to :func:`random_policy`.
+        random_state (:class:`numpy.random.RandomState`): The source of randomness of the engine.
+    """
+    def __init__(self, team_size=6, level=DEFAULT_LEVEL, opponent_policy=random_policy, random_state=None):
+        super().__init__()
+        self.team_size = team_size
+        self.level = level
+        self.opponent_policy = opponent_policy
+        self.random_state = random_state if random_state is not None else np.random.RandomState()
+        self.sides = None
+        self.choice = None
+        self.views = {}
+        self.sleep_turns = {}
+        self.weather_turns = 0
+
+    def generate_pokemon(self, species):
+        gender = sample_gender(get_pokemon_by_species(species), self.random_state)
+        pokemon = Pokemon(species=species, gender=gender, level=self.level)
+        pokemon.change_species(species)
+        pokemon.max_health = calc_stat(get_pokemon_by_species(species)['baseStats']['hp'], self.level, hp=True)
+        pokemon.health = pokemon.max_health
+        stab = [m for m in supported_moves if m['type'] in pokemon.types and m['category'] != 'Status']
+        move_ids = []
+        for candidates in (stab, stab, supported_moves, supported_moves):
+            candidates = [m['id'] for m in candidates if m['id'] not in move_ids] or \
+                         [m['id'] for m in supported_moves if m['id'] not in move_ids]
+            move_ids.append(candidates[self.random_state.randint(len(candidates))])
+        pokemon.moves = [Move(id=move_id) for move_id in move_ids]
+        return pokemon
+
+    def generate_team(self, name):
+        indices = self.random_state.choice(len(random_species), size=self.team_size, replace=False)
+        return Trainer(pokemon=[self.generate_pokemon(random_species[i]) for i in indices], name=name)
+
+    def reset(self):
+        """Starts a new battle between two random teams."""
+        self.sides = [self.generate_team('player'), self.generate_team('opponent')]
+        self.views = {pokemon: Pokemon(unknown=True) for pokemon in self.sides[1].pokemon}
+        self.sleep_turns = {}
+        self.weather_turns = 0
+        self.choice = None
+        self.state = GameState()
+        self.state.player = self.sides[0]
+        self.state.opponent = Trainer(pokemon=[self.views[p] for p in self.sides[1].pokemon], name='opponent')
+        self.state.state = 'ongoing'
+        self._reveal(self.sides[1].pokemon[0])
+        self._sync_opponent_view()
+
+    def _attack(self, move, mega=False, z=False):
+        active = self.sides[0].pokemon[0]
+        if self.state.player.force_switch or active.recharge or not 1 <= move <= max(len(active.moves), 1):
+            raise ValueError(f'Invalid move {move}')
+        self.choice = Action('attack', move)
+
+    def _switch(self, pokemon):
+        if not 2 <= pokemon <= len(self.sides[0].pokemon) or self.sides[0].pokemon[pokemon - 1].health <= 0:
+            raise ValueError(f'Invalid switch target {pokemon}')
+        self.choice = Action('switch', pokemon)
+
+    def side_actions(self, side):
+        """Returns the available actions of the side with index `side` (0 for the player, 1 for the opponent)."""
+        pokemon = self.sides[side].pokemon
+        switches = [Action('switch', i + 1) for i in range(1, len(pokemon)) if pokemon[i].health > 0]
+        if pokemon[0].health <= 0:
+            return switches
+        attacks = [Action('attack', i + 1) for i, move in enumerate(pokemon[0].moves) if move.pp > 0]
+        return (attacks or [Action('attack', 1)]) + switches
+
+    def _update_state(self):
+        choice, self.choice = self.choice, None
+        if self.state.state != 'ongoing':
+            return
+        if self.sides[0].pokemon[0].health <= 0:  # Forced switch after the player's pokemon fainted
+            self._do_switch(0, choice.number)
+            self._sync_opponent_view()
+            return
+        opponent_actions = [a for a in self.side_actions(1) if a.mode == 'attack']
+        choices = [(0, choice), (1, self.opponent_policy(self, opponent_actions))]
+        for side, action in sorted(choices, key=lambda c: self._action_order(*c), reverse=True):
+            if action.mode == 'switch':
+                self._do_switch(side, action.number)
+            elif self.sides[side].pokemon[0].health > 0 and self.sides[1 - side].pokemon[0].health > 0:
+                self._use_move(side, action.number - 1)
+        self._residual()
+        self._end_turn()
+
+    def _action_order(self, side, action):
+        if action.mode == 'switch':
+            return 7, 0, 0
+        pokemon = self.sides[side].pokemon[0]
+        move = moves[pokemon.moves[action.number - 1].id] if pokemon.moves else STRUGGLE
+        return move['priority'], self._speed(pokemon), self.random_state.random_sample()
+
+    def _speed(self, pokemon):
+        speed = calc_boosted_stat(pokemon.stats['spe'], pokemon.stat_boosts['spe'])
+        if any(status.name == 'par' for status in pokemon.statuses):
+            speed /= 2
+        return speed
+
+    def _do_switch(self, side, number):
+        pokemon = self.sides[side].pokemon
+        out = pokemon[0]
+        out.stat_boosts = {stat: 0 for stat in out.stat_boosts}
+        out.battle_stats = {stat: 0 for stat in out.battle_stats}
+        for status in out.statuses:
+            if status.name == 'tox':
+                status.turn = 1
+        pokemon[0], pokemon[number - 1] = pokemon[number - 1], pokemon[0]
+        self.state.mark_dirty(pokemon[0], pokemon[number - 1])
+        if side == 1:
+            self._reveal(pokemon[0])
+
+    def _can_move(self, pokemon):
+        status = major_status(pokemon)
+        if status is None:
+            return True
+        if status.name == 'slp':
+            self.sleep_turns[pokemon] -= 1
+            if self.sleep_turns[pokemon] > 0:
+                return False
+            pokemon.statuses.remove(status)
+        elif status.name == 'frz':
+            if self.random_state.random_sample() >= .2:
+                return False
+            pokemon.statuses.remove(status)
+        elif status.name == 'par' and self.random_state.random_sample() < .25:
+            return False
+        return True
+
+    def _use_move(self, side, index):
+        attacker = self.sides[side].pokemon[0]
+        defender = self.sides[1 - side].pokemon[0]
+        self.state.mark_dirty(attacker, defender)
+        if not self._can_move(attacker):
+            return
+        usable = [move for move in attacker.moves if move.pp > 0]
+        if usable and index < len(attacker.moves) and attacker.moves[index].pp > 0:
+            used = attacker.moves[index]
+            used.pp -= 1
+            if used.pp == 0:
+                used.disabled = True
+                if len(usable) == 1:  # Struggle is chosen with the first move, as on Showdown
+                    attacker.moves[0].disabled = False
+            move = moves[used.id]
+            if side == 1:
+                view = self.views[attacker]
+                if not any(m.id == used.id for m in view.moves):
+                    view.moves.append(Move(id=used.id))
+        else:
+            move = STRUGGLE
+        target = attacker if move['target'] == 'self' else defender
+        if target is defender and not self._hits(attacker, defender, move):
+            return
+        if move['category'] == 'Status':
+            self._apply_status_move(attacker, target, move)
+            return
+        damage = min(self.calc_damage(attacker, defender, move), defender.health)
+        if damage == 0:
+            return
+        defender.health -= damage
+        if 'drain' in move:
+            self._heal(attacker, damage * move['drain'][0] / move['drain'][1])
+        if 'recoil' in move:
+            self._damage(attacker, damage * move['recoil'][0] / move['recoil'][1])
+        if move is STRUGGLE:
+            self._damage(attacker, attacker.max_health / 4)
+        if 'self' in move:
+            self._apply_boosts(attacker, move['self']['boosts'])
+        secondary = move.get('secondary')
+        if secondary and defender.health > 0 and self.random_state.random_sample() * 100 < secondary['chance']:
+            if 'status' in secondary:
+                self._apply_status(defender, secondary['status'])
+            if 'boosts' in secondary:
+                self._apply_boosts(defender, secondary['boosts'])
+            if 'self' in secondary and 'boosts' in secondary['self']:
+                self._apply_boosts(attacker, secondary['self']['boosts'])
+        self._check_faint(defender)
+        self._check_faint(attacker)
+
+    def _hits(self, attacker, defender, move):
+        if move['accuracy'] is True:
+            return True
+        stage = max(-6, min(6, attacker.battle_stats['accuracy'] - defender.battle_stats['evasion']))
+        return self.random_state.random_sample() * 100 < move['accuracy'] * calc_boosted_stat(1, stage)
+
+    def calc_damage(self, attacker, defender, move, critical=None, roll=None):
+        """Computes the damage `attacker` deals to `defender` with `move` (a move dex entry).
+
+        Args:
+            critical (bool): Whether the move is a critical hit. Drawn randomly if None.
+            roll (float): The random damage roll between 0.85 and 1. Drawn randomly if None.
+        """
+        typeless = move is STRUGGLE
+        effectiveness = 1 if typeless else type_effectiveness(move['type'], defender.types)
+        if effectiveness == 0:
+            return 0
+        if critical is None:
+            crit_ratio = min(move.get('critRatio', 1), len(CRIT_CHANCES)) - 1
+            critical = self.random_state.random_sample() < CRIT_CHANCES[crit_ratio]
+        if roll is None:
+            roll = self.random_state.randint(85, 101) / 100
+        attack_stat, defense_stat = ('atk', 'def') if move['category'] == 'Physical' else ('spa', 'spd')
+        attack_boost = attacker.stat_boosts[attack_stat]
+        defense_boost = defender.stat_boosts[defense_stat]
+        if critical:
+            attack_boost, defense_boost = max(attack_boost, 0), min(defense_boost, 0)
+        attack = calc_boosted_stat(attacker.stats[attack_stat], attack_boost)
+        defense = calc_boosted_stat(defender.stats[defense_stat], defense_boost)
+        damage = floor(floor(floor(2 * attacker.level / 5 + 2) * move['basePower'] * attack / defense) / 50) + 2
+        modifier = roll * effectiveness
+        if self.state.weather is not None:
+            modifier *= weather_type_multipliers(self.state.weather.name).get(move['type'], 1)
+        if critical:
+            modifier *= 1.5
+        if not typeless and move['type'] in attacker.types:
+            modifier *= 1.5
+        if move['category'] == 'Physical' and any(status.name == 'brn' for status in attacker.statuses):
+            modifier *= .5
+        return max(floor(damage * modifier), 1)
+
+    def _apply_status_move(self, attacker, target, move):
+        if target is not attacker and type_effectiveness(move['type'], target.types) == 0:
+            return
+        if 'status' in move:
+            self._apply_status(target, move['status'])
+        if 'boosts' in move:
+            self._apply_boosts(target, move['boosts'])
+        if 'heal' in move:
+            self._heal(attacker, attacker.max_health * move['heal'][0] / move['heal'][1])
+        if 'weather' in move:
+            self.state.weather = BattleEffect(move['weather'])
+            self.weather_turns = WEATHER_TURNS
+
+    def _apply_status(self, pokemon, status):
+        if pokemon.health <= 0 or major_status(pokemon) is not None or is_immune(pokemon, status):
+            return
+        pokemon.statuses.append(BattleEffect(status))
+        if status == 'slp':
+            self.sleep_turns[pokemon] = self.random_state.randint(2, 5)  # Sleeps for 1-3 turns
+        self.state.mark_dirty(pokemon)
+
+    def _apply_boosts(self, pokemon, boosts):
+        for stat, amount in boosts.items():
+            boost_stat(pokemon, stat, amount)
+        self.state.mark_dirty(pokemon)
+
+    def _heal(self, pokemon, amount):
+        pokemon.health = min(pokemon.health + floor(amount), pokemon.max_health)
+
+    def _damage(self, pokemon, amount):
+        pokemon.health = max(pokemon.health - max(floor(amount), 1), 0)
+        self._check_faint(pokemon)
+
+    def _check_faint(self, pokemon):
+        if pokemon.health <= 0 and not any(status.name == 'fnt' for status in pokemon.statuses):
+            pokemon.health = 0
+            pokemon.statuses = [BattleEffect('fnt')]
+            self.state.mark_dirty(pokemon)
+
+    def _residual(self):
+        weather = self.state.weather
+        order = sorted((side.pokemon[0] for side in self.sides), key=self._speed, reverse=True)
+        for pokemon in order:
+            if pokemon.health <= 0:
+                continue
+            if weather is not None and weather.name in ('Sandstorm', 'hail') and not is_immune(pokemon, weather.name.lower()):
+                self._damage(pokemon, pokemon.max_health / 16)
+            status = major_status(pokemon)
+            if pokemon.health > 0 and status is not None:
+                if status.name in RESIDUAL_DAMAGE:
+                    self._damage(pokemon, pokemon.max_health * RESIDUAL_DAMAGE[status.name])
+                elif status.name == 'tox':
+                    self._damage(pokemon, pokemon.max_health * status.turn / 16)
+        if weather is not None:
+            self.weather_turns -= 1
+            weather.turn += 1
+            if self.weather_turns <= 0:
+                self.state.weather = None
+
+    def _end_turn(self):
+        state = self.state
+        for effect in state.field_effects + state.player_conditions + state.opponent_conditions:
+            effect.turn += 1
+        for side in self.sides:
+            for pokemon in side.pokemon:
+                for status in pokemon.statuses:
+                    status.turn += 1
+        alive = [any(p.health > 0 for p in side.pokemon) for side in self.sides]
+        if not any(alive):
+            state.state = 'tie'
+        elif not alive[0]:
+            state.state = 'loss'
+        elif not alive[1]:
+            state.state = 'win'
+        elif state.turn >= MAX_TURNS:
+            state.state = 'tie'
+        else:
+            state.turn += 1
+            if self.sides[1].pokemon[0].health <= 0:
+                self._do_switch(1, self.opponent_policy(self, self.side_actions(1)).number)
+            state.player.force_switch = self.sides[0].pokemon[0].health <= 0
+        self._sync_opponent_view()
+
+    def _reveal(self, pokemon):
+        view = self.views[pokemon]
+        if view.unknown:
+            view.unknown = False
+            view.name = pokemon.name
+            view.level = pokemon.level
+            view.gender = pokemon.gender
+            view.change_species(pokemon.species)
+            view.max_health = 100
+
+    def _sync_opponent_view(self):
+        self.state.opponent.pokemon = [self.views[pokemon] for pokemon in self.sides[1].pokemon]
+        for pokemon, view in self.views.items():
+            if view.unknown:
+                continue
+            view.health = round(100 * pokemon.health / pokemon.max_health)
+            if view.health == 0 and pokemon.health > 0:
+                view.health = 1
+            view.statuses = [status.copy() for status in pokemon.statuses]
+            view.stat_boosts = dict(pokemon.stat_boosts)
+            view.battle_stats = dict(pokemon.battle_stats)
+            self.state.mark_dirty(view)
+        self.state.mark_dirty(*self.sides[0].pokemon)
+
+    def render(self, mode='human'):
+        """Prints the active pokemon and their health."""
+        if mode == 'human' and self.sides is not None:
+            player, opponent = self.state.player.pokemon[0], self.state.opponent.pokemon[0]
+            print(f'Turn {self.state.turn}: {player.species} {player.health}/{player.max_health} vs. '
+                  f'{opponent.species} {opponent.health}%')
+
+    def seed(self, seed=None):
+        """Replaces :attr:`random_state` by one seeded with `seed`, so that the following battles (including the teams
+        and the opponent's choices of :func:`random_policy`) are reproducible."""
+        self.random_state, seed = seeding.np_random(seed)
+        return [seed]
+
+    def close(self):
+        pass
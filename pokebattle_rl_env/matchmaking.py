@@ -0,0 +1,108 @@
+"""Pairs self-play agents for battles on a Pokemon Showdown instance.
+
+A :class:`Matchmaker` keeps a queue of agents waiting for an opponent and pairs them first come, first served. Of each
+pair, the agent that arrived later challenges the one that waited, which accepts. Any number of agents can be served,
+an unpaired agent simply waits for the next agent to finish its battle.
+
+To share one matchmaker between processes (e.g. the workers of a pool), serve it with :func:`start_matchmaker` and
+connect each worker with :func:`connect_matchmaker`::
+
+    manager = start_matchmaker(address=('127.0.0.1', 50000), authkey=b'secret')
+    # in each worker:
+    simulator = ShowdownSimulator(self_play=True, matchmaker=connect_matchmaker(('127.0.0.1', 50000), b'secret'))
+"""
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+from threading import Condition
+from time import monotonic
+
+DEFAULT_MATCH_TIMEOUT = 30
+
+
+class Matchmaker:
+    """A thread-safe first come, first served queue pairing agents by username.
+
+    Agents that drop out are recovered from in two ways: a waiting agent is only paired until its call to
+    :meth:`find_match` times out, and an agent whose partner never showed up calls :meth:`find_match` again.
+
+    Attributes:
+        waiting (OrderedDict): Maps the usernames of waiting agents to the time their wait ends.
+        matches (dict): Maps the usernames of waiting agents that were paired to their opponent.
+    """
+    def __init__(self):
+        self.condition = Condition()
+        self.waiting = OrderedDict()
+        self.matches = {}
+
+    def find_match(self, username, timeout=DEFAULT_MATCH_TIMEOUT):
+        """Waits for an opponent for `username`.
+
+        Args:
+            username (str): The Showdown username of the agent.
+            timeout (float): The maximum time to wait in seconds.
+
+        Returns:
+            tuple: The username of the opponent and whether to challenge it (or to accept its challenge otherwise), or
+            None if no opponent was found in time.
+        """
+        deadline = monotonic() + timeout
+        with self.condition:
+            self.cancel(username)
+            now = monotonic()
+            for waiting, wait_end in list(self.waiting.items()):
+                del self.waiting[waiting]
+                if wait_end > now:
+                    self.matches[waiting] = username
+                    self.condition.notify_all()
+                    return waiting, True
+            self.waiting[username] = deadline
+            while username not in self.matches:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    self.waiting.pop(username, None)
+                    return None
+                self.condition.wait(remaining)
+            return self.matches.pop(username), False
+
+    def cancel(self, username):
+        """Removes `username` from the queue, e.g. when the agent shuts down."""
+        with self.condition:
+            self.waiting.pop(username, None)
+            self.matches.pop(username, None)
+
+
+class MatchmakingManager(BaseManager):
+    pass
+
+
+_matchmaker = None
+
+
+def get_matchmaker():
+    """Returns the matchmaker shared by all simulators of this process (and served by :func:`start_matchmaker`)."""
+    global _matchmaker
+    if _matchmaker is None:
+        _matchmaker = Matchmaker()
+    return _matchmaker
+
+
+MatchmakingManager.register('get_matchmaker', callable=get_matchmaker)
+
+
+def start_matchmaker(address=('127.0.0.1', 0), authkey=None):
+    """Serves a :class:`Matchmaker` in a new process.
+
+    Returns:
+        :class:`MatchmakingManager`: The started manager. Its `address` is the address to connect to, call `shutdown`
+        to stop it.
+    """
+    manager = MatchmakingManager(address=address, authkey=authkey)
+    manager.start()
+    return manager
+
+
+def connect_matchmaker(address, authkey=None):
+    """Connects to a matchmaker served by :func:`start_matchmaker` and returns a proxy to it."""
+    manager = MatchmakingManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.get_matchmaker()
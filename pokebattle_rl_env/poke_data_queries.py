@@ -1,24 +1,58 @@
-from json import loads
-from pkgutil import get_data
+from pokebattle_rl_env.dex_cache import load_dex
 
-abilities = loads(get_data('pokebattle_rl_env', 'data/abilities.json'))['BattleAbilities']
-items = loads(get_data('pokebattle_rl_env', 'data/items.json'))['BattleItems']
-moves = loads(get_data('pokebattle_rl_env', 'data/moves.json'))['BattleMovedex']
-pokedex = loads(get_data('pokebattle_rl_env', 'data/pokedex.json'))['BattlePokedex']
-typechart = loads(get_data('pokebattle_rl_env', 'data/typechart.json'))['BattleTypeChart']
+_dex = load_dex()
+abilities = _dex['abilities']
+items = _dex['items']
+moves = _dex['moves']
+pokedex = _dex['pokedex']
+typechart = _dex['typechart']
 
 genders = ['f', 'm', 'n']
 status_conditions = ['brn', 'par', 'slp', 'frz', 'psn', 'tox', 'confusion']
 targets = ['all', 'normal', 'self']
-weathers = [move['weather'] for move in moves.values() if 'weather' in move]
-side_conditions = [move['sideCondition'] for move in moves.values() if 'sideCondition' in move]
-terrains = [move['terrain'] for move in moves.values() if 'terrain' in move]
-pseudoWeathers = [move['pseudoWeather'] for move in moves.values() if 'pseudoWeather' in move]
+weathers = _dex['weathers']
+side_conditions = _dex['side_conditions']
+terrains = _dex['terrains']
+pseudoWeathers = _dex['pseudoWeathers']
 field_effects = terrains + pseudoWeathers
 
 
+def normalize_name(name):
+    """Normalizes a display name (e.g. a move, item, ability or species name) to the key used by the lookup indices.
+
+    Examples:
+        >>> normalize_name('Iron Head')
+        'iron head'
+    """
+    return name.lower()
+
+
+def build_index(entries, key):
+    """Builds a lookup index mapping the normalized value of `key` to the corresponding entry.
+
+    If multiple entries share the same normalized value, the first one is kept (like a linear scan would).
+    """
+    index = {}
+    for entry in entries.values():
+        index.setdefault(normalize_name(entry[key]), entry)
+    return index
+
+
+ability_index = build_index(abilities, 'name')
+item_index = build_index(items, 'name')
+move_index = build_index(moves, 'name')
+pokedex_index = build_index(pokedex, 'species')
+
+
+def _lookup(index, name):
+    entry = index.get(normalize_name(name))
+    if entry is None:
+        raise StopIteration
+    return entry
+
+
 def ability_name_to_id(name):
-    return next(a['id'] for a in abilities.values() if a['name'] == name)
+    return _lookup(ability_index, name)['id']
 
 
 def move_id_to_name(id):
@@ -26,28 +60,21 @@ def move_id_to_name(id):
 
 
 def move_name_to_id(name):
-    move_id = next((m['id'] for m in moves.values() if m['name'] == name), None)
-    if move_id is not None:
-        return move_id
-    elif name.startswith('Z-'):
-        name = name[2:]
-        return move_name_to_id(name)
-    raise StopIteration
+    return get_move_by_name(name)['id']
 
 
 def item_name_to_id(name):
-    return next(i['id'] for i in items.values() if i['name'] == name)
+    return _lookup(item_index, name)['id']
 
 
 def get_move_by_name(name):
-    move = next((m for m in moves.values() if m['name'] == name), None)
+    move = move_index.get(normalize_name(name))
     if move is not None:
         return move
     elif name.startswith('Z-'):
-        name = name[2:]
-        return get_move_by_name(name)
+        return get_move_by_name(name[2:])
     raise StopIteration
 
 
 def get_pokemon_by_species(species):
-    return next(p for p in pokedex.values() if p['species'] == species)
+    return _lookup(pokedex_index, species)
@@ -1,10 +1,15 @@
 from math import exp
+from time import perf_counter
 
 import numpy as np
 from gym import Env
 from gym.envs.registration import EnvSpec
-from gym.spaces import Box
+from gym.utils import seeding
+from gym.spaces import Box, Dict, Discrete, MultiDiscrete
 
+from pokebattle_rl_env.battle_simulator import NUM_ACTIONS, action_table, default_action_modifiers, default_actions, \
+    modifier_options
+from pokebattle_rl_env.game_state import IncrementalStateEncoder, IndexEncoder
 from pokebattle_rl_env.showdown_simulator import ShowdownSimulator
 
 TURN_THRESHOLD = 10
@@ -18,6 +23,17 @@ def sigmoid(x):
     return 1 / (1 + exp(-x))
 
 
+def compute_reward(state):
+    """Returns 1 if the battle of `state` is won, -1 if it is lost and 0 otherwise. Battles forfeited before turn
+    :const:`TURN_THRESHOLD` are not rewarded."""
+    if not (state.forfeited and state.turn < TURN_THRESHOLD):
+        if state.state == 'win':
+            return 1
+        elif state.state == 'loss':
+            return -1
+    return 0
+
+
 class PokeBattleEnv(Env):
     """The Pokemon battle Reinforecement Learning environment.
 
@@ -27,71 +43,170 @@ class PokeBattleEnv(Env):
     Attributes:
         simulator (:class:`pokebattle_rl_env.battle_simulator.BattleSimulator`): The simulator to run battles in. Uses
             :class:`pokebattle_rl_env.showdown_simulator.ShowdownSimulator` by default.
+        observation_mode (str): How observations are encoded. Options:
+
+            * `'dense'`: A flat `float32` array as returned by :meth:`pokebattle_rl_env.game_state.GameState.to_array`.
+            * `'index'`: A dict of integer category ids (`'categories'`, 0 meaning none or unknown) for weather, gender,
+              ability, item, types and moves, and a small `float32` array of numeric features (`'numeric'`), as
+              returned by :class:`pokebattle_rl_env.game_state.IndexEncoder`. Intended for embedding-based policies;
+              orders of magnitude smaller than dense observations.
+        incremental_observations (bool): Whether to encode dense observations with a
+            :class:`pokebattle_rl_env.game_state.IncrementalStateEncoder`, which only re-encodes the pokemon changed
+            by the parsed protocol messages since the last step.
+        validate_observations (bool): Whether to check each incremental observation against a full re-encode. Only
+            used if :attr:`incremental_observations` is True.
+        action_mode (str): How actions are given to :meth:`step`. Options:
+
+            * `'probabilities'`: A `float32` array of a preference for each action, followed by one for each modifier.
+              The action is sampled from the softmax of the preferences of the available actions.
+            * `'discrete'`: An integer `modifier * 9 + action` in `[0, 27)`, where `action` is the index of
+              :func:`pokebattle_rl_env.battle_simulator.action_to_index` and `modifier` the index of
+              :func:`pokebattle_rl_env.battle_simulator.modifiers_to_index`.
+            * `'multi_discrete'`: A pair `(action, modifier)` of the same indices.
+
+            Discrete actions are decoded by a table lookup without sampling. Choosing an unavailable action raises a
+            :class:`ValueError`, use :attr:`action_mask` to avoid them. Unavailable modifiers are ignored.
+        action_mask (:class:`numpy.ndarray`): The mask of the actions available at the current decision point, as
+            returned by :meth:`pokebattle_rl_env.battle_simulator.BattleSimulator.get_action_mask`. Computed once per
+            step and passed as `'action_mask'` in the info dict.
+        profiler (:class:`pokebattle_rl_env.profiling.Profiler`): Records the time spent in each phase of a step (and
+            is passed on to the simulator), if not None. Whenever the profiler reports (see
+            :meth:`pokebattle_rl_env.profiling.Profiler.step`), its snapshot is passed as `'metrics'` in the info dict.
     """
-    def __init__(self, simulator=ShowdownSimulator()):
+    def __init__(self, simulator=ShowdownSimulator(), observation_mode='dense', incremental_observations=False,
+                 validate_observations=False, action_mode='probabilities', profiler=None):
         self.__version__ = "0.1.0"
         self._spec = EnvSpec('PokeBattleEnv-v0')
         self.simulator = simulator
-        num_actions = len(self.simulator.get_available_actions()) + len(self.simulator.get_available_modifiers())
-        self.action_space = Box(low=0.0, high=1.0, shape=(num_actions,), dtype=np.float32)
-        state_dimensions = len(self.simulator.state.to_array())
-        self.observation_space = Box(low=0, high=1000, shape=(state_dimensions,), dtype=np.float32)
+        self.profiler = profiler
+        if profiler is not None:
+            simulator.profiler = profiler
+        self.action_mode = action_mode
+        if action_mode == 'probabilities':
+            num_actions = len(self.simulator.get_available_actions()) + len(self.simulator.get_available_modifiers())
+            self.action_space = Box(low=0.0, high=1.0, shape=(num_actions,), dtype=np.float32)
+        elif action_mode == 'discrete':
+            self.action_space = Discrete(len(modifier_options) * NUM_ACTIONS)
+        elif action_mode == 'multi_discrete':
+            self.action_space = MultiDiscrete([NUM_ACTIONS, len(modifier_options)])
+        else:
+            raise ValueError(f'Invalid action mode {action_mode}')
+        self.observation_mode = observation_mode
+        self.state_encoder = IncrementalStateEncoder(validate=validate_observations) if incremental_observations \
+            else None
+        if observation_mode == 'dense':
+            state_dimensions = len(self.simulator.state.to_array())
+            self.observation_space = Box(low=0, high=1000, shape=(state_dimensions,), dtype=np.float32)
+        elif observation_mode == 'index':
+            self.index_encoder = IndexEncoder()
+            self.observation_space = Dict({
+                'categories': MultiDiscrete(self.index_encoder.category_sizes),
+                'numeric': Box(low=-1000, high=1000, shape=(self.index_encoder.numeric_size,), dtype=np.float32)
+            })
+        else:
+            raise ValueError(f'Invalid observation mode {observation_mode}')
+        self.action_mask = None
+        self.np_random, _ = seeding.np_random()
         self.reward_range = (-1, 1)
         self.metadata['render.modes'] = ['human']
         self.metadata['semantics.autoreset'] = False
 
+    def get_observation(self):
+        if self.observation_mode == 'index':
+            categories, numeric = self.index_encoder.encode(self.simulator.state)
+            return {'categories': categories.copy(), 'numeric': numeric.copy()}
+        if self.state_encoder is not None:
+            return self.state_encoder.encode(self.simulator.state).copy()
+        return self.simulator.state.to_array()
+
+    def update_action_mask(self):
+        """Computes :attr:`action_mask` for the current decision point."""
+        self.action_mask = self.simulator.get_action_mask()
+        return self.action_mask
+
     def get_action(self, action_probs):
-        valid_actions = self.simulator.get_available_actions()
+        if self.action_mask is None:
+            self.update_action_mask()
+        valid_actions = np.flatnonzero(self.action_mask[:NUM_ACTIONS])
         if len(valid_actions) == 0:
             from pickle import dump
             from pokebattle_rl_env.util import generate_token
             with open(generate_token(5), 'wb') as file:
                 dump(self.simulator.state, file)
-        estimates = []
-        for valid_action in valid_actions:
-            if valid_action.mode == 'attack':
-                action_ix = valid_action.number - 1
-            elif valid_action.mode == 'switch':
-                action_ix = valid_action.number + 2
-            else:
-                continue
-            estimates.append(action_probs[action_ix])
-        estimates = softmax(estimates)
-        action = np.random.choice(valid_actions, p=estimates)
-        return action
+        estimates = softmax(np.asarray(action_probs)[valid_actions])
+        return default_actions[self.np_random.choice(valid_actions, p=estimates)]
 
     def get_action_modifier(self, action_probs):
-        valid_modifiers = self.simulator.get_available_modifiers()
+        if self.action_mask is None:
+            self.update_action_mask()
         modifiers = []
-        for valid_modifier in valid_modifiers:
+        for i, valid_modifier in enumerate(default_action_modifiers):
+            if not self.action_mask[NUM_ACTIONS + i]:
+                continue
             prob = 0
             if valid_modifier == 'mega':
                 prob = action_probs[len(action_probs) - 1]
             prob = sigmoid(prob)
-            if np.random.binomial(1, prob):
+            if self.np_random.binomial(1, prob):
                 modifiers.append(valid_modifier)
         return modifiers
 
+    def decode_action(self, action):
+        """Returns the :class:`pokebattle_rl_env.battle_simulator.Action` and modifiers of an action of
+        :attr:`action_space`, see :attr:`action_mode`."""
+        if self.action_mode == 'probabilities':
+            return self.get_action(action), self.get_action_modifier(action)
+        if self.action_mode == 'discrete':
+            modifier_index, action_index = divmod(int(action), NUM_ACTIONS)
+        else:
+            action_index, modifier_index = int(action[0]), int(action[1])
+        if self.action_mask is None:
+            self.update_action_mask()
+        if not self.action_mask[action_index]:
+            raise ValueError(f'Action {action_index} is not available (see the action mask)')
+        if modifier_index != 0 and not self.action_mask[NUM_ACTIONS + modifier_index - 1]:
+            modifier_index = 0
+        return action_table[modifier_index][action_index]
+
     def compute_reward(self):
-        if not (self.simulator.state.forfeited and self.simulator.state.turn < TURN_THRESHOLD):
-            if self.simulator.state.state == 'win':
-                return 1
-            elif self.simulator.state.state == 'loss':
-                return -1
-        return 0
+        return compute_reward(self.simulator.state)
 
     def step(self, action):
-        game_action = self.get_action(action)
-        modifiers = self.get_action_modifier(action)
+        profiler = self.profiler
+        if profiler is None:
+            self.simulator.act(*self.decode_action(action))
+            return self.get_transition()
+        start = perf_counter()
+        game_action, modifiers = self.decode_action(action)
+        decoded = perf_counter()
         self.simulator.act(game_action, modifiers)
-        observation = self.simulator.state.to_array()
+        acted = perf_counter()
+        observation = self.get_observation()
+        encoded = perf_counter()
+        transition = self.get_transition(observation)
+        end = perf_counter()
+        profiler.record('decode', decoded - start)
+        profiler.record('act', acted - decoded)
+        profiler.record('encode', encoded - acted)
+        profiler.record('step', end - start)
+        metrics = profiler.step()
+        if metrics is not None:
+            transition[3]['metrics'] = metrics
+        return transition
+
+    def get_transition(self, observation=None):
+        """Returns the observation, reward, done flag and info of the current state, as returned by :meth:`step`. The
+        observation is encoded unless given."""
+        if observation is None:
+            observation = self.get_observation()
         reward = self.compute_reward()  # ToDo: Maybe negative reward for assigning probability to invalid action
         done = self.simulator.state.state in ['win', 'loss', 'tie']
-        return observation, reward, done, None
+        return observation, reward, done, {'action_mask': self.update_action_mask()}
 
     def reset(self):
         self.simulator.reset()
-        return self.simulator.state.to_array()
+        self.update_action_mask()
+        return self.get_observation()
 
     def render(self, mode='human'):
         if mode == 'rgb_array':
@@ -105,4 +220,11 @@ class PokeBattleEnv(Env):
         self.simulator.close()
 
     def seed(self, seed=None):
-        pass
+        """Seeds the sampling of actions (in action mode `'probabilities'`) and the simulator, see
+        :meth:`pokebattle_rl_env.battle_simulator.BattleSimulator.seed`.
+
+        Returns:
+            list: The seed of the action sampling followed by the seeds of the simulator.
+        """
+        self.np_random, seed = seeding.np_random(seed)
+        return [seed] + self.simulator.seed(seeding.hash_seed(seed) % 2 ** 32)
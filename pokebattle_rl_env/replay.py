@@ -0,0 +1,341 @@
+"""Offline replay of recorded battles into transitions for imitation learning and offline reinforcement learning.
+
+Two log formats are replayed through the message parsers of
+:class:`pokebattle_rl_env.showdown_simulator.ShowdownSimulator`, without any websocket:
+
+* Protocol logs like `battle_example.txt` (or the logs of :class:`pokebattle_rl_env.battle_log.BattleLog`), holding
+  the frames received from the server prefixed by `<< ` and the commands sent by `>> `, see
+  :func:`replay_protocol_log`.
+* Replay logs as downloaded from https://replay.pokemonshowdown.com, holding the messages of a battle as seen by a
+  spectator, see :func:`replay_showdown_log`.
+
+:func:`iter_transitions` replays many such files in parallel and streams their :class:`Transition`.
+"""
+from collections import namedtuple
+from functools import partial
+from json import loads
+from logging import warning
+from multiprocessing import Pool
+
+from pokebattle_rl_env.battle_simulator import Action, action_to_index, modifiers_to_index
+from pokebattle_rl_env.game_state import IndexEncoder, StateEncoder
+from pokebattle_rl_env.pokebattle_env import compute_reward
+from pokebattle_rl_env.showdown_simulator import ShowdownSimulator, ident_to_name, parse_pokemon_details
+
+Transition = namedtuple('Transition', ['observation', 'action', 'next_observation', 'reward', 'done'])
+Transition.__doc__ = """A single decision of a replayed battle.
+
+The action is a tuple of the index into the action space of :class:`pokebattle_rl_env.pokebattle_env.PokeBattleEnv`
+(see :func:`pokebattle_rl_env.battle_simulator.action_to_index`) and the modifier index (see
+:func:`pokebattle_rl_env.battle_simulator.modifiers_to_index`)."""
+
+FINAL_STATES = ('win', 'loss', 'tie')
+
+# Message types whose second field identifies the pokemon or side they affect
+SIDE_MESSAGES = {'switch', 'drag', 'move', 'replace', 'detailschange', '-formechange', '-damage', '-heal', '-status',
+                 '-curestatus', '-boost', '-unboost', '-start', '-end', '-sidestart', '-sideend', '-ability',
+                 'endability', '-transform', '-mega', '-item', '-enditem', '-zpower'}
+
+
+def observation_encoder(observation_mode='dense'):
+    """Returns a function encoding a :class:`pokebattle_rl_env.game_state.GameState` into an observation of the given
+    mode of :class:`pokebattle_rl_env.pokebattle_env.PokeBattleEnv`."""
+    if observation_mode == 'index':
+        encoder = IndexEncoder()
+
+        def encode(state):
+            categories, numeric = encoder.encode(state)
+            return {'categories': categories.copy(), 'numeric': numeric.copy()}
+        return encode
+    if observation_mode == 'dense':
+        encoder = StateEncoder()
+        return lambda state: encoder.encode(state).copy()
+    raise ValueError(f'Invalid observation mode {observation_mode}')
+
+
+def read_protocol_log(text):
+    """Splits a protocol log like `battle_example.txt` into events.
+
+    Frames received from the server are prefixed by `<< `, commands sent to the server by `>> `.
+
+    Examples:
+        >>> read_protocol_log('<< >battle-1\\n|turn|1\\n>> battle-1|/choose move 1|2')
+        [('recv', '>battle-1\\n|turn|1'), ('send', 'battle-1|/choose move 1|2')]
+
+    Returns:
+        list: Tuples of either `'recv'` and the received frame or `'send'` and the sent command.
+    """
+    events = []
+    frame = None
+    for line in text.split('\n'):
+        if line.startswith('<< '):
+            if frame is not None:
+                events.append(('recv', '\n'.join(frame)))
+            frame = [line[len('<< '):]]
+        elif line.startswith('>> '):
+            if frame is not None:
+                events.append(('recv', '\n'.join(frame)))
+            frame = None
+            events.append(('send', line[len('>> '):]))
+        elif frame is not None:
+            frame.append(line)
+    if frame is not None:
+        events.append(('recv', '\n'.join(frame)))
+    return events
+
+
+def parse_choice(command):
+    """Parses the action and modifiers out of a move or switch command.
+
+    Examples:
+        >>> action, modifiers = parse_choice('/choose move 2 mega')
+        >>> action.mode, action.number, modifiers
+        ('attack', 2, ['mega'])
+        >>> parse_choice('/timer on')
+
+    Returns:
+        tuple: The :class:`pokebattle_rl_env.battle_simulator.Action` and the list of modifiers or None if `command` is
+        no choice.
+    """
+    parts = command.split()
+    if not parts or not parts[0].startswith('/'):
+        return None
+    if parts[0] == '/choose':
+        parts = parts[1:]
+    else:
+        parts[0] = parts[0][1:]
+    if len(parts) < 2 or parts[0] not in ('move', 'switch') or not parts[1].isdigit():
+        return None
+    mode = 'attack' if parts[0] == 'move' else 'switch'
+    modifiers = ['mega'] if 'mega' in parts[2:] else ['z'] if 'zmove' in parts[2:] else []
+    return Action(mode, int(parts[1])), modifiers
+
+
+def find_player_sides(events):
+    """Maps the id of each room in `events` to the name and side id of the logged in player, as revealed by the first
+    `|request|` of the room."""
+    sides = {}
+    for kind, msg in events:
+        if kind != 'recv' or '|request|{' not in msg:
+            continue
+        room_id = msg.split('\n', 1)[0][1:]
+        if room_id in sides:
+            continue
+        request = next(line for line in msg.split('\n') if line.startswith('|request|{'))
+        side = loads(request[len('|request|'):])['side']
+        sides[room_id] = side['name'], side['id']
+    return sides
+
+
+class _ProtocolBattle:
+    def __init__(self, room_id, username, side, observation_mode):
+        self.simulator = ShowdownSimulator()
+        self.simulator.room_id = room_id
+        self.simulator.username = username
+        self.simulator.state.player.name = username
+        if side is not None:
+            self.simulator.player_short = side
+            self.simulator.opponent_short = 'p2' if side == 'p1' else 'p1'
+        self.encode = observation_encoder(observation_mode)
+        self.observation = None
+        self.pending = None
+
+
+def replay_protocol_log(text, observation_mode='dense'):
+    """Replays a protocol log like `battle_example.txt` through the parsers of
+    :class:`pokebattle_rl_env.showdown_simulator.ShowdownSimulator`, without any websocket.
+
+    An observation is taken whenever the live simulator would end :meth:`_update_state` and every choice sent
+    afterwards yields a transition to the next such observation. Battles of several rooms may be interleaved. Battles
+    the parsers fail on are dropped with a warning.
+
+    Args:
+        text (str): The protocol log.
+        observation_mode (str): The observation mode of :class:`pokebattle_rl_env.pokebattle_env.PokeBattleEnv`.
+
+    Yields:
+        :class:`Transition`: The transitions of the logged player in the order they occurred.
+    """
+    events = read_protocol_log(text)
+    sides = find_player_sides(events)
+    battles = {}
+    finished = set()
+    for kind, msg in events:
+        if kind == 'recv':
+            if not msg.startswith('>'):
+                continue
+            room_id = msg.split('\n', 1)[0][1:]
+            if room_id in finished:
+                continue
+            battle = battles.get(room_id)
+            if battle is None:
+                username, side = sides.get(room_id, (None, None))
+                battle = battles[room_id] = _ProtocolBattle(room_id, username, side, observation_mode)
+            try:
+                end = battle.simulator._parse_message(msg)
+            except Exception as e:
+                warning('Dropping battle %s: %r', room_id, e)
+                finished.add(room_id)
+                continue
+            if not end:
+                continue
+            state = battle.simulator.state
+            observation = battle.encode(state)
+            done = state.state in FINAL_STATES
+            if battle.pending is not None:
+                previous_observation, action = battle.pending
+                yield Transition(previous_observation, action, observation, compute_reward(state), done)
+                battle.pending = None
+            battle.observation = observation
+            if done:
+                finished.add(room_id)
+        else:
+            room_id, _, command = msg.partition('|')
+            battle = battles.get(room_id)
+            if room_id in finished or battle is None or battle.observation is None:
+                continue
+            choice = parse_choice(command.split('|')[0])
+            if choice is None:
+                continue
+            action, modifiers = choice
+            player = battle.simulator.state.player
+            player.force_switch = False
+            if action.mode == 'switch':
+                player.pokemon[0], player.pokemon[action.number - 1] = player.pokemon[action.number - 1], player.pokemon[0]
+            battle.pending = battle.observation, (action_to_index(action), modifiers_to_index(modifiers))
+
+
+def _switch_target(info, trainer):
+    name = ident_to_name(info[2])
+    species = parse_pokemon_details(info[3])[0]
+    pokemon = trainer.pokemon
+    switched_in = next((p for p in pokemon if p.species == species or p.name == name), None)
+    if switched_in is None:
+        switched_in = next(p for p in pokemon if p.unknown)
+    return pokemon.index(switched_in)
+
+
+def replay_showdown_log(log, player='p1', observation_mode='dense'):
+    """Replays a standard Pokemon Showdown replay log (as downloaded from https://replay.pokemonshowdown.com) from the
+    perspective of one side.
+
+    Replay logs contain no `|request|`, so the player's team is revealed the same way as the opponent's: by the
+    messages of the battle. To reuse the opponent parsers for it, the player's side is parsed by a mirrored simulator
+    sharing the trainers of the main one crosswise.
+
+    Decisions are taken at each `|turn|` and after the player's active pokemon fainted. The action of a decision is the
+    first move or switch of the player afterwards. Decisions whose action can't be told apart (e.g. the pokemon was
+    unable to move or used a fifth, unknown move) yield no transition.
+
+    Args:
+        log (str): The replay log.
+        player (str): The side id of the player to replay, `p1` or `p2`.
+        observation_mode (str): The observation mode of :class:`pokebattle_rl_env.pokebattle_env.PokeBattleEnv`.
+
+    Yields:
+        :class:`Transition`: The transitions of `player` in the order they occurred.
+    """
+    opponent = 'p2' if player == 'p1' else 'p1'
+    main = ShowdownSimulator()
+    main.player_short, main.opponent_short = player, opponent
+    mirror = ShowdownSimulator()
+    mirror.player_short, mirror.opponent_short = opponent, player
+    state = main.state
+    mirror.state.player, mirror.state.opponent = state.opponent, state.player
+    mirror.state.player_conditions, mirror.state.opponent_conditions = state.opponent_conditions, state.player_conditions
+    mirror.state.dirty_pokemon = state.dirty_pokemon
+    encode = observation_encoder(observation_mode)
+
+    observation = None
+    action = None
+    modifiers = 0
+    pending = None
+    fainted = False
+    for line in log.split('\n'):
+        info = line.split('|')
+        if len(info) < 3:
+            continue
+        message_type = info[1]
+        if message_type == 'player':
+            if len(info) > 3 and info[3]:
+                (state.player if info[2] == player else state.opponent).name = info[3]
+            continue
+        is_player = message_type in SIDE_MESSAGES and info[2].startswith(player)
+        if is_player and observation is not None and action is None:
+            if message_type == '-mega':
+                modifiers = 1
+            elif message_type == '-zpower':
+                modifiers = 2
+            elif message_type == 'switch':
+                action = Action('switch', _switch_target(info, state.player) + 1)
+        try:
+            end = (mirror if is_player else main)._parse_line(info, line)
+        except Exception as e:
+            warning('Dropping replay: %r', e)
+            return
+        if is_player and message_type == 'move' and observation is not None and action is None and '[from]' not in line:
+            moves = [move.name for move in state.player.pokemon[0].moves]
+            if info[3] in moves and moves.index(info[3]) < 4:
+                action = Action('attack', moves.index(info[3]) + 1)
+            else:
+                observation = None
+        if action is not None and pending is None and (action.mode == 'attack' or action.number > 1):
+            pending = observation, (action_to_index(action), modifiers)
+        if message_type == 'faint' and info[2].startswith(player):
+            fainted = True
+        elif message_type == 'upkeep' and fainted:
+            end = True
+        if not end:
+            continue
+        fainted = False
+        next_observation = encode(state)
+        done = state.state in FINAL_STATES
+        if pending is not None:
+            yield Transition(pending[0], pending[1], next_observation, compute_reward(state), done)
+        if done:
+            return
+        observation = next_observation
+        action = None
+        modifiers = 0
+        pending = None
+
+
+def replay_file(path, observation_mode='dense', player='p1'):
+    """Replays a protocol log (see :func:`replay_protocol_log`), a replay log (see :func:`replay_showdown_log`) or the
+    JSON of a replay (with the replay log at key `log`).
+
+    Returns:
+        list: The :class:`Transition` of the file.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        text = file.read()
+    if path.endswith('.json'):
+        text = loads(text)['log']
+    if text.startswith('<< ') or '\n<< ' in text:
+        return list(replay_protocol_log(text, observation_mode))
+    return list(replay_showdown_log(text, player, observation_mode))
+
+
+def iter_transitions(paths, processes=None, observation_mode='dense', player='p1', chunksize=1):
+    """Streams the transitions of many logs, replaying them in parallel with a process pool.
+
+    Transitions of the same file are yielded in order, files are yielded in the order they finish.
+
+    Args:
+        paths (iterable): The paths of the logs, see :func:`replay_file`.
+        processes (int): The number of worker processes. Defaults to the number of CPUs, 0 replays in this process.
+        observation_mode (str): The observation mode of :class:`pokebattle_rl_env.pokebattle_env.PokeBattleEnv`.
+        player (str): The side to replay replay logs from.
+        chunksize (int): The number of files sent to a worker at once. Increase for many small files.
+
+    Yields:
+        :class:`Transition`: The transitions of all logs.
+    """
+    replay = partial(replay_file, observation_mode=observation_mode, player=player)
+    if processes == 0:
+        for path in paths:
+            yield from replay(path)
+        return
+    with Pool(processes) as pool:
+        for transitions in pool.imap_unordered(replay, paths, chunksize):
+            yield from transitions
@@ -0,0 +1,249 @@
+"""A lightweight stand-in for a Pokemon Showdown server, replaying recorded battles to its clients.
+
+:class:`ScriptedShowdownServer` speaks the subset of the protocol used by
+:class:`pokebattle_rl_env.showdown_simulator.ShowdownSimulator` and
+:class:`pokebattle_rl_env.async_showdown_simulator.AsyncShowdownClient`: it sends a `|challstr|`, accepts any name with
+`/trn`, starts battles on `/search` and on accepted `/challenge` and answers each `/move` or `/switch` with the next
+frames of a recorded battle, up to the `|win|`. It needs neither the internet nor Node.js, so it can be used for offline
+tests and to load-test hundreds of clients. The battles do not react to the choices of the clients.
+
+Run it standalone with `python -m pokebattle_rl_env.scripted_server battle_example.txt --port 8000` or in a background
+thread with :meth:`ScriptedShowdownServer.start`, and connect with :attr:`ScriptedShowdownServer.connection`.
+"""
+import asyncio
+from argparse import ArgumentParser
+from itertools import count
+from json import dumps
+from threading import Event, Thread
+
+import websockets
+
+from pokebattle_rl_env.replay import find_player_sides, read_protocol_log
+from pokebattle_rl_env.showdown_simulator import ShowdownConnection, toid
+from pokebattle_rl_env.util import generate_token
+
+CHOICE_COMMANDS = {'/move', '/switch', '/choose'}
+
+
+class BattleScript:
+    """A recorded battle from the perspective of one player.
+
+    Attributes:
+        player (str): The name of the recorded player, replaced by the name of the client the battle is replayed to.
+        opponent (str): The name of the recorded opponent.
+        steps (list): The frames (without the room id line) to send at the start of the battle, followed by the frames
+            to send after each choice of the player.
+    """
+    def __init__(self, player, opponent, steps):
+        self.player = player
+        self.opponent = opponent
+        self.steps = steps
+
+    def frames(self, step, username):
+        """Returns the frames of step `step` as seen by the client `username`."""
+        return [frame.replace(self.player, username) for frame in self.steps[step]]
+
+
+def read_battle_scripts(text):
+    """Splits a protocol log like `battle_example.txt` into a :class:`BattleScript` per battle room.
+
+    The frames received between two commands sent to a room form a step. Battles missing the `|init|battle` or the
+    `|player|` messages in the log get them added, so that clients can follow them.
+    """
+    events = read_protocol_log(text)
+    sides = find_player_sides(events)
+    rooms = {}
+    for kind, msg in events:
+        if kind == 'recv':
+            if not msg.startswith('>'):
+                continue
+            room_id, _, frame = msg.partition('\n')
+            rooms.setdefault(room_id[1:], [[]])[-1].append(frame)
+        else:
+            room_id = msg.split('|', 1)[0]
+            if room_id in rooms:
+                rooms[room_id].append([])
+    scripts = []
+    for room_id, steps in rooms.items():
+        if room_id not in sides:
+            continue
+        player, side = sides[room_id]
+        frames = '\n'.join(frame for step in steps for frame in step)
+        names = [line.split('|')[3] for line in frames.split('\n') if line.startswith('|player|')]
+        opponent = next((name for name in names if name != player), 'opponent')
+        start = []
+        if '|init|battle' not in frames:
+            start.append('|init|battle')
+        if not names:
+            other_side = 'p2' if side == 'p1' else 'p1'
+            start.append(f'|player|{side}|{player}|1\n|player|{other_side}|{opponent}|1')
+        steps[0] = start + steps[0]
+        scripts.append(BattleScript(player, opponent, [step for step in steps if step]))
+    return scripts
+
+
+class ScriptedUser:
+    """A client connected to a :class:`ScriptedShowdownServer`.
+
+    Attributes:
+        name (str): The name chosen with `/trn`.
+        battles (dict): Maps the room ids of the user's battles to their :class:`BattleScript` and next step.
+        challenge (tuple): The user id and format of the user's pending challenge.
+    """
+    def __init__(self, ws):
+        self.ws = ws
+        self.name = None
+        self.battles = {}
+        self.challenge = None
+
+
+class ScriptedShowdownServer:
+    """Serves the battles of :attr:`scripts` over WebSocket, see the module documentation.
+
+    Attributes:
+        scripts (list): The :class:`BattleScript` to replay. Each battle replays the next script in turn.
+        host (str): The host to listen on.
+        port (int): The port to listen on. If 0, a free port is chosen when the server starts.
+        frame_delay (float): The seconds to wait before sending each frame, to simulate a slower server.
+        users (dict): Maps the user ids of the logged in clients to their :class:`ScriptedUser`.
+    """
+    def __init__(self, scripts, host='localhost', port=0, frame_delay=0):
+        self.scripts = scripts
+        self.host = host
+        self.port = port
+        self.frame_delay = frame_delay
+        self.users = {}
+        self.battle_ids = count(1)
+        self.script_ids = count()
+        self.server = None
+        self.loop = None
+        self.thread = None
+
+    @property
+    def connection(self):
+        """The :class:`pokebattle_rl_env.showdown_simulator.ShowdownConnection` to connect clients with."""
+        return ShowdownConnection(self.host, self.port, False, self.host, self.port, False, login_server=False)
+
+    async def handle_connection(self, ws):
+        user = ScriptedUser(ws)
+        await ws.send(f'|challstr|4|{generate_token(128)}')
+        try:
+            async for msg in ws:
+                await self.handle(user, msg)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            if user.name is not None and self.users.get(toid(user.name)) is user:
+                del self.users[toid(user.name)]
+
+    async def handle(self, user, msg):
+        room_id, _, command = msg.partition('|')
+        name, _, argument = command.partition(' ')
+        if name == '/trn':
+            user.name = argument.split(',')[0]
+            self.users[toid(user.name)] = user
+            await user.ws.send(f'|updateuser| {user.name}|1|1|{{}}')
+        elif name == '/search':
+            await self.start_battle([user], argument)
+        elif name == '/challenge':
+            opponent, _, battle_format = argument.partition(',')
+            target = self.users.get(toid(opponent))
+            if target is not None:
+                user.challenge = toid(opponent), battle_format.strip()
+                challenges = {'challengesFrom': {user.name: battle_format.strip()}, 'challengeTo': None}
+                await target.ws.send(f'|updatechallenges|{dumps(challenges)}')
+        elif name == '/cancelchallenge':
+            user.challenge = None
+        elif name == '/accept':
+            challenger = self.users.get(toid(argument))
+            if challenger is not None and challenger.challenge is not None and \
+                    challenger.challenge[0] == toid(user.name):
+                battle_format = challenger.challenge[1]
+                challenger.challenge = None
+                await self.start_battle([challenger, user], battle_format)
+        elif name in CHOICE_COMMANDS:
+            await self.advance(user, room_id)
+        elif name == '/forfeit' and room_id in user.battles:
+            script = user.battles.pop(room_id)[0]
+            await self.send(user, room_id, [f'|-message|{user.name} forfeited.', f'|win|{script.opponent}'])
+        elif name == '/leave':
+            user.battles.pop(argument, None)
+
+    async def start_battle(self, users, battle_format):
+        room_id = f'battle-{battle_format}-{next(self.battle_ids)}'
+        for user in users:
+            user.battles[room_id] = [self.scripts[next(self.script_ids) % len(self.scripts)], 0]
+            await user.ws.send(f'|updatesearch|{dumps({"searching": [], "games": {room_id: battle_format}})}')
+            await self.advance(user, room_id)
+
+    async def advance(self, user, room_id):
+        """Sends the next step of the battle in `room_id` to `user`. A battle whose script ran out ends in a tie."""
+        battle = user.battles.get(room_id)
+        if battle is None:
+            return
+        script, step = battle
+        if step < len(script.steps):
+            battle[1] += 1
+            await self.send(user, room_id, script.frames(step, user.name))
+        else:
+            del user.battles[room_id]
+            await self.send(user, room_id, ['|tie'])
+
+    async def send(self, user, room_id, frames):
+        for frame in frames:
+            if self.frame_delay:
+                await asyncio.sleep(self.frame_delay)
+            await user.ws.send(f'>{room_id}\n{frame}')
+
+    async def serve(self):
+        """Starts listening. Sets :attr:`port` to the port chosen if it was 0."""
+        self.server = await websockets.serve(self.handle_connection, self.host, self.port, max_size=None)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def start(self):
+        """Runs the server in a background thread and returns once it listens."""
+        listening = Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.serve())
+            listening.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.close())
+            self.loop.close()
+        self.thread = Thread(target=run, daemon=True)
+        self.thread.start()
+        listening.wait()
+
+    def stop(self):
+        """Stops a server started with :meth:`start`."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def main():
+    parser = ArgumentParser(description='Serves recorded battles to Pokemon Showdown clients')
+    parser.add_argument('logs', nargs='+', help='Protocol logs like battle_example.txt to replay')
+    parser.add_argument('--host', type=str, default='localhost', help='The host to listen on')
+    parser.add_argument('-p', '--port', type=int, default=8000, help='The port to listen on')
+    parser.add_argument('-d', '--frame-delay', type=float, default=0, help='Seconds to wait before sending a frame')
+    args = parser.parse_args()
+    scripts = []
+    for path in args.logs:
+        with open(path, 'r', encoding='utf-8') as file:
+            scripts.extend(read_battle_scripts(file.read()))
+    server = ScriptedShowdownServer(scripts, args.host, args.port, args.frame_delay)
+
+    async def serve_forever():
+        await server.serve()
+        print(f'Serving {len(scripts)} battles at {server.connection.ws_url}')
+        await asyncio.Future()
+    asyncio.run(serve_forever())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Shared-memory transport of observations between environment workers and a learner on the same host.
+
+Instead of serializing the large dense observations of a sample batch, a worker writes them into its
+:class:`SharedObservationRing` and sends only their sequence numbers (see :func:`pack_observations`). The learner
+attaches to the ring by its :attr:`SharedObservationRing.spec` and reads the observations back without copying them
+through the object store (see :func:`unpack_observations`)::
+
+    ring = SharedObservationRing(capacity=16384, shape=env.observation_space.shape)  # In the worker
+    learner_ring = SharedObservationRing.attach(ring.spec)  # In the learner, with the spec sent once
+
+Requires Python 3.8 or newer.
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+
+HEADER_SIZE = 64  # Bytes before the observations, holding the number of observations written so far
+OBSERVATION_KEYS = ('obs', 'new_obs')
+
+
+class SharedObservationRing:
+    """A ring buffer of observations in shared memory, written by a single process and read by any number of processes.
+
+    Every written observation gets the next sequence number. An observation stays readable until :attr:`capacity`
+    further observations have been written, so choose a capacity of at least the number of steps in flight.
+
+    Attributes:
+        capacity (int): The number of observations the ring holds.
+        shape (tuple): The shape of an observation.
+        dtype (:class:`numpy.dtype`): The dtype of the observations.
+        memory (:class:`multiprocessing.shared_memory.SharedMemory`): The shared memory block of the ring.
+        observations (:class:`numpy.ndarray`): The slots of the ring, backed by :attr:`memory`.
+    """
+    def __init__(self, capacity, shape, dtype=np.float32, name=None):
+        self.capacity = capacity
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+        size = HEADER_SIZE + capacity * int(np.prod(self.shape)) * self.dtype.itemsize
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.counter = np.ndarray((1,), dtype=np.int64, buffer=self.memory.buf)
+        self.observations = np.ndarray((capacity,) + self.shape, dtype=self.dtype, buffer=self.memory.buf,
+                                       offset=HEADER_SIZE)
+        if self.owner:
+            self.counter[0] = 0
+
+    @property
+    def spec(self):
+        """The picklable arguments of :meth:`attach` to access this ring from another process."""
+        return self.memory.name, self.capacity, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, spec):
+        """Attaches to the ring created by another process with the given :attr:`spec`."""
+        name, capacity, shape, dtype = spec
+        return cls(capacity, shape, dtype, name=name)
+
+    @property
+    def written(self):
+        """The number of observations written so far, which is the sequence number of the next observation."""
+        return int(self.counter[0])
+
+    def holds(self, sequence_number):
+        """Returns whether the observation with the given sequence number is written and not overwritten yet."""
+        written = self.written
+        return written - self.capacity <= sequence_number < written
+
+    def write(self, observations):
+        """Appends a batch of observations (along the first axis).
+
+        Returns:
+            :class:`numpy.ndarray`: The sequence numbers of the observations.
+        """
+        observations = np.asarray(observations).reshape((-1,) + self.shape)
+        if len(observations) > self.capacity:
+            raise ValueError(f'Cannot write {len(observations)} observations to a ring of capacity {self.capacity}')
+        start = self.written
+        sequence_numbers = np.arange(start, start + len(observations))
+        slot = start % self.capacity
+        end = min(slot + len(observations), self.capacity)
+        self.observations[slot:end] = observations[:end - slot]
+        self.observations[:len(observations) - (end - slot)] = observations[end - slot:]
+        self.counter[0] = start + len(observations)
+        return sequence_numbers
+
+    def read(self, sequence_numbers):
+        """Returns the observations with the given sequence numbers.
+
+        Consecutive sequence numbers not wrapping around the end of the ring are returned as a read-only view into the
+        shared memory without copying; copy the view if it has to outlive the next :attr:`capacity` writes. Like a
+        seqlock, the number of written observations is checked again after reading, so observations overwritten by a
+        concurrent write while reading are detected.
+
+        Raises:
+            ValueError: If an observation was already overwritten or not written yet.
+        """
+        sequence_numbers = np.asarray(sequence_numbers, dtype=np.int64)
+        if len(sequence_numbers) == 0:
+            return self.observations[:0]
+        written = self.written
+        if sequence_numbers.min() < written - self.capacity or sequence_numbers.max() >= written:
+            raise ValueError(f'Observations {sequence_numbers.min()} to {sequence_numbers.max()} are not in the ring '
+                             f'(holding {max(written - self.capacity, 0)} to {written - 1})')
+        first = int(sequence_numbers[0]) % self.capacity
+        if first + len(sequence_numbers) <= self.capacity and np.all(np.diff(sequence_numbers) == 1):
+            observations = self.observations[first:first + len(sequence_numbers)]
+            observations.flags.writeable = False
+        else:
+            observations = self.observations[sequence_numbers % self.capacity]
+        if not self.holds(sequence_numbers.min()):
+            raise ValueError(f'Observations from {sequence_numbers.min()} were overwritten while reading them')
+        return observations
+
+    def close(self):
+        """Detaches from the ring. The process that created the ring also frees the shared memory."""
+        self.counter = None
+        self.observations = None
+        self.memory.close()
+        if self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:  # Already freed by the exit of an attached process
+                pass
+
+
+def pack_observations(batch, ring, keys=OBSERVATION_KEYS):
+    """Writes the observation columns `keys` of the sample batch `batch` into `ring` and replaces them by their
+    sequence numbers. Call in the worker before returning the batch."""
+    for key in keys:
+        batch[key] = ring.write(batch[key])
+    return batch
+
+
+def unpack_observations(batch, ring, keys=OBSERVATION_KEYS, copy=False):
+    """Replaces the sequence numbers in the columns `keys` of a batch packed by :func:`pack_observations` by the
+    observations read from `ring`. Call in the learner after receiving the batch.
+
+    The observations are read-only views into the ring where possible (see :meth:`SharedObservationRing.read`), so the
+    batch must be consumed (e.g. concatenated into the train batch) before the worker wraps around the ring. Size the
+    ring to at least the steps the learner holds plus the steps in flight. Pass `copy=True` if that cannot be
+    guaranteed, at the cost of copying every observation.
+    """
+    for key in keys:
+        observations = ring.read(batch[key])
+        batch[key] = np.array(observations) if copy else observations
+    return batch
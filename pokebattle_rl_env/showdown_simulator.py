@@ -1,20 +1,36 @@
 import webbrowser
+from functools import lru_cache
 from json import loads
-from logging import getLogger, debug, info, warning, DEBUG, FileHandler
-from os.path import isfile
+from logging import getLogger, debug, info, warning, DEBUG
+from logging.handlers import RotatingFileHandler
+from os.path import abspath, isfile
 from random import random
-from time import sleep
+from time import monotonic, perf_counter, sleep
 
-from requests import post
+from requests import Session
 from websocket import WebSocket
 from websocket._exceptions import WebSocketTimeoutException
 
+try:
+    from orjson import loads as loads_json  # Optional, decodes `|request|` payloads several times faster
+except ImportError:
+    loads_json = loads
+
 from pokebattle_rl_env.battle_simulator import BattleSimulator
 from pokebattle_rl_env.game_state import BattleEffect, GameState, Move
+from pokebattle_rl_env.matchmaking import DEFAULT_MATCH_TIMEOUT, get_matchmaker
 from pokebattle_rl_env.poke_data_queries import get_move_by_name, ability_name_to_id, item_name_to_id
 from pokebattle_rl_env.util import generate_username, generate_token
 
 SHOWDOWN_ACTION_URL = 'https://play.pokemonshowdown.com/action.php'
+ASSERTION_CACHE_SIZE = 256
+LOGGING_FILE_SIZE = 10 * 2 ** 20  # Bytes per logging file, before it is rotated
+LOGGING_FILE_BACKUPS = 5
+
+# Pools the HTTP connections to the login server across authentications
+http_session = Session()
+
+_logger = getLogger()
 
 
 def register(challstr, username, password):
@@ -43,7 +59,7 @@ def register(challstr, username, password):
         'password': password,
         'username': username
     }
-    response = post(SHOWDOWN_ACTION_URL, data=post_data)
+    response = http_session.post(SHOWDOWN_ACTION_URL, data=post_data)
     if response.text[0] != ']':
         raise ValueError('Invalid username and/or password')
     response = loads(response.text[1:])
@@ -52,9 +68,12 @@ def register(challstr, username, password):
     return response['assertion']
 
 
+@lru_cache(maxsize=ASSERTION_CACHE_SIZE)
 def login(challstr, username, password):
     """Logs into an existing account on https://pokemonshowdown.com.
 
+    Assertions are cached by their arguments, as an assertion stays valid for the connection that received `challstr`.
+
     Args:
         challstr (str): The challenge string sent by the Pokemon Showdown server. Obtain this string by connecting to
             the Pokemon Showdown WebSocket.
@@ -71,14 +90,15 @@ def login(challstr, username, password):
     if len(username) == 0 or len(password) == 0 or len(challstr) == 0:
         raise ValueError('Arguments must be non-empty.')
     post_data = {'act': 'login', 'name': username, 'pass': password, 'challstr': challstr}
-    response = post(SHOWDOWN_ACTION_URL, data=post_data)
+    response = http_session.post(SHOWDOWN_ACTION_URL, data=post_data)
     response = loads(response.text[1:])
     return response['assertion']
 
 
+@lru_cache(maxsize=ASSERTION_CACHE_SIZE)
 def auth_temp_user(challstr, username):
     """Logs into a temporary user account on https://pokemonshowdown.com. The account is not password protected and
-    deleted after a day.
+    deleted after a day. Assertions are cached like with :func:`login`.
 
     Args:
         challstr (str): The challenge string sent by the Pokemon Showdown server. Obtain this string by connecting to
@@ -94,10 +114,82 @@ def auth_temp_user(challstr, username):
     if len(username) == 0 or len(challstr) == 0:
         raise ValueError('Arguments must be non-empty.')
     post_data = {'act': 'getassertion', 'challstr': challstr, 'userid': username}
-    response = post(SHOWDOWN_ACTION_URL, data=post_data)
+    response = http_session.post(SHOWDOWN_ACTION_URL, data=post_data)
     return response.text
 
 
+@lru_cache(maxsize=None)
+def read_credentials(path):
+    """Reads the username and password of an authentication file, see :attr:`ShowdownSimulator.auth`."""
+    with open(path, 'r') as file:
+        username, password = file.read().splitlines()
+    return username, password
+
+
+def authenticate(auth, challstr, login_server=True):
+    """Obtains the assertion to log into https://pokemonshowdown.com with using one of the authentication methods of
+    :attr:`ShowdownSimulator.auth`.
+
+    Args:
+        auth (str): The authentication method, see :attr:`ShowdownSimulator.auth`.
+        challstr (str): The challenge string sent by the Pokemon Showdown server.
+        login_server (bool): Whether to obtain the assertion from the login server. If False, the username is chosen
+            without contacting the login server and the assertion is empty, see :attr:`ShowdownConnection.login_server`.
+
+    Returns:
+        tuple: The username, the password (None unless a new account was registered) and the assertion string.
+    """
+    if not login_server:
+        username = read_credentials(auth)[0] if isfile(auth) else generate_username()
+        return username, None, ''
+    if auth == 'register':
+        username = generate_username()
+        password = generate_token(16)
+        assertion = register(challstr=challstr, username=username, password=password)
+    elif isfile(auth):
+        username, login_password = read_credentials(auth)
+        password = None
+        assertion = login(challstr=challstr, username=username, password=login_password)
+    else:
+        username = generate_username()
+        password = None
+        assertion = auth_temp_user(challstr=challstr, username=username)
+    return username, password, assertion
+
+
+def attack_command(room_id, move, mega=False, z=False):
+    """Builds the command to use a move.
+
+    Examples:
+        >>> attack_command('battle-gen7randombattle-1', 2, mega=True)
+        'battle-gen7randombattle-1|/move 2 mega'
+    """
+    cmd = f'{room_id}|/move {move}'
+    cmd += ' mega' if mega else ''
+    cmd += ' zmove' if z else ''
+    return cmd
+
+
+def switch_command(room_id, pokemon):
+    """Builds the command to switch to the pokemon at position `pokemon` (2-6).
+
+    Examples:
+        >>> switch_command('battle-gen7randombattle-1', 3)
+        'battle-gen7randombattle-1|/switch 3'
+    """
+    return f'{room_id}|/switch {pokemon}'
+
+
+def toid(name):
+    """Converts a username to the user id used by Pokemon Showdown.
+
+    Examples:
+        >>> toid('Ash Ketchum-1')
+        'ashketchum1'
+    """
+    return ''.join(c for c in name.lower() if c.isalnum())
+
+
 def ident_to_name(ident):
     """Retrieves the pokemon name out of a pokemon identification string.
 
@@ -165,6 +257,7 @@ def parse_damage_heal(info, state, opponent_short):
         if max_health is not None:
             damaged.max_health = max_health
         damaged.health = health
+        state.mark_dirty(damaged)
 
 
 def parse_field(info, state, start=True):
@@ -198,6 +291,7 @@ def parse_mega(info, state, opponent_short):
     pokemon = next(p for p in pokemon if p.name == name)
     pokemon.item = info[3] if opponent_short in info[2] else pokemon.item
     pokemon.mega = True
+    state.mark_dirty(pokemon)
 
 
 def parse_boost(info, state, opponent_short, unboost=False):
@@ -208,6 +302,7 @@ def parse_boost(info, state, opponent_short, unboost=False):
         pokemon.stat_boosts[stat] += modifier * int(info[4])
     elif stat in pokemon.battle_stats:
         pokemon.battle_stats[stat] += modifier * int(info[4])
+    state.mark_dirty(pokemon)
 
 
 def parse_item(info, state, opponent_short, start=True):
@@ -219,6 +314,7 @@ def parse_item(info, state, opponent_short, start=True):
             pokemon.item = info[3]
         else:
             pokemon.item = None
+        state.mark_dirty(pokemon)
 
 
 def parse_sideeffect(info, state, opponent_short, start=True):
@@ -256,6 +352,7 @@ def parse_specieschange(info, state, opponent_short, details=True):
         pokemon.max_health = max_health if max_health is not None else 100
         if status is not None and not any(s.name == status for s in pokemon.statuses):
             pokemon.statuses.append(BattleEffect(status))
+    state.mark_dirty(pokemon)
 
 
 def parse_replace(info, state, opponent_short):
@@ -273,6 +370,8 @@ def parse_replace(info, state, opponent_short):
         if assumed_pokemon is not None:  # If Illusion user has already been detected, assumed pokemon is old illusion user estimation (makes sense if you think about it)
             assumed_pokemon.name = assumed_name
             assumed_pokemon.change_species(assumed_species)
+            state.mark_dirty(assumed_pokemon)
+        state.mark_dirty(pokemon)
 
 
 def parse_start_end(info, state, opponent_short, start=True):
@@ -283,6 +382,7 @@ def parse_start_end(info, state, opponent_short, start=True):
                 pokemon.statuses.append(BattleEffect('confusion'))
             else:
                 pokemon.statuses = [s for s in pokemon.statuses if s.name != 'confusion']
+            state.mark_dirty(pokemon)
 
 
 def parse_status(info, state, opponent_short, cure=False):
@@ -304,6 +404,7 @@ def parse_status(info, state, opponent_short, cure=False):
         else:
             if not any(s.name == status for s in affected.statuses):
                 affected.statuses.append(BattleEffect(status))
+        state.mark_dirty(affected)
 
 
 def parse_move(info, state, opponent_short):
@@ -314,6 +415,7 @@ def parse_move(info, state, opponent_short):
         if not used_move:
             used_move = Move(name=move_name)
             pokemon[0].moves.append(used_move)
+            state.mark_dirty(pokemon[0])
 
 
 def parse_switch(info, state, opponent_short):
@@ -326,6 +428,7 @@ def parse_switch(info, state, opponent_short):
         pokemon[0].change_species('Ditto')  # ToDo: Handle Mew
         pokemon[0].transformed = False
         pokemon[0].update()
+        state.mark_dirty(pokemon[0])
     health, max_health, status = parse_health_status(info[4])
     switched_in = next((p for p in pokemon if p.species == species or p.name == name), None)
     if switched_in is None:
@@ -341,6 +444,7 @@ def parse_switch(info, state, opponent_short):
     if status is not None and not any(s.name == state for s in switched_in.statuses):
         switched_in.statuses.append(BattleEffect(status))
     switched_in.update()
+    state.mark_dirty(switched_in)
     switched_index = pokemon.index(switched_in)
     pokemon[0], pokemon[switched_index] = pokemon[switched_index], pokemon[0]
 
@@ -365,6 +469,7 @@ def parse_auxiliary_info(info, state, opponent_short):
             of_pokemon.ability = ability
         if item is not None:
             of_pokemon.item = item
+        state.mark_dirty(of_pokemon)
 
 
 def sanitize_hidden_power(move_id):
@@ -373,12 +478,43 @@ def sanitize_hidden_power(move_id):
     return move_id
 
 
-def read_state_json(json, state):
-    json = loads(json)
-    pokemon_list = json['side']['pokemon']
+def request_fields(pokemon):
+    """Returns the fields of `pokemon` that :func:`read_state_json` sets from the pokemon's entry of a request."""
+    return (pokemon.name, pokemon.species, pokemon.gender, pokemon.level, pokemon.max_health, pokemon.health,
+            [status.name for status in pokemon.statuses], pokemon.stats, [move.id for move in pokemon.moves],
+            pokemon.item, pokemon.ability, pokemon.unknown)
+
+
+def read_state_json(json, state, cache=None):
+    """Updates the player's side of `state` from the JSON payload of a `|request|` message.
+
+    A status the pokemon already has keeps its effect, so that the turns counted by the upkeeps are kept.
+
+    Consecutive requests mostly repeat the side of the previous one, as only the pokemon involved in the last turn
+    change. If a `cache` dict is passed (and kept between calls for the same battle), the payload of the previous
+    request is remembered, an identical payload (e.g. a request sent again) is not decoded again and pokemon whose
+    entry did not change since the previous request are skipped, as long as no other message changed the fields set
+    from the entry (see :func:`request_fields`). The state is the same as without a cache.
+
+    Args:
+        json (str): The JSON payload of the request.
+        state (:class:`pokebattle_rl_env.game_state.GameState`): The state to update.
+        cache (dict): Holds the previous request between calls. Empty at the start of a battle.
+    """
+    if cache is not None and cache.get('payload') == json:
+        request = cache['request']
+    else:
+        request = loads_json(json)
+    previous_side = cache.get('side', ()) if cache is not None else ()
+    pokemon_list = request['side']['pokemon']
     for i in range(len(pokemon_list)):
         st_pokemon = state.player.pokemon[i]
         pokemon = pokemon_list[i]
+        # Skip pokemon whose entry is unchanged, unless they were swapped, the state was replaced or other messages
+        # changed them in the meantime
+        if i < len(previous_side) and previous_side[i][1] is st_pokemon and previous_side[i][0] == pokemon and \
+                previous_side[i][2] == request_fields(st_pokemon):
+            continue
         st_pokemon.name = ident_to_name(pokemon['ident'])
         st_pokemon.species, st_pokemon.gender, st_pokemon.level = parse_pokemon_details(pokemon['details'])
         health, max_health, status = parse_health_status(pokemon['condition'])
@@ -387,7 +523,8 @@ def read_state_json(json, state):
         st_pokemon.health = health
         confused_status = next((s for s in st_pokemon.statuses if s.name == 'confused'), None)
         if status is not None:
-            st_pokemon.statuses = [BattleEffect(status)]
+            st_pokemon.statuses = [next((s for s in st_pokemon.statuses if s.name == status), None) or
+                                   BattleEffect(status)]
         if confused_status is not None:
             st_pokemon.statuses.append(confused_status)
         st_pokemon.stats = pokemon['stats']
@@ -397,13 +534,20 @@ def read_state_json(json, state):
         st_pokemon.ability = pokemon['ability']
         st_pokemon.unknown = False
         st_pokemon.update()
+        state.mark_dirty(st_pokemon)
+    if cache is not None:
+        cache['payload'] = json
+        cache['request'] = request
+        cache['side'] = [(pokemon, state.player.pokemon[i], request_fields(state.player.pokemon[i]))
+                         for i, pokemon in enumerate(pokemon_list)]
 
     st_active_pokemon = state.player.pokemon[0]
+    state.mark_dirty(st_active_pokemon)
     st_active_pokemon.recharge = False
     st_active_pokemon.special_zmove_ix = None
-    if 'forceSwitch' not in json:
+    if 'forceSwitch' not in request:
         st_active_pokemon.locked_move_first_index = False
-        active_pokemon = json['active'][0]
+        active_pokemon = request['active'][0]
         moves = active_pokemon['moves']
         st_active_pokemon.trapped = \
             active_pokemon['trapped'] if 'trapped' in active_pokemon else \
@@ -420,18 +564,258 @@ def read_state_json(json, state):
                 move.disabled = not move.id == enabled_move_id
             st_active_pokemon.locked_move_first_index = True
         else:
-            st_active_pokemon.moves = []
-            for move in moves:
-                move_id = move['id']
-                move_id = sanitize_hidden_power(move_id)
-                move = Move(id=move_id, pp=move['pp'], disabled=move['disabled'])
-                st_active_pokemon.moves.append(move)
+            move_ids = [sanitize_hidden_power(move['id']) for move in moves]
+            if [move.id for move in st_active_pokemon.moves] == move_ids:
+                # Usually only PP and disabled flags change between turns
+                for st_move, move in zip(st_active_pokemon.moves, moves):
+                    st_move.pp = move['pp']
+                    st_move.disabled = move['disabled']
+            else:
+                st_active_pokemon.moves = [Move(id=move_id, pp=move['pp'], disabled=move['disabled'])
+                                           for move_id, move in zip(move_ids, moves)]
             if 'canZMove' in active_pokemon:
                 zmoves = active_pokemon['canZMove']
                 st_active_pokemon.special_zmove_ix = next(i for i in range(len(zmoves)) if zmoves[i] is not None)
     else:
         st_active_pokemon.trapped = False
-        state.player.force_switch = json['forceSwitch'][0]
+        state.player.force_switch = request['forceSwitch'][0]
+
+
+MESSAGE_HANDLERS = {}
+
+
+def message_handler(*message_types):
+    """Registers the decorated function as handler of the given message types (the second field of a protocol line,
+    e.g. `'-damage'` for `|-damage|p2a: Metagross|39/100`) in :data:`MESSAGE_HANDLERS`.
+
+    Handlers are called as `handler(simulator, info, msg)` with the :class:`ShowdownSimulator` parsing the message, the
+    line split at `|` and the raw line. A handler returns True if the simulator has to wait for the agent's next action
+    after this line. Registering a handler for an already handled message type replaces the existing handler. Message
+    types without handler are skipped. To change the handlers of a single simulator only, modify its
+    :attr:`ShowdownSimulator.message_handlers` instead.
+
+    Examples:
+        >>> @message_handler('-crit')
+        ... def count_crits(simulator, info, msg):
+        ...     simulator.crits = getattr(simulator, 'crits', 0) + 1
+        >>> del MESSAGE_HANDLERS['-crit']
+    """
+    def register(handler):
+        for message_type in message_types:
+            MESSAGE_HANDLERS[message_type] = handler
+        return handler
+    return register
+
+
+@message_handler('player')
+def handle_player(simulator, info, msg):
+    if info[3] == simulator.username:
+        simulator.player_short = info[2]
+        simulator.state.player.name = info[3]
+    else:
+        simulator.opponent = info[3]
+        simulator.state.opponent.name = simulator.opponent
+        simulator.opponent_short = info[2]
+
+
+@message_handler('win')
+def handle_win(simulator, info, msg):
+    winner = msg[len('|win|'):]
+    simulator.state.state = 'win' if winner == simulator.state.player.name else 'loss'
+    return True
+
+
+@message_handler('tie')
+def handle_tie(simulator, info, msg):
+    simulator.state.state = 'tie'
+    return True
+
+
+@message_handler('turn')
+def handle_turn(simulator, info, msg):
+    simulator.state.turn = int(info[2])
+    if simulator.state.turn == 1:
+        simulator.state.state = 'ongoing'
+    return True
+
+
+@message_handler('html')
+def handle_html(simulator, info, msg):
+    if info[2] == "<div class=\"broadcast-red\"><b>The battle crashed</b><br />Don't worry, we're working on fixing it.</div>":
+        simulator.state.state = 'tie'
+        return True
+
+
+@message_handler('request')
+def handle_request(simulator, info, msg):
+    if info[2].startswith('{"wait":true') and False:  # ToDo: Start battle on first action?
+        return True
+    elif info[2] != '' and not info[2].startswith('{"wait":true'):
+        if simulator.profiler is None:
+            read_state_json(info[2], simulator.state, simulator.request_cache)
+        else:
+            start = perf_counter()
+            read_state_json(info[2], simulator.state, simulator.request_cache)
+            simulator.profiler.record('request', perf_counter() - start)
+        return simulator.state.player.force_switch
+
+
+@message_handler('replace')
+def handle_replace(simulator, info, msg):
+    parse_replace(info, simulator.state, simulator.opponent_short)
+
+
+@message_handler('move')
+def handle_move(simulator, info, msg):
+    parse_move(info, simulator.state, simulator.opponent_short)
+
+
+@message_handler('upkeep')
+def handle_upkeep(simulator, info, msg):
+    state = simulator.state
+    for effect in state.field_effects + state.player_conditions + state.opponent_conditions:
+        effect.turn += 1
+    for pokemon in state.player.pokemon + state.opponent.pokemon:
+        for status in pokemon.statuses:
+            status.turn += 1
+        if pokemon.statuses:
+            state.mark_dirty(pokemon)
+
+
+@message_handler('error')
+def handle_error(simulator, info, msg):
+    warning(msg)
+    if simulator.battle_log is not None:
+        simulator.battle_log.fail()
+
+
+@message_handler('switch', 'drag')
+def handle_switch(simulator, info, msg):
+    parse_switch(info, simulator.state, simulator.opponent_short)
+
+
+@message_handler('-boost')
+def handle_boost(simulator, info, msg):
+    parse_boost(info, simulator.state, simulator.opponent_short)
+
+
+@message_handler('-unboost')
+def handle_unboost(simulator, info, msg):
+    parse_boost(info, simulator.state, simulator.opponent_short, unboost=True)
+
+
+@message_handler('-damage', '-heal')
+def handle_damage_heal(simulator, info, msg):
+    parse_damage_heal(info, simulator.state, simulator.opponent_short)
+
+
+@message_handler('-status')
+def handle_status(simulator, info, msg):
+    parse_status(info, simulator.state, simulator.opponent_short)
+
+
+@message_handler('-curestatus')
+def handle_curestatus(simulator, info, msg):
+    parse_status(info, simulator.state, simulator.opponent_short, cure=True)
+
+
+@message_handler('-message')
+def handle_message(simulator, info, msg):
+    if 'lost due to inactivity.' in info[2] or 'forfeited.' in info[2]:
+        simulator.state.forfeited = True
+
+
+@message_handler('-start')
+def handle_start(simulator, info, msg):
+    parse_start_end(info, simulator.state, simulator.opponent_short)
+
+
+@message_handler('-end')
+def handle_end(simulator, info, msg):
+    parse_start_end(info, simulator.state, simulator.opponent_short, start=False)
+
+
+@message_handler('-sidestart')
+def handle_sidestart(simulator, info, msg):
+    parse_sideeffect(info, simulator.state, simulator.opponent_short)
+
+
+@message_handler('-sideend')
+def handle_sideend(simulator, info, msg):
+    parse_sideeffect(info, simulator.state, simulator.opponent_short, start=False)
+
+
+@message_handler('-weather')
+def handle_weather(simulator, info, msg):
+    state = simulator.state
+    if info[2] == 'none':
+        state.weather = None
+    else:
+        if state.weather is not None and info[2] == state.weather.name and len(info) > 3 and info[3] == '[upkeep]':
+            state.weather.turn += 1
+        else:
+            state.weather = BattleEffect(info[2])
+
+
+@message_handler('-fieldstart')
+def handle_fieldstart(simulator, info, msg):
+    parse_field(info, simulator.state)
+
+
+@message_handler('-fieldend')
+def handle_fieldend(simulator, info, msg):
+    parse_field(info, simulator.state, start=False)
+
+
+@message_handler('-ability')
+def handle_ability(simulator, info, msg):
+    pokemon = ident_to_pokemon(info[2], simulator.state, simulator.opponent_short)
+    pokemon.ability = ability_name_to_id(info[3])
+    simulator.state.mark_dirty(pokemon)
+
+
+@message_handler('endability')
+def handle_endability(simulator, info, msg):
+    pokemon = ident_to_pokemon(info[2], simulator.state, simulator.opponent_short)
+    pokemon.ability = None
+    simulator.state.mark_dirty(pokemon)
+
+
+@message_handler('detailschange', '-formechange')
+def handle_specieschange(simulator, info, msg):
+    parse_specieschange(info, simulator.state, simulator.opponent_short)
+
+
+@message_handler('-transform')
+def handle_transform(simulator, info, msg):
+    pokemon = ident_to_pokemon(info[2], simulator.state, simulator.opponent_short)
+    to_pokemon = ident_to_pokemon(info[3], simulator.state, simulator.opponent_short)
+    pokemon.change_species(to_pokemon.species)
+    pokemon.transformed = True
+    simulator.state.mark_dirty(pokemon)
+
+
+@message_handler('-mega')
+def handle_mega(simulator, info, msg):
+    parse_mega(info, simulator.state, simulator.opponent_short)
+
+
+@message_handler('-item')
+def handle_item(simulator, info, msg):
+    parse_item(info, simulator.state, simulator.opponent_short)
+
+
+@message_handler('-enditem')
+def handle_enditem(simulator, info, msg):
+    parse_item(info, simulator.state, simulator.opponent_short, start=False)
+
+
+@message_handler('-zpower')
+def handle_zpower(simulator, info, msg):
+    if simulator.opponent_short in msg:
+        simulator.state.opponent.z_used = True
+    else:
+        simulator.state.player.z_used = True
 
 
 class ShowdownConnection:
@@ -455,8 +839,11 @@ class ShowdownConnection:
         web_host (str): The hostname of the HTTP endpoint. Can be different from :attr:`ws_host`.
         web_port (int): The port of the HTTP endpoint.
         web_ssl (bool): Whether to use HTTPS. Keep in mind to use the corresponding :attr:`web_port` (most likely 433).
+        login_server (bool): Whether the instance authenticates users with the login server of
+            https://pokemonshowdown.com. Disable for instances accepting any username, like
+            :class:`pokebattle_rl_env.scripted_server.ScriptedShowdownServer`.
     """
-    def __init__(self, ws_host, ws_port, ws_ssl, web_host, web_port, web_ssl):
+    def __init__(self, ws_host, ws_port, ws_ssl, web_host, web_port, web_ssl, login_server=True):
         self.ws_host = ws_host
         self.ws_port = ws_port
         self.ws_ssl = ws_ssl
@@ -465,6 +852,7 @@ class ShowdownConnection:
         self.web_port = web_port
         self.web_ssl = web_ssl
         self.web_url = ('https' if web_ssl else 'http') + f'://{web_host}:{web_port}'
+        self.login_server = login_server
 
 
 DEFAULT_PUBLIC_CONNECTION = ShowdownConnection(
@@ -486,6 +874,17 @@ DEFAULT_LOCAL_CONNECTION = ShowdownConnection(
 )
 
 
+def add_logging_file(path):
+    """Logs debug output to the rotated file `path`, unless it is already logged to. The handlers already set up, e.g.
+    for console output, are kept."""
+    path = abspath(path)
+    if any(getattr(handler, 'baseFilename', None) == path for handler in _logger.handlers):
+        return
+    _logger.setLevel(DEBUG)
+    _logger.addHandler(RotatingFileHandler(path, maxBytes=LOGGING_FILE_SIZE, backupCount=LOGGING_FILE_BACKUPS,
+                                           encoding='utf-8'))
+
+
 class ShowdownSimulator(BattleSimulator):
     """A :class:`pokebattle_rl_env.battle_simulator.BattleSimulator` using
     `Pokemon Showdown <https://pokemonshowdown.com>`_ as backend.
@@ -504,9 +903,8 @@ class ShowdownSimulator(BattleSimulator):
               the username and the second line specifies the password.
 
 
-        self_play (bool): Whether to use self play. Note that this is a naive self play-implementation. In fact, agents
-            simply play against other agents - a temporary text file keeps track of the battles. Thus, self play only
-            works if `number of agents % 2 == 0`. If :attr:`self_play` is false, the agent will battle against random
+        self_play (bool): Whether to use self play. Agents are paired by :attr:`matchmaker` and battle each other by
+            challenging and accepting. If :attr:`self_play` is false, the agent will battle against random
             human opponents. Keep in mind that this self-play implementation is redundant if multiple agents are
             deployed on a local Pokemon Showdown instance (see :attr:`connection`) without human players. If
             https://github.com/Zarel/Pokemon-Showdown/blob/master/ladders.js#L470 and
@@ -518,25 +916,42 @@ class ShowdownSimulator(BattleSimulator):
             installation instructions. Obviously, if self play is not desired, using a local/custom instance is only
             recommended if there are human players on it. Otherwise, set :attr:`connection` to
             :const:`DEFAULT_PUBLIC_CONNECTION` to use the public connection at https://play.pokemonshowdown.com.
-        logging_file (bool): Specify the path to a file to log debug output.
+        logging_file (str): Specify the path to a file to log debug output to. The file is rotated at
+            :data:`LOGGING_FILE_SIZE` bytes. Protocol messages are not logged there, use :attr:`battle_log` instead.
+        matchmaker (:class:`pokebattle_rl_env.matchmaking.Matchmaker`): Pairs self-playing agents. Defaults to a
+            matchmaker shared by the simulators of this process. Use
+            :func:`pokebattle_rl_env.matchmaking.connect_matchmaker` to pair agents of several processes.
+        battle_format (str): The format to battle in.
+        pipelined_reset (bool): Whether to search for the next battle as soon as the current one has finished, instead
+            of when :meth:`reset` is called. The server then sets up the next battle while the agent processes the end
+            of the current one, so :meth:`reset` returns almost immediately. Not supported with :attr:`self_play`.
         room_id (str): The string used to identify the current battle (room).
+        message_handlers (dict): Maps protocol message types to their handlers. Initialized from
+            :data:`MESSAGE_HANDLERS`, see :func:`message_handler`.
+        battle_log (:class:`pokebattle_rl_env.battle_log.BattleLog`): Records the protocol messages of each battle and
+            writes them for sampled or failed battles. Protocol messages are not logged if None.
     """
-    def __init__(self, auth='', self_play=False, connection=DEFAULT_LOCAL_CONNECTION, logging_file=None):
+    def __init__(self, auth='', self_play=False, connection=DEFAULT_LOCAL_CONNECTION, logging_file=None,
+                 matchmaker=None, battle_format='gen7unratedrandombattle', pipelined_reset=False, battle_log=None):
         info('Using Showdown backend')
         self.state = GameState()
         self.auth = auth
         self.self_play = self_play
         self.connection = connection
         if logging_file is not None:
-            logger = getLogger()
-            logger.removeHandler(logger.handlers[0])
-            logger.setLevel(DEBUG)
-            handler = FileHandler(filename=logging_file, mode='w', encoding='utf-8')
-            logger.addHandler(handler)
+            add_logging_file(logging_file)
+        self.battle_log = battle_log
         self.room_id = None
         self.ws = None
-        if self_play:
-            self.self_play_opponent = None
+        self.message_handlers = dict(MESSAGE_HANDLERS)
+        if self_play and matchmaker is None:
+            matchmaker = get_matchmaker()
+        self.matchmaker = matchmaker
+        self.battle_format = battle_format
+        self.pipelined_reset = pipelined_reset and not self_play
+        self.next_battle_requested = False
+        self.opponent = None
+        self.request_cache = {}
         super().__init__()
 
     def _connect(self, auth):
@@ -547,19 +962,7 @@ class ShowdownSimulator(BattleSimulator):
         while not msg.startswith('|challstr|'):
             msg = self.ws.recv()
         challstr = msg[msg.find('|challstr|') + len('|challstr|'):]
-        if auth == 'register':
-            self.username = generate_username()
-            self.password = generate_token(16)
-            assertion = register(challstr=challstr, username=self.username, password=self.password)
-        elif isfile(auth):
-            with open(auth, 'r') as file:
-                self.username, password = file.read().splitlines()
-                self.password = None
-            assertion = login(challstr=challstr, username=self.username, password=password)
-        else:
-            self.username = generate_username()
-            self.password = None
-            assertion = auth_temp_user(challstr=challstr, username=self.username)
+        self.username, self.password, assertion = authenticate(auth, challstr, self.connection.login_server)
         login_cmd = f'|/trn {self.username},0,{assertion}'
         self.ws.send(login_cmd)
         msg = ''
@@ -568,150 +971,88 @@ class ShowdownSimulator(BattleSimulator):
             debug(msg)
 
     def _attack(self, move, mega=False, z=False):
-        cmd = f'{self.room_id}|/move {move}'
-        cmd += ' mega' if mega else ''
-        cmd += ' zmove' if z else ''
-        debug(cmd)
+        cmd = attack_command(self.room_id, move, mega, z)
+        if self.battle_log is not None:
+            self.battle_log.record('send', cmd)
         self.ws.send(cmd)
 
     def _switch(self, pokemon):
-        cmd = f'{self.room_id}|/switch {pokemon}'
-        debug(cmd)
+        cmd = switch_command(self.room_id, pokemon)
+        if self.battle_log is not None:
+            self.battle_log.record('send', cmd)
         self.ws.send(cmd)
         pokemon_list = self.state.player.pokemon
         pokemon_list[0], pokemon_list[pokemon - 1] = pokemon_list[pokemon - 1], pokemon_list[0]
     counter = 0
     def _update_state(self):
         self.counter += 1
-        debug('%s, %s, %s', self.username, self.state.player.name, self.counter)
         end = False
-        while not end:
-            msg = self.ws.recv()
-            end = self._parse_message(msg)
+        profiler = self.profiler
+        try:
+            while not end:
+                if profiler is None:
+                    msg = self.ws.recv()
+                    end = self._parse_message(msg)
+                else:
+                    start = perf_counter()
+                    msg = self.ws.recv()
+                    received = perf_counter()
+                    end = self._parse_message(msg)
+                    profiler.record('recv', received - start)
+                    profiler.record('parse', perf_counter() - received)
+                    profiler.count('frames')
+                    profiler.count('bytes_received', len(msg))
+        except Exception:
+            self._fail_battle_log()
+            raise
+        if self.pipelined_reset and self.state.state in ('win', 'loss', 'tie'):
+            self._request_next_battle()
+
+    def _fail_battle_log(self):
+        """Writes the log of the current battle after an error, as the battle may never be left regularly."""
+        if self.battle_log is not None:
+            self.battle_log.fail()
+            self.battle_log.finish(self.room_id or 'unknown-room')
+
+    def _request_next_battle(self):
+        """Searches for the next battle, unless that already happened."""
+        if not self.next_battle_requested:
+            cmd = f'|/search {self.battle_format}'
+            self.ws.send(cmd)
+            debug(cmd)
+            self.next_battle_requested = True
 
     def _parse_message(self, msg):
+        lines = msg.split('\n')
         if self.room_id is None and '|init|battle' in msg:
-            self.room_id = msg.split('\n')[0][1:]
-        end = False
-        if not msg.startswith(f'>{self.room_id}'):
+            self.room_id = lines[0][1:]
+        if not lines[0].startswith(f'>{self.room_id}'):
             return False
-        debug(msg)
-        msgs = msg.split('\n')
-        for msg in msgs:
-            info = msg.split('|')
+        if self.battle_log is not None:
+            self.battle_log.record('recv', msg)
+        end = False
+        handlers = self.message_handlers
+        for line in lines:
+            info = line.split('|')
             if len(info) < 2:
                 continue
-            if info[1] == 'player':
-                if info[3] == self.username:
-                    self.player_short = info[2]
-                    self.state.player.name = info[3]
-                else:
-                    self.opponent = info[3]
-                    self.state.opponent.name = self.opponent
-                    self.opponent_short = info[2]
-            elif info[1] == 'win':
-                winner = msg[len('|win|'):]
-                self.state.state = 'win' if winner == self.state.player.name else 'loss'
-                end = True
-            elif info[1] == 'tie':
-                self.state.state = 'tie'
-                end = True
-            elif info[1] == 'turn':
-                self.state.turn = int(info[2])
-                if self.state.turn == 1:
-                    self.state.state = 'ongoing'
+            handler = handlers.get(info[1])
+            if handler is not None and handler(self, info, line):
                 end = True
-            elif info[1] == 'html':
-                if info[2] == "<div class=\"broadcast-red\"><b>The battle crashed</b><br />Don't worry, we're working on fixing it.</div>":
-                    self.state.state = 'tie'
-                    end = True
-            elif info[1] == 'request':
-                if info[2].startswith('{"wait":true') and False:  # ToDo: Start battle on first action?
-                    end = True
-                elif info[2] != '' and not info[2].startswith('{"wait":true'):
-                    read_state_json(info[2], self.state)
-                    end = self.state.player.force_switch
-            elif info[1] == 'replace':
-                parse_replace(info, self.state, self.opponent_short)
-            elif info[1] == 'move':
-                parse_move(info, self.state, self.opponent_short)
-            elif info[1] == 'upkeep':
-                for effect in self.state.field_effects + self.state.player_conditions + self.state.opponent_conditions:
-                    effect.turn += 1
-                for pokemon in self.state.player.pokemon + self.state.opponent.pokemon:
-                    for status in pokemon.statuses:
-                        status.turn += 1
-                pass
-            elif info[1] == 'error':
-                warning(msg)
-            elif info[1] == 'switch' or info[1] == 'drag':
-                parse_switch(info, self.state, self.opponent_short)
-            elif info[1] == '-boost':
-                parse_boost(info, self.state, self.opponent_short)
-            elif info[1] == '-unboost':
-                parse_boost(info, self.state, self.opponent_short, unboost=True)
-            elif info[1] == '-damage' or info[1] == '-heal':
-                parse_damage_heal(info, self.state, self.opponent_short)
-            elif info[1] == '-status':
-                parse_status(info, self.state, self.opponent_short)
-            elif info[1] == '-curestatus':
-                parse_status(info, self.state, self.opponent_short, cure=True)
-            elif info[1] == '-message':
-                if 'lost due to inactivity.' in info[2] or 'forfeited.' in info[2]:
-                    self.state.forfeited = True
-            elif info[1] == '-start':
-                parse_start_end(info, self.state, self.opponent_short)
-            elif info[1] == '-end':
-                parse_start_end(info, self.state, self.opponent_short, start=False)
-            elif info[1] == '-sidestart':
-                parse_sideeffect(info, self.state, self.opponent_short)
-            elif info[1] == '-sideend':
-                parse_sideeffect(info, self.state, self.opponent_short, start=False)
-            elif info[1] == '-weather':
-                if info[2] == 'none':
-                    self.state.weather = None
-                else:
-                    if self.state.weather is not None and info[2] == self.state.weather.name and len(info) > 3 and\
-                       info[3] == '[upkeep]':
-                        self.state.weather.turn += 1
-                    else:
-                        self.state.weather = BattleEffect(info[2])
-            elif info[1] == '-fieldstart':
-                parse_field(info, self.state)
-            elif info[1] == '-fieldend':
-                parse_field(info, self.state, start=False)
-            elif info[1] == '-ability':
-                pokemon = ident_to_pokemon(info[2], self.state, self.opponent_short)
-                ability = ability_name_to_id(info[3])
-                pokemon.ability = ability
-            elif info[1] == 'endability':
-                pokemon = ident_to_pokemon(info[2], self.state, self.opponent_short)
-                pokemon.ability = None
-            elif info[1] == 'detailschange':
-                parse_specieschange(info, self.state, self.opponent_short)
-            elif info[1] == '-formechange':
-                parse_specieschange(info, self.state, self.opponent_short, details=True)
-            elif info[1] == '-transform':
-                pokemon = ident_to_pokemon(info[2], self.state, self.opponent_short)
-                to_pokemon = ident_to_pokemon(info[3], self.state, self.opponent_short)
-                pokemon.change_species(to_pokemon.species)
-                pokemon.transformed = True
-            elif info[1] == '-mega':
-                parse_mega(info, self.state, self.opponent_short)
-            elif info[1] == '-item':
-                parse_item(info, self.state, self.opponent_short)
-            elif info[1] == '-enditem':
-                parse_item(info, self.state, self.opponent_short, start=False)
-            elif info[1] == '-zpower':
-                if self.opponent_short in msg:
-                    self.state.opponent.z_used = True
-                else:
-                    self.state.player.z_used = True
             # ToDo: |-zpower|POKEMON |move|POKEMON|MOVE|TARGET|[zeffect]
-            if '[of]' in msg:
+            if len(info) > 3 and '[of]' in line:
                 parse_auxiliary_info(info, self.state, self.opponent_short)
         return end
 
+    def _parse_line(self, info, line):
+        """Parses a single, already split protocol line outside of a room frame, e.g. from a replay. Returns whether
+        the line ends the current decision like :meth:`_parse_message`."""
+        handler = self.message_handlers.get(info[1])
+        end = handler is not None and handler(self, info, line)
+        if len(info) > 3 and '[of]' in line:
+            parse_auxiliary_info(info, self.state, self.opponent_short)
+        return bool(end)
+
     def render(self, mode='human'):
         """Renders the ongoing battle, if there is any.
 
@@ -724,9 +1065,68 @@ class ShowdownSimulator(BattleSimulator):
             browser_url = f'{self.connection.web_url}/{self.room_id}'
             webbrowser.open(browser_url)
 
+    def _find_self_play_battle(self):
+        """Asks :attr:`matchmaker` for opponents until a battle against one of them starts."""
+        while True:
+            match = self.matchmaker.find_match(self.username, DEFAULT_MATCH_TIMEOUT)
+            if match is None:
+                continue
+            opponent, challenge = match
+            if challenge:
+                cmd = f'|/challenge {opponent}, {self.battle_format}'
+                self.ws.send(cmd)
+                debug(cmd)
+                if self._wait_for_battle():
+                    break
+                cmd = f'|/cancelchallenge {opponent}'
+                self.ws.send(cmd)
+                debug(cmd)
+            elif self._accept_challenge(opponent):
+                break
+            warning('Self play opponent %s dropped out', opponent)
+        self.ws.settimeout(None)
+
+    def _receive_until(self, predicate, timeout=DEFAULT_MATCH_TIMEOUT):
+        """Receives messages until `predicate` holds for one of them and returns it, or returns None after `timeout`
+        seconds."""
+        deadline = monotonic() + timeout
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return None
+            self.ws.settimeout(remaining)
+            try:
+                msg = self.ws.recv()
+            except WebSocketTimeoutException:
+                return None
+            debug(msg)
+            if predicate(msg):
+                return msg
+
+    def _wait_for_battle(self):
+        msg = self._receive_until(lambda msg: '|init|battle' in msg)
+        if msg is None:
+            return False
+        self._parse_message(msg)
+        return True
+
+    def _accept_challenge(self, opponent):
+        def challenged(msg):
+            if not msg.startswith('|updatechallenges|'):
+                return False
+            challenges = loads(msg.split('|')[2]).get('challengesFrom') or {}
+            return any(toid(user) == toid(opponent) for user in challenges)
+        if self._receive_until(challenged) is None:
+            return False
+        cmd = f'|/accept {opponent}'
+        self.ws.send(cmd)
+        debug(cmd)
+        return self._wait_for_battle()
+
     def reset(self):
         """Resets the simulator to its initial state. Call this function prior to calling :meth:`act`. It automatically
-        sets up a new battle, even if there exists an ongoing battle.
+        sets up a new battle, even if there exists an ongoing battle. The WebSocket connection is kept open and
+        authenticated across resets.
         """
         debug('Reset %s', self.state.player.name)
         if self.state.state == 'ongoing':
@@ -734,103 +1134,23 @@ class ShowdownSimulator(BattleSimulator):
             self.ws.send(cmd)
             debug(cmd)
         if self.room_id is not None:
+            # The room is torn down while the next battle is set up. Its remaining messages are skipped by
+            # _parse_message, as they do not belong to the next room.
             cmd = f'|/leave {self.room_id}'
             self.ws.send(cmd)
             debug(cmd)
+            if self.battle_log is not None:
+                self.battle_log.finish(self.room_id)
             self.room_id = None
             self.state = GameState()
-            msg = ''
-            while 'deinit' not in msg:
-                msg = self.ws.recv()
-                debug(msg)
+            self.request_cache = {}
         if self.ws is None:
             self._connect(self.auth)
             info('Using username %s with password %s', self.username, self.password)
-        self.ws.send('|/utm null')  # Team
+            self.ws.send('|/utm null')  # Team
 
         if self.self_play:
-            self.ws.settimeout(None)
-            # Naive self play
-            with open('usernames', 'a') as file:
-                file.write(self.username + '\n')
-            lines = []
-            while len(lines) < 2:
-                with open('usernames', 'r') as file:
-                    lines = file.readlines()
-            usernames = [line[:-1] for line in lines]
-            print(self.counter, self.username, lines, usernames)
-            username_index = usernames.index(self.username)
-            if username_index % 2 == 0:
-                opponent = usernames[username_index + 1]
-                cmd = f'|/challenge {opponent}, gen7unratedrandombattle'
-                self.ws.send(cmd)
-                debug(cmd)
-            else:
-                while True:
-                    msg = self.ws.recv()
-                    debug(msg)
-                    if msg.startswith('|updatechallenges|'):
-                        json = loads(msg.split('|')[2])
-                        if 'challengesFrom' in json and json['challengesFrom']:
-                            opponent = next(iter(json['challengesFrom']))
-                            cmd = f'|/accept {opponent}'
-                            self.ws.send(cmd)
-                            debug(cmd)
-                            del lines[username_index - 1]
-                            del lines[username_index - 1]
-                            with open('usernames', 'w') as file:
-                                file.writelines(lines)
-                            break
-
-            # if self.self_play_opponent is None:
-            #     with open('usernames', 'a') as file:
-            #         file.write(self.username + '\n')
-            #     sleep(1 + random())
-            #     with open('usernames', 'r') as file:
-            #         lines = file.readlines()
-            #         usernames = [line[:-1] for line in lines]
-            #     username_index = usernames.index(self.username)
-            #     if username_index % 2 == 0:
-            #         self.self_play_opponent = usernames[username_index + 1]
-            #         self.ws.send(f'|/challenge {self.self_play_opponent}, gen7randombattle')
-            #         print(f'|/challenge {self.self_play_opponent}, gen7randombattle')
-            #     else:
-            #         self.self_play_opponent = self.username
-            #         while True:
-            #             msg = self.ws.recv()
-            #             if self.debug_output:
-            #                 print(msg)
-            #             if msg.startswith('|updatechallenges|'):
-            #                 json = loads(msg.split('|')[2])
-            #                 if 'challengesFrom' in json and json['challengesFrom']:
-            #                     self.self_play_opponent = next(iter(json['challengesFrom']))
-            #                     self.ws.send(f'|/accept {self.self_play_opponent}')
-            #                     if self.debug_output:
-            #                         print(f'|/accept {self.self_play_opponent}')
-            #                     del lines[username_index - 1]
-            #                     del lines[username_index - 1]
-            #                     with open('usernames', 'w') as file:
-            #                         file.writelines(lines)
-            #                     break
-            # elif self.self_play_opponent == self.username:
-            #     while True:
-            #         msg = self.ws.recv()
-            #         if self.debug_output:
-            #             print(msg)
-            #         if msg.startswith('|updatechallenges|'):
-            #             json = loads(msg.split('|')[2])
-            #             if 'challengesFrom' in json and json['challengesFrom']:
-            #                 opponent = next(iter(json['challengesFrom']))
-            #                 self.ws.send(f'|/accept {opponent}')
-            #                 if self.debug_output:
-            #                     print(f'|/accept {opponent}')
-            #                 break
-            # else:
-            #     self.ws.send(f'|/challenge {self.self_play_opponent}, gen7randombattle')
-            #     print(f'|/challenge {self.self_play_opponent}, gen7randombattle')
-
-
-
+            self._find_self_play_battle()
             # p >> |/challenge [OPPONENT], gen7randombattle
             # p << |updatechallenges|{"challengesFrom":{},"challengeTo":{"to":"[OPPONENT]","format":"gen7randombattle"}}
             # o << |updatechallenges|{"challengesFrom":{"[PLAYER]":"gen7randombattle"},"challengeTo":null}
@@ -840,7 +1160,8 @@ class ShowdownSimulator(BattleSimulator):
             # - << |updatesearch|{"searching":[],"games":{"battle-gen7randombattle-706502869":"[Gen 7] Random Battle"}}
         else:
             # Against human players or other agents
-            self.ws.send('|/search gen7unratedrandombattle')  # Tier
+            self._request_next_battle()
+        self.next_battle_requested = False
 
         self._update_state()
         if not self.self_play:
@@ -848,6 +1169,12 @@ class ShowdownSimulator(BattleSimulator):
         debug('Playing against %s', self.opponent)
 
     def close(self):
-        """Closes the connection to the WebSocket endpoint."""
+        """Closes the connection to the WebSocket endpoint, if the simulator ever connected."""
+        if self.ws is None:
+            return
+        if self.matchmaker is not None:
+            self.matchmaker.cancel(self.username)
+        if self.battle_log is not None:
+            self.battle_log.close(self.room_id)
         self.ws.close()
         info('Connection to Showdown Socket closed')
@@ -0,0 +1,171 @@
+from json import dump, load
+from os import makedirs, replace
+from os.path import isfile, join
+
+import numpy as np
+
+INDEX_FILE = 'index.json'
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def flatten_columns(record, prefix=''):
+    """Flattens nested dicts of values (e.g. observations of mode `index`) into columns named by their dotted path.
+
+    Examples:
+        >>> sorted(flatten_columns({'observation': {'categories': 1, 'numeric': 2}, 'reward': 0}))
+        ['observation.categories', 'observation.numeric', 'reward']
+    """
+    columns = {}
+    for name, value in record.items():
+        if isinstance(value, dict):
+            columns.update(flatten_columns(value, prefix=f'{prefix}{name}.'))
+        else:
+            columns[f'{prefix}{name}'] = value
+    return columns
+
+
+def chunk_path(directory, column, chunk):
+    return join(directory, f'{column}.{chunk:06d}.npy')
+
+
+class TrajectoryWriter:
+    """Appends steps of battles to a columnar store that :class:`TrajectoryReader` can memory-map.
+
+    Every column (e.g. observations, actions, action masks, rewards) is buffered and written in chunks of
+    :attr:`chunk_size` steps as one `.npy` file per column and chunk. The dtype and shape of a column are fixed by its
+    first value, later values must have the same shape and a dtype of the same kind (e.g. no floats in an integer
+    column). The index file listing columns and chunk lengths is rewritten after every chunk, so readers see every
+    chunk written so far. A writer opened on an existing store appends to it.
+
+    Attributes:
+        directory (str): The directory of the store. Created if it does not exist.
+        chunk_size (int): The number of steps per chunk.
+        columns (dict): Maps column names to their dtype and shape.
+        chunks (list): The number of steps of each written chunk.
+    """
+    def __init__(self, directory, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.columns = None
+        self.chunks = []
+        self.buffers = None
+        self.size = 0
+        makedirs(directory, exist_ok=True)
+        path = join(directory, INDEX_FILE)
+        if isfile(path):
+            with open(path, 'r') as file:
+                index = load(file)
+            self.chunks = index['chunks']
+            if index['columns']:
+                self.columns = {name: {'dtype': column['dtype'], 'shape': tuple(column['shape'])}
+                                for name, column in index['columns'].items()}
+
+    def append(self, **values):
+        """Appends a step. Pass the same columns for every step, e.g.
+        `append(observation=..., action=..., action_mask=..., reward=..., done=...)`."""
+        values = {name: np.asarray(value) for name, value in flatten_columns(values).items()}
+        if self.columns is None:
+            self.columns = {name: {'dtype': value.dtype.str, 'shape': value.shape} for name, value in values.items()}
+        elif values.keys() != self.columns.keys():
+            raise ValueError(f'Expected columns {sorted(self.columns)}, got {sorted(values)}')
+        if self.buffers is None:
+            self.buffers = {name: np.empty((self.chunk_size,) + column['shape'], dtype=column['dtype'])
+                            for name, column in self.columns.items()}
+        for name, value in values.items():
+            buffer = self.buffers[name]
+            if value.shape != buffer.shape[1:] or not np.can_cast(value.dtype, buffer.dtype, 'same_kind'):
+                raise ValueError(f'Expected {buffer.dtype} values of shape {buffer.shape[1:]} for column {name}, '
+                                 f'got {value.dtype} values of shape {value.shape}')
+            buffer[self.size] = value
+        self.size += 1
+        if self.size == self.chunk_size:
+            self.flush()
+
+    def extend(self, steps):
+        """Appends each step of `steps`, given as dicts or namedtuples (e.g.
+        :class:`pokebattle_rl_env.replay.Transition`)."""
+        for step in steps:
+            self.append(**(step._asdict() if hasattr(step, '_asdict') else step))
+
+    def flush(self):
+        """Writes the buffered steps as a new chunk."""
+        if self.size == 0:
+            return
+        chunk = len(self.chunks)
+        for name, buffer in self.buffers.items():
+            np.save(chunk_path(self.directory, name, chunk), buffer[:self.size])
+        self.chunks.append(self.size)
+        self.size = 0
+        self.write_index()
+
+    def write_index(self):
+        path = join(self.directory, INDEX_FILE)
+        with open(path + '.tmp', 'w') as file:
+            dump({'columns': self.columns or {}, 'chunks': self.chunks}, file)
+        replace(path + '.tmp', path)
+
+    def close(self):
+        self.flush()
+        if not self.chunks:
+            self.write_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TrajectoryReader:
+    """Memory-maps a store written by :class:`TrajectoryWriter` for zero-copy random access.
+
+    Attributes:
+        directory (str): The directory of the store.
+        columns (dict): Maps column names to the list of memory-mapped chunks of the column.
+        offsets (:class:`numpy.ndarray`): The index of the first step of each chunk, followed by the number of steps.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with open(join(directory, INDEX_FILE), 'r') as file:
+            index = load(file)
+        self.columns = {name: [np.load(chunk_path(directory, name, chunk), mmap_mode='r')
+                               for chunk in range(len(index['chunks']))]
+                        for name in index['columns']}
+        self.offsets = np.cumsum([0] + index['chunks'])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def locate(self, steps):
+        """Returns the chunks and positions within them of the given step indices."""
+        steps = np.asarray(steps)
+        if np.any((steps < 0) | (steps >= len(self))):
+            raise IndexError(f'Step out of range for store of {len(self)} steps')
+        chunks = np.searchsorted(self.offsets, steps, side='right') - 1
+        return chunks, steps - self.offsets[chunks]
+
+    def __getitem__(self, step):
+        """Returns the columns of a single step as read-only views into the memory-mapped chunks."""
+        chunk, position = (int(x) for x in self.locate(step))
+        return {name: chunks[chunk][position] for name, chunks in self.columns.items()}
+
+    def column(self, name):
+        """Returns the whole column `name` (copied into memory)."""
+        return np.concatenate(self.columns[name])
+
+    def get_batch(self, steps):
+        """Gathers the columns of many steps into arrays with the steps along the first axis."""
+        chunks, positions = self.locate(steps)
+        batch = {}
+        for name, column_chunks in self.columns.items():
+            first = column_chunks[0]
+            values = np.empty((len(chunks),) + first.shape[1:], dtype=first.dtype)
+            for chunk in np.unique(chunks):
+                selected = chunks == chunk
+                values[selected] = column_chunks[chunk][positions[selected]]
+            batch[name] = values
+        return batch
+
+    def sample(self, batch_size, random_state=np.random):
+        """Samples a batch of steps uniformly with replacement, see :meth:`get_batch`."""
+        return self.get_batch(random_state.randint(len(self), size=batch_size))
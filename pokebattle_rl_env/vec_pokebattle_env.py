@@ -0,0 +1,161 @@
+import asyncio
+from logging import warning
+from time import perf_counter
+
+import numpy as np
+
+from pokebattle_rl_env.async_showdown_simulator import AsyncShowdownClient, DEFAULT_BATTLE_FORMAT
+from pokebattle_rl_env.pokebattle_env import PokeBattleEnv
+from pokebattle_rl_env.showdown_simulator import DEFAULT_LOCAL_CONNECTION
+
+
+def batch_observations(observations):
+    """Stacks a list of observations of :class:`pokebattle_rl_env.pokebattle_env.PokeBattleEnv` into one batch."""
+    if isinstance(observations[0], dict):
+        return {key: np.stack([observation[key] for observation in observations]) for key in observations[0]}
+    return np.stack(observations)
+
+
+class VecPokeBattleEnv:
+    """Runs :attr:`num_envs` Pokemon battles concurrently in a single process.
+
+    All battles are played over a few shared connections using
+    :class:`pokebattle_rl_env.async_showdown_simulator.AsyncShowdownClient`, so stepping all battles takes about as long
+    as stepping the slowest one. Actions, observations, rewards and done flags are batched along the first axis, which
+    lets a policy compute the actions of all battles in a single forward pass.
+
+    A battle that is done is reset automatically: :meth:`step` returns the first observation of the next battle and
+    stores the last observation of the finished battle as `'terminal_observation'` in the battle's info dict. The info
+    dict also holds the `'action_mask'` of the battle's next decision point, see :meth:`get_action_masks`. A battle
+    whose step raised an error (e.g. a lost connection or a search timeout) is reset and reported as done, with the
+    error as `'error'` in its info dict, while the other battles are stepped as usual.
+
+    With a :class:`pokebattle_rl_env.profiling.Profiler`, each call of :meth:`step` counts as one step (the
+    `'env_steps'` counter adds up the steps of all battles) and is recorded as phase `'step'`, while the phases
+    `'decode'`, `'act'` and `'encode'` are recorded per battle. Reports are stored in the info dict of the first battle.
+
+    Attributes:
+        num_envs (int): The number of concurrent battles.
+        envs (list): The :class:`pokebattle_rl_env.pokebattle_env.PokeBattleEnv` of each battle, which decode the
+            actions and compute observations and rewards.
+        clients (list): The :class:`pokebattle_rl_env.async_showdown_simulator.AsyncShowdownClient` the battles are
+            distributed over.
+        observation_space (:class:`gym.Space`): The observation space of a single battle.
+        action_space (:class:`gym.Space`): The action space of a single battle.
+        profiler (:class:`pokebattle_rl_env.profiling.Profiler`): Records the latency of the steps, shared with the
+            environments and simulators of all battles. Profiling is disabled if None.
+    """
+    def __init__(self, num_envs, auth='', connection=DEFAULT_LOCAL_CONNECTION, battle_format=DEFAULT_BATTLE_FORMAT,
+                 num_connections=1, observation_mode='dense', action_mode='probabilities', profiler=None):
+        self.num_envs = num_envs
+        self.profiler = profiler
+        self.loop = asyncio.new_event_loop()
+        self.clients = [AsyncShowdownClient(auth, connection, battle_format) for _ in range(num_connections)]
+        simulators = self.loop.run_until_complete(self._create_simulators())
+        self.envs = [PokeBattleEnv(simulator, observation_mode=observation_mode, action_mode=action_mode,
+                                   profiler=profiler) for simulator in simulators]
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+        self.reward_range = self.envs[0].reward_range
+
+    async def _create_simulators(self):
+        return [self.clients[i % len(self.clients)].create_battle() for i in range(self.num_envs)]
+
+    async def _reset(self):
+        for client in self.clients:
+            if client.ws is None:
+                await client.connect()
+        await asyncio.gather(*[env.simulator.reset() for env in self.envs])
+        for env in self.envs:
+            env.update_action_mask()
+
+    def reset(self):
+        """Starts a new battle in each environment.
+
+        Returns:
+            The batched first observations.
+        """
+        self.loop.run_until_complete(self._reset())
+        return batch_observations([env.get_observation() for env in self.envs])
+
+    async def _step_env(self, env, action):
+        profiler = self.profiler
+        if profiler is None:
+            await env.simulator.act(*env.decode_action(action))
+            observation, reward, done, info = env.get_transition()
+        else:
+            start = perf_counter()
+            game_action, modifiers = env.decode_action(action)
+            decoded = perf_counter()
+            await env.simulator.act(game_action, modifiers)
+            acted = perf_counter()
+            observation = env.get_observation()
+            profiler.record('decode', decoded - start)
+            profiler.record('act', acted - decoded)
+            profiler.record('encode', perf_counter() - acted)
+            observation, reward, done, info = env.get_transition(observation)
+        if done:
+            info['terminal_observation'] = observation
+            await env.simulator.reset()
+            info['action_mask'] = env.update_action_mask()
+            observation = env.get_observation()
+        return observation, reward, done, info
+
+    async def _recover_env(self, env, error):
+        warning('Resetting the battle in room %s after an error: %r', env.simulator.room_id, error)
+        observation = env.get_observation()
+        await env.simulator.reset()
+        info = {'error': error, 'terminal_observation': observation, 'action_mask': env.update_action_mask()}
+        return env.get_observation(), 0.0, True, info
+
+    async def _step(self, actions):
+        results = await asyncio.gather(*[self._step_env(env, action) for env, action in zip(self.envs, actions)],
+                                       return_exceptions=True)
+        failed = [i for i, result in enumerate(results) if isinstance(result, BaseException)]
+        for i in failed:
+            if not isinstance(results[i], Exception):  # E.g. cancellation
+                raise results[i]
+        recovered = await asyncio.gather(*[self._recover_env(self.envs[i], results[i]) for i in failed])
+        for i, result in zip(failed, recovered):
+            results[i] = result
+        return results
+
+    def step(self, actions):
+        """Performs one action in each battle.
+
+        Args:
+            actions: An array holding one action of :attr:`action_space` per battle along the first axis.
+
+        Returns:
+            tuple: The batched observations, an array of rewards, an array of done flags and a list of info dicts.
+        """
+        start = perf_counter()
+        results = self.loop.run_until_complete(self._step(actions))
+        observations, rewards, dones, infos = zip(*results)
+        infos = list(infos)
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.record('step', perf_counter() - start)
+            profiler.count('env_steps', self.num_envs)
+            metrics = profiler.step()
+            if metrics is not None:
+                infos[0]['metrics'] = metrics
+        return batch_observations(observations), np.array(rewards, dtype=np.float32), np.array(dones), infos
+
+    def get_action_masks(self):
+        """Returns the masks of the available actions of all battles as a boolean array of shape `(num_envs,
+        num_actions)`, see :meth:`pokebattle_rl_env.battle_simulator.BattleSimulator.get_action_mask`."""
+        return np.stack([env.action_mask for env in self.envs])
+
+    async def _close(self):
+        await asyncio.gather(*[env.simulator.close() for env in self.envs])
+        await asyncio.gather(*[client.close() for client in self.clients if client.ws is not None])
+
+    def close(self):
+        self.loop.run_until_complete(self._close())
+        self.loop.close()
+
+    def seed(self, seed=None):
+        """Seeds each environment with `seed + i` (or randomly if `seed` is None), see
+        :meth:`pokebattle_rl_env.pokebattle_env.PokeBattleEnv.seed`."""
+        return [env.seed(None if seed is None else seed + i) for i, env in enumerate(self.envs)]
@@ -5,8 +5,25 @@ from __future__ import print_function
 import ray
 from ray.rllib.optimizers import SampleBatch
 
+from pokebattle_rl_env.shared_observations import OBSERVATION_KEYS, unpack_observations
 
-def collect_samples(agents, config, local_evaluator):
+
+def collect_samples(agents, config, local_evaluator, observation_rings=None):
+    # If observation_rings (or config["observation_rings"]) is given, it holds a SharedObservationRing attached to the
+    # ring of each agent (in the order of agents). The agents return sample batches packed with pack_observations, so
+    # only the sequence numbers of the observations travel through the object store. The observations are read from
+    # the rings without copying until the trajectories are concatenated, so each ring has to hold more than
+    # timesteps_per_batch steps.
+    if observation_rings is None:
+        observation_rings = config.get("observation_rings")
+    observation_keys = config.get("observation_keys", OBSERVATION_KEYS)
+    if observation_rings is None:
+        observation_rings = [None] * len(agents)
+    for ring in observation_rings:
+        if ring is not None and ring.capacity <= config["timesteps_per_batch"]:
+            raise ValueError(f"An observation ring of capacity {ring.capacity} cannot hold the "
+                             f"{config['timesteps_per_batch']} steps of a batch")
+    first_sequence_numbers = {}
     num_timesteps_so_far = 0
     trajectories = []
     # This variable maps the object IDs of trajectories that are currently
@@ -15,9 +32,9 @@ def collect_samples(agents, config, local_evaluator):
 
     agent_dict = {}
 
-    for agent in agents:
+    for agent, ring in zip(agents, observation_rings):
         fut_sample = agent.sample.remote()
-        agent_dict[fut_sample] = agent
+        agent_dict[fut_sample] = agent, ring
 
     while num_timesteps_so_far < config["timesteps_per_batch"]:
         # TODO(pcm): Make wait support arbitrary iterators and remove the
@@ -25,13 +42,22 @@ def collect_samples(agents, config, local_evaluator):
         ids, _ = ray.wait(list(agent_dict), num_returns=len(agent_dict))
         new_ids = []
         for id in ids:
-            agent = agent_dict.pop(id)
+            agent, ring = agent_dict.pop(id)
             # Start task with next trajectory and record it in the dictionary.
             fut_sample = agent.sample.remote()
-            agent_dict[fut_sample] = agent
-            new_ids.append(fut_sample)
-        for id in new_ids:
+            agent_dict[fut_sample] = agent, ring
+            new_ids.append((fut_sample, ring))
+        for id, ring in new_ids:
             next_sample = ray.get(id)
+            if ring is not None and next_sample.count > 0:
+                first_sequence_numbers.setdefault(ring, next_sample.data[observation_keys[0]][0])
+                unpack_observations(next_sample.data, ring, keys=observation_keys)
             num_timesteps_so_far += next_sample.count
             trajectories.append(next_sample)
-    return SampleBatch.concat_samples(trajectories)
+    samples = SampleBatch.concat_samples(trajectories)
+    # The concatenation copied the observations, check that no worker overwrote them before
+    for ring, sequence_number in first_sequence_numbers.items():
+        if not ring.holds(sequence_number):
+            raise ValueError(f"Observations from {sequence_number} were overwritten before the batch was collected, "
+                             f"use observation rings larger than {ring.capacity}")
+    return samples
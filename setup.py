@@ -13,6 +13,7 @@ setup(
         'numpy',
         'gym',
         'websocket-client',
+        'websockets',
         'PyExecJS',
         'requests'
     ]
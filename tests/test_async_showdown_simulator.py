@@ -0,0 +1,124 @@
+import asyncio
+from json import dumps, loads
+from os.path import dirname, join
+from unittest import TestCase, main
+
+from pokebattle_rl_env.async_showdown_simulator import AsyncShowdownClient
+from pokebattle_rl_env.battle_simulator import Action
+
+USERNAME = 'fsedfs'
+
+
+class FakeWebSocket:
+    """Answers searches with a new battle room and moves with the next turn."""
+    def __init__(self, request):
+        self.request = request
+        self.received = asyncio.Queue()
+        self.sent = []
+        self.rooms = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        msg = await self.received.get()
+        if msg is None:
+            raise StopAsyncIteration
+        return msg
+
+    async def send(self, msg):
+        self.sent.append(msg)
+        if msg.startswith('|/search'):
+            self.rooms += 1
+            room = f'>battle-gen7unratedrandombattle-{self.rooms}'
+            self.received.put_nowait('>battle-gen7unratedrandombattle-0\n|deinit')
+            self.received.put_nowait(f'{room}\n|init|battle\n|title|{USERNAME} vs. opponent{self.rooms}')
+            self.received.put_nowait(f'{room}\n|player|p1|{USERNAME}|1\n|player|p2|opponent{self.rooms}|1')
+            self.received.put_nowait(f'{room}\n|request|{self.request}')
+            self.received.put_nowait(f'{room}\n|start\n|turn|1')
+        elif '|/move' in msg or '|/switch' in msg:
+            room, _ = msg.split('|', 1)
+            self.received.put_nowait(f'>{room}\n|move|p2a: Metagross|Meteor Mash|p1a: Kommo-o\n|turn|2')
+
+    async def close(self):
+        self.received.put_nowait(None)
+
+
+class TestAsyncShowdownClient(TestCase):
+    def setUp(self):
+        with open(join(dirname(__file__), 'json', 'can_z_move.json'), 'r') as file:
+            self.request = dumps(loads(file.read()))
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_concurrent_battles(self):
+        async def run():
+            client = AsyncShowdownClient()
+            client.username = USERNAME
+            ws = FakeWebSocket(self.request)
+            client.start(ws)
+            battles = [client.create_battle() for _ in range(3)]
+            await asyncio.gather(*[battle.reset() for battle in battles])
+            self.assertEqual(sorted(battle.room_id for battle in battles),
+                             [f'battle-gen7unratedrandombattle-{i}' for i in range(1, 4)])
+            self.assertEqual(set(client.battles.values()), set(battles))
+            for battle in battles:
+                self.assertEqual(battle.state.state, 'ongoing')
+                self.assertEqual(battle.state.opponent.name, f'opponent{battle.room_id[-1]}')
+            await asyncio.gather(*[battle.act(Action('attack', 1), []) for battle in battles])
+            for battle in battles:
+                self.assertEqual(battle.state.turn, 2)
+                self.assertEqual(battle.state.opponent.pokemon[0].moves[0].id, 'meteormash')
+            await battles[0].reset()
+            self.assertEqual(battles[0].room_id, 'battle-gen7unratedrandombattle-4')
+            self.assertIn('battle-gen7unratedrandombattle-1|/forfeit', ws.sent)
+            self.assertNotIn('battle-gen7unratedrandombattle-1', client.battles)
+            await client.close()
+        self.loop.run_until_complete(run())
+
+    def test_search_timeout(self):
+        class RejectingWebSocket(FakeWebSocket):
+            async def send(self, msg):
+                if msg.startswith('|/search') and not any(sent.startswith('|/search') for sent in self.sent):
+                    self.sent.append(msg)
+                    self.received.put_nowait('|popup|Your team was rejected.')
+                else:
+                    await super().send(msg)
+
+        async def run():
+            client = AsyncShowdownClient(search_timeout=0.05)
+            client.username = USERNAME
+            ws = RejectingWebSocket(self.request)
+            client.start(ws)
+            rejected, battle = client.create_battle(), client.create_battle()
+            with self.assertRaises(asyncio.TimeoutError):
+                await rejected.reset()
+            self.assertEqual(len(client.waiting), 0)
+            self.assertIn(f'|/cancelsearch {client.battle_format}', ws.sent)
+            await battle.reset()
+            self.assertEqual(battle.room_id, 'battle-gen7unratedrandombattle-1')
+            await client.close()
+        self.loop.run_until_complete(run())
+
+    def test_connection_lost(self):
+        async def run():
+            client = AsyncShowdownClient()
+            client.username = USERNAME
+            ws = FakeWebSocket(self.request)
+            client.start(ws)
+            battle = client.create_battle()
+            await battle.reset()
+            await ws.close()  # The server closes the socket mid-battle
+            with self.assertRaises(ConnectionError):
+                await asyncio.wait_for(battle.act(Action('attack', 1), []), 1)
+            with self.assertRaises(ConnectionError):
+                await asyncio.wait_for(battle._update_state(), 1)
+            with self.assertRaises(ConnectionError):
+                await asyncio.wait_for(client.create_battle().reset(), 1)
+        self.loop.run_until_complete(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+from os import listdir
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+import numpy as np
+
+from pokebattle_rl_env import PokeBattleEnv
+from pokebattle_rl_env.battle_log import BattleLog, read_battle_log
+from pokebattle_rl_env.replay import read_protocol_log
+from pokebattle_rl_env.scripted_server import ScriptedShowdownServer, read_battle_scripts
+from pokebattle_rl_env.showdown_simulator import ShowdownSimulator
+
+BATTLE_EXAMPLE = join(dirname(dirname(__file__)), 'battle_example.txt')
+
+
+class TestBattleLog(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_sampling(self):
+        log = BattleLog(self.directory.name, sample_rate=0.0)
+        log.record('recv', '>battle-1\n|turn|1')
+        log.finish('battle-1')
+        log.record('recv', '>battle-2\n|error|[Invalid choice]')
+        log.fail()
+        log.finish('battle-2')
+        log.close()
+        self.assertEqual(listdir(self.directory.name), ['battle-2.log.gz'])
+
+    def test_capacity(self):
+        log = BattleLog(self.directory.name, capacity=2, sample_rate=1.0)
+        log.record('recv', '>battle-1\n|turn|1')
+        log.record('send', 'battle-1|/choose move 1|2')
+        log.record('recv', '>battle-1\n|turn|2')
+        log.close('battle-1')
+        events = read_protocol_log(read_battle_log(join(self.directory.name, 'battle-1.log.gz')))
+        self.assertEqual(events, [('send', 'battle-1|/choose move 1|2'), ('recv', '>battle-1\n|turn|2')])
+
+    def test_rotation(self):
+        log = BattleLog(self.directory.name, sample_rate=1.0, max_files=2)
+        for battle in range(4):
+            log.record('recv', f'>battle-{battle}\n|turn|1')
+            log.finish(f'battle-{battle}')
+        log.close()
+        self.assertEqual(sorted(listdir(self.directory.name)), ['battle-2.log.gz', 'battle-3.log.gz'])
+
+
+class TestShowdownSimulatorBattleLog(TestCase):
+    def test_battle_log(self):
+        with open(BATTLE_EXAMPLE, 'r', encoding='utf-8') as file:
+            server = ScriptedShowdownServer(read_battle_scripts(file.read())[:1])
+        server.start()
+        with TemporaryDirectory() as directory:
+            simulator = ShowdownSimulator(connection=server.connection, battle_log=BattleLog(directory, sample_rate=1.0))
+            env = PokeBattleEnv(simulator, action_mode='discrete')
+            try:
+                env.reset()
+                done = False
+                while not done:
+                    _, _, done, _ = env.step(np.flatnonzero(env.action_mask[:9])[0])
+                room_id = simulator.room_id
+            finally:
+                env.close()
+                server.stop()
+            scripts = read_battle_scripts(read_battle_log(join(directory, f'{room_id}.log.gz')))
+            self.assertEqual(len(scripts), 1)
+            self.assertEqual(len(scripts[0].steps), 8)
+
+
+if __name__ == '__main__':
+    main()
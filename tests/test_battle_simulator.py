@@ -1,6 +1,6 @@
 from unittest import TestCase, main
 
-from pokebattle_rl_env.battle_simulator import BattleSimulator
+from pokebattle_rl_env.battle_simulator import BattleSimulator, action_to_index
 from pokebattle_rl_env.game_state import Move
 
 
@@ -45,6 +45,14 @@ class TestValidActions(TestCase):
         self.assertEqual(len(valid_actions), 6)
         self.assertTrue(valid_actions[0].mode == 'attack' and valid_actions[0].number == 1)
 
+    def test_action_mask(self):
+        self.simulator.state.player.pokemon[0].moves[1].disabled = True
+        self.simulator.state.player.pokemon[3].health = 0
+        mask = self.simulator.get_action_mask()
+        self.assertEqual(mask.tolist(), [True, False, True, True, True, True, False, True, True, False, False])
+        self.assertEqual([action_to_index(action) for action in self.simulator.get_available_actions()],
+                         [0, 2, 3, 4, 5, 7, 8])
+
 
 if __name__ == '__main__':
     main()
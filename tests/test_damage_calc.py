@@ -0,0 +1,81 @@
+from unittest import TestCase, main
+
+import numpy as np
+
+from pokebattle_rl_env.damage_calc import damage_ranges, estimate_damage, type_effectiveness, type_effectiveness_matrix, \
+    type_ids, types
+from pokebattle_rl_env.game_state import BattleEffect, Move
+from pokebattle_rl_env.local_simulator import LocalSimulator
+from pokebattle_rl_env.poke_data_queries import moves, typechart
+
+
+class TestTypeEffectiveness(TestCase):
+    def test_matrix_matches_typechart(self):
+        codes = {0: 1, 1: 2, 2: .5, 3: 0}
+        for attacking in types:
+            for defending in types:
+                expected = codes[typechart[defending]['damageTaken'][attacking]]
+                self.assertEqual(type_effectiveness(attacking, [defending]), expected)
+
+    def test_dual_types(self):
+        self.assertEqual(type_effectiveness('Rock', ['Fire', 'Flying']), 4)
+        self.assertEqual(type_effectiveness('Fighting', ['Normal', 'Ghost']), 0)
+        self.assertEqual(type_effectiveness_matrix.shape, (len(types), len(types) + 1, len(types) + 1))
+        self.assertEqual(type_effectiveness_matrix[type_ids['Water'], type_ids['Fire'], type_ids['Ground']], 4)
+
+
+class TestDamageEstimation(TestCase):
+    def setUp(self):
+        self.simulator = LocalSimulator(random_state=np.random.RandomState(0))
+        self.attacker = self.simulator.generate_pokemon('Garchomp')
+        self.attacker.moves = [Move(id=move_id) for move_id in ['earthquake', 'swordsdance', 'dragonclaw']]
+        self.defenders = [self.simulator.generate_pokemon(species) for species in ['Heatran', 'Skarmory', 'Clefable']]
+
+    def test_matches_engine(self):
+        minimum, maximum = estimate_damage(self.attacker, self.defenders)
+        self.assertEqual(minimum.shape, (4, 3))
+        for i, move_id in enumerate(['earthquake', 'dragonclaw']):
+            row = 0 if i == 0 else 2
+            for j, defender in enumerate(self.defenders):
+                for roll in (.85, 1):
+                    damage = self.simulator.calc_damage(self.attacker, defender, moves[move_id], critical=False,
+                                                        roll=roll)
+                    expected = (minimum if roll == .85 else maximum)[row, j]
+                    if type_effectiveness(moves[move_id]['type'], defender.types) == 0:
+                        self.assertEqual(expected, 0)
+                    else:
+                        self.assertAlmostEqual(damage / defender.max_health, expected, delta=1 / defender.max_health)
+        self.assertTrue((maximum[1] == 0).all())  # Status move
+        self.assertTrue((maximum[3] == 0).all())  # Missing move
+        self.assertEqual(maximum[0, 1], 0)  # Skarmory is immune to Ground
+
+    def test_modifiers(self):
+        _, maximum = estimate_damage(self.attacker, self.defenders)
+        self.attacker.stat_boosts['atk'] = 2
+        _, boosted = estimate_damage(self.attacker, self.defenders)
+        self.assertTrue((boosted[0, [0, 2]] > maximum[0, [0, 2]]).all())
+        self.attacker.statuses.append(BattleEffect('brn'))
+        _, burned = estimate_damage(self.attacker, self.defenders)
+        self.assertTrue((burned[0, [0, 2]] < boosted[0, [0, 2]]).all())
+
+    def test_weather(self):
+        self.attacker.moves = [Move(id='flamethrower'), Move(id='surf')]
+        _, maximum = estimate_damage(self.attacker, self.defenders)
+        _, sunny = estimate_damage(self.attacker, self.defenders, 'SunnyDay')  # Spelling of the protocol
+        self.assertTrue((sunny[0, [1, 2]] > maximum[0, [1, 2]]).all())
+        self.assertTrue((sunny[1] < maximum[1]).all())
+        _, dex_sunny = estimate_damage(self.attacker, self.defenders, 'sunnyday')  # Spelling of the dex
+        self.assertTrue((dex_sunny == sunny).all())
+
+    def test_damage_ranges(self):
+        self.simulator.reset()
+        minimum, maximum = damage_ranges(self.simulator.state)
+        self.assertEqual(minimum.shape, (4, 6))
+        self.assertTrue((minimum <= maximum).all())
+        self.assertTrue((maximum[:, 1:] == 0).all())  # Unrevealed opponents
+        opponent_minimum, _ = damage_ranges(self.simulator.state, opponent=True)
+        self.assertEqual(opponent_minimum.shape, (4, 6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+from os import listdir
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from pokebattle_rl_env.dex_cache import compile_dex, load_dex, read_sources, source_hash
+
+
+class TestDexCache(TestCase):
+    def test_load_dex(self):
+        expected = compile_dex(read_sources())
+        with TemporaryDirectory() as cache_dir:
+            dex = load_dex(cache_dir)
+            self.assertEqual(dex, expected)
+            self.assertEqual(listdir(cache_dir), [f'dex-{source_hash(read_sources())}.bin'])
+            dex = load_dex(cache_dir)
+            self.assertEqual(dex, expected)
+            self.assertEqual(list(dex['moves']), list(expected['moves']))
+
+    def test_corrupt_cache(self):
+        with TemporaryDirectory() as cache_dir:
+            path = join(cache_dir, f'dex-{source_hash(read_sources())}.bin')
+            with open(path, 'wb') as file:
+                file.write(b'\x00corrupt')
+            dex = load_dex(cache_dir)
+            self.assertIn('ironhead', dex['moves'])
+            self.assertIn('RainDance', dex['weathers'])
+
+    def test_source_hash(self):
+        sources = read_sources()
+        digest = source_hash(sources)
+        sources['moves'] = sources['moves'] + b' '
+        self.assertNotEqual(source_hash(sources), digest)
+
+    def test_unwritable_cache_dir(self):
+        with TemporaryDirectory() as directory:
+            blocking_file = join(directory, 'file')
+            open(blocking_file, 'w').close()
+            dex = load_dex(join(blocking_file, 'cache'))  # Cannot be created below a file
+            self.assertIn('ironhead', dex['moves'])
+
+
+if __name__ == '__main__':
+    main()
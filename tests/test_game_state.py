@@ -0,0 +1,152 @@
+from json import dumps, loads
+from pickle import dumps as pickle_dumps, loads as pickle_loads
+from os.path import dirname, join
+from unittest import TestCase, main
+
+import numpy as np
+
+from pokebattle_rl_env.game_state import BattleEffect, GameState, IncrementalStateEncoder, IndexEncoder, Move, \
+    StateEncoder, state_to_list
+from pokebattle_rl_env.showdown_simulator import parse_boost, parse_damage_heal, parse_switch, read_state_json
+
+
+def populated_state():
+    state = GameState()
+    with open(join(dirname(__file__), 'json', 'can_z_move.json'), 'r') as file:
+        read_state_json(dumps(loads(file.read())), state)
+    opponent = state.opponent.pokemon[0]
+    opponent.change_species('Metagross')
+    opponent.unknown = False
+    opponent.health = 39
+    opponent.max_health = 100
+    opponent.moves = [Move(name='Meteor Mash'), Move(name='Bullet Punch')]
+    opponent.statuses = [BattleEffect('tox', turn=3), BattleEffect('confusion'), BattleEffect('tox', turn=7)]
+    opponent.stat_boosts['atk'] = 2
+    opponent.battle_stats['evasion'] = -1
+    opponent.mega = True
+    state.opponent.mega_used = True
+    state.player.z_used = True
+    state.player_conditions.append(BattleEffect('stealthrock'))
+    state.opponent_conditions.append(BattleEffect('reflect', turn=2))
+    state.field_effects += [BattleEffect('iondeluge', turn=2), BattleEffect('electricterrain', turn=4)]
+    state.weather = BattleEffect('RainDance', turn=3)
+    state.turn = 12
+    return state
+
+
+class TestStateModel(TestCase):
+    def test_slots(self):
+        state = populated_state()
+        for obj in [state, state.player, state.player.pokemon[0], state.player.pokemon[0].moves[0], state.weather]:
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+    def test_copy(self):
+        state = populated_state()
+        snapshot = state.copy()
+        self.assertTrue(np.array_equal(snapshot.to_array(), state.to_array()))
+        opponent = state.opponent.pokemon[0]
+        opponent.stat_boosts['atk'] += 1
+        opponent.statuses[0].turn += 1
+        opponent.moves[0].pp -= 1
+        state.field_effects[0].turn += 1
+        state.weather.turn += 1
+        state.player.pokemon[0].stats['atk'] += 1
+        self.assertFalse(np.array_equal(snapshot.to_array(), state.to_array()))
+        self.assertIsNot(snapshot.opponent.pokemon[0].types, opponent.types)
+        self.assertTrue(np.array_equal(snapshot.copy().to_array(), snapshot.to_array()))
+
+    def test_pickle(self):
+        state = populated_state()
+        self.assertTrue(np.array_equal(pickle_loads(pickle_dumps(state)).to_array(), state.to_array()))
+
+
+class TestStateEncoder(TestCase):
+    def test_identical_to_reference(self):
+        for state in [GameState(), populated_state()]:
+            reference = np.array(state_to_list(state), dtype=np.float32)
+            array = state.to_array()
+            self.assertEqual(array.dtype, np.float32)
+            self.assertEqual(array.shape, reference.shape)
+            self.assertTrue(np.array_equal(array, reference))
+
+    def test_reuses_buffer(self):
+        encoder = StateEncoder()
+        array = encoder.encode(populated_state())
+        self.assertIs(array, encoder.buffer)
+        self.assertEqual(len(array), encoder.size)
+        array = encoder.encode(GameState())
+        self.assertTrue(np.array_equal(array, np.array(state_to_list(GameState()), dtype=np.float32)))
+        out = np.empty(encoder.size, dtype=np.float32)
+        self.assertIs(encoder.encode(GameState(), out=out), out)
+
+    def test_side_conditions(self):
+        encoder = StateEncoder()
+        state = populated_state()
+        array = encoder.encode(state)
+        self.assertEqual(array[min(encoder.player_conditions['stealthrock'])], 1)
+        self.assertEqual(array[min(encoder.opponent_conditions['reflect'])], 1)
+        self.assertEqual(array[min(encoder.opponent_conditions['stealthrock'])], 0)
+
+
+class TestIncrementalStateEncoder(TestCase):
+    def test_parsed_updates(self):
+        encoder = IncrementalStateEncoder(validate=True)
+        state = populated_state()
+        state.opponent.pokemon[0].name = 'Metagross'
+        encoder.encode(state)
+        self.assertEqual(state.dirty_pokemon, set())
+        parse_damage_heal('|-damage|p2a: Metagross|20/100 brn'.split('|'), state, 'p2')
+        parse_boost('|-boost|p2a: Metagross|spe|1'.split('|'), state, 'p2')
+        self.assertEqual(state.dirty_pokemon, {state.opponent.pokemon[0]})
+        encoder.encode(state)
+        parse_switch('|switch|p2a: Tapu Koko|Tapu Koko, L75|100/100'.split('|'), state, 'p2')
+        state.turn += 1
+        array = encoder.encode(state)
+        self.assertTrue(np.array_equal(array, StateEncoder().encode(state)))
+
+    def test_unmarked_change(self):
+        encoder = IncrementalStateEncoder(validate=True)
+        state = populated_state()
+        encoder.encode(state)
+        state.opponent.pokemon[0].health = 10
+        with self.assertRaises(AssertionError):
+            encoder.encode(state)
+        encoder.encode(GameState())
+
+
+class TestIndexEncoder(TestCase):
+    def test_encode(self):
+        encoder = IndexEncoder()
+        state = populated_state()
+        categories, numeric = encoder.encode(state)
+        self.assertEqual(len(categories), len(encoder.category_sizes))
+        self.assertEqual(len(numeric), encoder.numeric_size)
+        self.assertTrue(np.all(categories < encoder.category_sizes))
+        self.assertEqual(categories[0], encoder.weathers['RainDance'])
+        opponent = 1 + 6 * encoder.pokemon_categories
+        self.assertEqual(categories[opponent + 1], encoder.abilities['clearbody'])
+        self.assertEqual(categories[opponent + 3], encoder.types['Steel'])
+        self.assertEqual(categories[opponent + 4], encoder.types['Psychic'])
+        self.assertEqual(categories[opponent + 5], encoder.moves['meteormash'])
+        self.assertEqual(categories[opponent + 7], 0)
+        opponent = encoder.player_offset + 6 * encoder.pokemon_size
+        self.assertAlmostEqual(numeric[opponent], .39)
+        self.assertEqual(numeric[opponent + 1 + 5], 1)
+        self.assertAlmostEqual(numeric[opponent + 1 + 5 + encoder.status_turns], .03)
+
+    def test_numeric_matches_dense(self):
+        state = populated_state()
+        dense_encoder = StateEncoder()
+        dense = dense_encoder.encode(state)
+        _, numeric = IndexEncoder().encode(state)
+        header = dense_encoder.weather_turn_offset - len(dense_encoder.weathers)
+        self.assertTrue(np.array_equal(numeric[:header], dense[:header]))
+        self.assertEqual(numeric[header], dense[dense_encoder.weather_turn_offset])
+        index_encoder = IndexEncoder()
+        for i in range(12):
+            self.assertEqual(numeric[index_encoder.player_offset + i * index_encoder.pokemon_size],
+                             dense[dense_encoder.player_offset + i * dense_encoder.pokemon_size])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+from unittest import TestCase, main
+
+import numpy as np
+
+from pokebattle_rl_env.battle_simulator import Action
+from pokebattle_rl_env.game_state import Move
+from pokebattle_rl_env.local_simulator import LocalSimulator, type_effectiveness
+from pokebattle_rl_env.poke_data_queries import moves
+from pokebattle_rl_env.pokebattle_env import PokeBattleEnv
+
+
+def attack_first_move(simulator, actions):
+    return actions[0]
+
+
+class TestLocalSimulator(TestCase):
+    def setUp(self):
+        self.simulator = LocalSimulator(random_state=np.random.RandomState(0), opponent_policy=attack_first_move)
+        self.simulator.reset()
+
+    def set_active(self, side, species, move_ids):
+        pokemon = self.simulator.generate_pokemon(species)
+        pokemon.moves = [Move(id=move_id) for move_id in move_ids]
+        self.simulator.sides[side].pokemon[0] = pokemon
+        if side == 1:
+            self.simulator.views[pokemon] = self.simulator.state.opponent.pokemon[0]
+        return pokemon
+
+    def test_type_effectiveness(self):
+        self.assertEqual(type_effectiveness('Water', ['Fire', 'Rock']), 4)
+        self.assertEqual(type_effectiveness('Electric', ['Ground']), 0)
+        self.assertEqual(type_effectiveness('Fire', ['Water']), .5)
+
+    def test_damage(self):
+        attacker = self.set_active(0, 'Garchomp', ['earthquake'])
+        defender = self.set_active(1, 'Heatran', ['flamethrower'])
+        # floor(floor(floor(2 * 80 / 5 + 2) * 100 * 245 / 206) / 50) + 2 = 82, times 1.5 STAB and 4x effectiveness
+        self.assertEqual(attacker.stats['atk'], 245)
+        self.assertEqual(defender.stats['def'], 206)
+        damage = self.simulator.calc_damage(attacker, defender, moves['earthquake'], critical=False, roll=1)
+        self.assertEqual(damage, 492)
+        attacker.stat_boosts['atk'] = 2
+        boosted = self.simulator.calc_damage(attacker, defender, moves['earthquake'], critical=False, roll=1)
+        self.assertGreater(boosted, damage)
+        self.assertEqual(self.simulator.calc_damage(defender, attacker, moves['thunderbolt'], critical=False, roll=1), 0)
+
+    def test_status_immunity(self):
+        self.set_active(0, 'Garchomp', ['thunderwave'])
+        defender = self.set_active(1, 'Jolteon', ['thunderbolt'])
+        self.simulator._apply_status(defender, 'par')
+        self.assertEqual(defender.statuses, [])
+        self.simulator._apply_status(defender, 'brn')
+        self.assertEqual([status.name for status in defender.statuses], ['brn'])
+
+    def test_opponent_view(self):
+        opponent = self.simulator.state.opponent.pokemon
+        self.assertFalse(opponent[0].unknown)
+        self.assertEqual(opponent[0].species, self.simulator.sides[1].pokemon[0].species)
+        self.assertTrue(all(pokemon.unknown for pokemon in opponent[1:]))
+        self.assertEqual(opponent[0].moves, [])
+        self.simulator.act(Action('attack', 1), [])
+        self.assertEqual(len(self.simulator.state.opponent.pokemon[0].moves), 1)
+
+    def test_forced_switch(self):
+        active = self.simulator.sides[0].pokemon[0]
+        active.health = 1
+        self.simulator.sides[1].pokemon[0].stat_boosts['spe'] = 6
+        while active.health > 0:
+            self.simulator.act(Action('attack', 1), [])
+        self.assertTrue(self.simulator.state.player.force_switch)
+        actions = self.simulator.get_available_actions()
+        self.assertTrue(all(action.mode == 'switch' for action in actions))
+        turn = self.simulator.state.turn
+        self.simulator.act(actions[0], [])
+        self.assertEqual(self.simulator.state.turn, turn)
+        self.assertFalse(self.simulator.state.player.force_switch)
+        self.assertGreater(self.simulator.state.player.pokemon[0].health, 0)
+
+    def test_out_of_pp(self):
+        attacker = self.set_active(0, 'Garchomp', ['earthquake', 'dragonclaw'])
+        self.set_active(1, 'Heatran', ['flamethrower'])
+        attacker.moves[0].pp = 1
+        self.simulator.act(Action('attack', 1), [])
+        self.assertEqual(self.simulator.get_action_mask()[:2].tolist(), [False, True])
+        self.assertEqual([action.number for action in self.simulator.get_available_actions()
+                          if action.mode == 'attack'], [2])
+        attacker.moves[1].pp = 1
+        self.simulator.act(Action('attack', 2), [])
+        self.assertEqual(self.simulator.get_action_mask()[:2].tolist(), [True, False])  # Struggle
+
+    def test_battles_finish(self):
+        env = PokeBattleEnv(simulator=LocalSimulator(random_state=np.random.RandomState(1)))
+        np.random.seed(1)
+        for _ in range(5):
+            env.reset()
+            done = False
+            while not done:
+                observation, reward, done, _ = env.step(np.random.rand(10))
+            self.assertIn(env.simulator.state.state, ['win', 'loss', 'tie'])
+            self.assertEqual(observation.shape, env.observation_space.shape)
+
+    def test_seed(self):
+        def play(seed):
+            env = PokeBattleEnv(simulator=LocalSimulator())
+            env.seed(seed)
+            observations = [env.reset()]
+            done = False
+            while not done:
+                observation, _, done, _ = env.step(np.ones(11))
+                observations.append(observation)
+            return np.array(observations)
+        np.random.seed(0)
+        first = play(3)
+        np.random.seed(1)
+        self.assertTrue(np.array_equal(first, play(3)))
+        self.assertFalse(np.array_equal(first[:2], play(4)[:2]))
+
+
+if __name__ == '__main__':
+    main()
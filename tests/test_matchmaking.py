@@ -0,0 +1,110 @@
+from queue import Empty, Queue
+from threading import Thread
+from unittest import TestCase, main
+
+from websocket._exceptions import WebSocketTimeoutException
+
+from pokebattle_rl_env.matchmaking import Matchmaker, connect_matchmaker, start_matchmaker
+from pokebattle_rl_env.showdown_simulator import ShowdownSimulator
+
+
+def find_matches(matchmaker, usernames, timeout):
+    results = {}
+
+    def find(username):
+        results[username] = matchmaker.find_match(username, timeout)
+    threads = [Thread(target=find, args=(username,)) for username in usernames]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestMatchmaker(TestCase):
+    def test_pairs(self):
+        results = find_matches(Matchmaker(), [f'agent{i}' for i in range(6)], timeout=5)
+        for username, (opponent, challenge) in results.items():
+            self.assertNotEqual(username, opponent)
+            self.assertEqual(results[opponent], (username, not challenge))
+
+    def test_odd_agent_times_out(self):
+        results = find_matches(Matchmaker(), ['a', 'b', 'c'], timeout=.2)
+        self.assertEqual(sum(result is None for result in results.values()), 1)
+
+    def test_expired_agents_are_skipped(self):
+        matchmaker = Matchmaker()
+        self.assertIsNone(matchmaker.find_match('dropped', timeout=.01))
+        matchmaker.waiting['crashed'] = 0  # Wait ended long ago, e.g. because the process crashed
+        results = find_matches(matchmaker, ['a', 'b'], timeout=5)
+        self.assertEqual({opponent for opponent, _ in results.values()}, {'a', 'b'})
+
+    def test_served(self):
+        manager = start_matchmaker(authkey=b'test')
+        try:
+            matchmaker = connect_matchmaker(manager.address, authkey=b'test')
+            results = find_matches(matchmaker, ['a', 'b'], timeout=5)
+            self.assertEqual(results['a'][0], 'b')
+            self.assertNotEqual(results['a'][1], results['b'][1])
+        finally:
+            manager.shutdown()
+
+
+class FakeShowdownServer:
+    """Routes challenges between the websockets of two users and starts a battle once a challenge is accepted."""
+    def __init__(self):
+        self.sockets = {}
+
+    def connect(self, username):
+        self.sockets[username] = FakeWebSocket(self, username)
+        return self.sockets[username]
+
+    def handle(self, username, cmd):
+        if cmd.startswith('|/challenge '):
+            opponent = cmd[len('|/challenge '):].split(',')[0]
+            self.sockets[opponent].queue.put(f'|updatechallenges|{{"challengesFrom":{{"{username}":"format"}}}}')
+        elif cmd.startswith('|/accept '):
+            for socket in self.sockets.values():
+                socket.queue.put('>battle-format-1\n|init|battle')
+
+
+class FakeWebSocket:
+    def __init__(self, server, username):
+        self.server = server
+        self.username = username
+        self.queue = Queue()
+        self.timeout = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def send(self, cmd):
+        self.server.handle(self.username, cmd)
+
+    def recv(self):
+        try:
+            return self.queue.get(timeout=self.timeout)
+        except Empty:
+            raise WebSocketTimeoutException('timed out')
+
+
+class TestSelfPlay(TestCase):
+    def test_challenge_and_accept(self):
+        server = FakeShowdownServer()
+        matchmaker = Matchmaker()
+        simulators = []
+        for username in ['alice', 'bob']:
+            simulator = ShowdownSimulator(self_play=True, matchmaker=matchmaker)
+            simulator.username = username
+            simulator.ws = server.connect(username)
+            simulators.append(simulator)
+        threads = [Thread(target=simulator._find_self_play_battle) for simulator in simulators]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual([simulator.room_id for simulator in simulators], ['battle-format-1'] * 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from unittest import TestCase, main
 
-from pokebattle_rl_env.poke_data_queries import move_name_to_id, get_move_by_name
+from pokebattle_rl_env.poke_data_queries import ability_name_to_id, get_move_by_name, get_pokemon_by_species, \
+    item_name_to_id, move_name_to_id
 
 
 class TestQueries(TestCase):
@@ -16,6 +17,20 @@ class TestQueries(TestCase):
         move = get_move_by_name('Z-Belly Drum')
         self.assertEqual(move['name'], 'Belly Drum')
 
+    def test_case_insensitive_lookup(self):
+        self.assertEqual(move_name_to_id('iron head'), 'ironhead')
+        self.assertEqual(move_name_to_id('Z-belly drum'), 'bellydrum')
+        self.assertEqual(ability_name_to_id('Clear Body'), 'clearbody')
+        self.assertEqual(ability_name_to_id('clear body'), 'clearbody')
+        self.assertEqual(item_name_to_id('Black Sludge'), 'blacksludge')
+        self.assertEqual(get_pokemon_by_species('metagross')['species'], 'Metagross')
+
+    def test_unknown_name(self):
+        with self.assertRaises(StopIteration):
+            move_name_to_id('Not A Move')
+        with self.assertRaises(StopIteration):
+            item_name_to_id('Not An Item')
+
 
 if __name__ == '__main__':
     main()
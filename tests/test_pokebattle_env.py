@@ -1,5 +1,9 @@
 from unittest import TestCase, main
+
+import numpy as np
+
 from pokebattle_rl_env import PokeBattleEnv
+from pokebattle_rl_env.local_simulator import LocalSimulator
 from pokebattle_rl_env.pokebattle_env import TURN_THRESHOLD
 
 
@@ -30,6 +34,36 @@ class MyTestCase(TestCase):
         env.simulator.state.state = 'ongoing'
         self.assertEqual(env.compute_reward(), 0)
 
+    def test_index_observation_mode(self):
+        env = PokeBattleEnv(observation_mode='index')
+        observation = env.get_observation()
+        self.assertTrue(env.observation_space.contains(observation))
+        self.assertLess(len(observation['categories']) + len(observation['numeric']),
+                        len(env.simulator.state.to_array()) / 50)
+        with self.assertRaises(ValueError):
+            PokeBattleEnv(observation_mode='sparse')
+
+    def test_incremental_observations(self):
+        env = PokeBattleEnv(incremental_observations=True, validate_observations=True)
+        self.assertTrue(np.array_equal(env.get_observation(), env.simulator.state.to_array()))
+
+    def test_discrete_actions(self):
+        for action_mode in ['discrete', 'multi_discrete']:
+            env = PokeBattleEnv(simulator=LocalSimulator(random_state=np.random.RandomState(2)), action_mode=action_mode)
+            env.reset()
+            done = False
+            while not done:
+                valid = np.flatnonzero(env.action_mask[:9])
+                action = np.array([valid[0], 1]) if action_mode == 'multi_discrete' else valid[-1] + 9
+                self.assertTrue(env.action_space.contains(action))
+                _, _, done, info = env.step(action)
+            self.assertIn(env.simulator.state.state, ['win', 'loss', 'tie'])
+        env.reset()
+        env.simulator.state.player.pokemon[0].trapped = True
+        env.update_action_mask()
+        with self.assertRaises(ValueError):
+            env.step(np.array([4, 0]))  # Switch while trapped
+
 
 if __name__ == '__main__':
     main()
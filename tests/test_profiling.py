@@ -0,0 +1,63 @@
+from json import dumps, loads
+from os.path import dirname, join
+from unittest import TestCase, main
+
+import numpy as np
+
+from pokebattle_rl_env import PokeBattleEnv
+from pokebattle_rl_env.local_simulator import LocalSimulator
+from pokebattle_rl_env.profiling import LatencyHistogram, Profiler
+from pokebattle_rl_env.showdown_simulator import ShowdownSimulator
+from tests.test_showdown_simulator import ScriptedWebSocket
+
+
+class TestLatencyHistogram(TestCase):
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.percentile(50))
+        for seconds in np.linspace(1e-4, 1e-2, 100):
+            histogram.record(seconds)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.to_dict()['mean'], 5.05e-3)
+        self.assertTrue(4e-3 < histogram.percentile(50) < 7e-3)
+        self.assertGreaterEqual(histogram.percentile(100), 1e-2)
+        histogram.record(1e3)
+        self.assertEqual(histogram.percentile(100), float('inf'))
+
+
+class TestProfiler(TestCase):
+    def test_env_phases(self):
+        reports = []
+        profiler = Profiler(sinks=[reports.append], report_interval=3)
+        env = PokeBattleEnv(simulator=LocalSimulator(random_state=np.random.RandomState(0)), action_mode='discrete',
+                            profiler=profiler)
+        env.reset()
+        infos = [env.step(np.flatnonzero(env.action_mask[:9])[0])[3] for _ in range(3)]
+        self.assertNotIn('metrics', infos[1])
+        self.assertIs(infos[2]['metrics'], reports[0])
+        self.assertEqual(reports[0]['counters']['steps'], 3)
+        self.assertEqual(set(reports[0]['phases']), {'decode', 'act', 'encode', 'step'})
+        self.assertEqual(reports[0]['phases']['step']['count'], 3)
+
+    def test_simulator_phases(self):
+        with open(join(dirname(__file__), 'json', 'can_z_move.json'), 'r') as file:
+            request = dumps(loads(file.read()))
+        simulator = ShowdownSimulator()
+        simulator.profiler = Profiler()
+        simulator.ws = ScriptedWebSocket([
+            '>battle-1\n|init|battle',
+            f'>battle-1\n|request|{request}',
+            '>battle-1\n|turn|1',
+        ])
+        simulator.username = 'fsedfs'
+        simulator._update_state()
+        snapshot = simulator.profiler.snapshot()
+        self.assertEqual(snapshot['counters']['frames'], 3)
+        self.assertEqual(snapshot['phases']['recv']['count'], 3)
+        self.assertEqual(snapshot['phases']['parse']['count'], 3)
+        self.assertEqual(snapshot['phases']['request']['count'], 1)
+        self.assertGreater(snapshot['counters']['bytes_received'], len(request))
+
+
+if __name__ == '__main__':
+    main()
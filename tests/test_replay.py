@@ -0,0 +1,83 @@
+from json import dumps
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from pokebattle_rl_env.replay import iter_transitions, replay_file, replay_protocol_log, replay_showdown_log
+
+BATTLE_EXAMPLE = join(dirname(dirname(__file__)), 'battle_example.txt')
+
+SHOWDOWN_LOG = '\n'.join([
+    '|player|p1|Alice|1',
+    '|player|p2|Bob|2',
+    '|gametype|singles',
+    '|start',
+    '|switch|p1a: Pikachu|Pikachu, L80, M|100/100',
+    '|switch|p2a: Magikarp|Magikarp, L90, F|100/100',
+    '|turn|1',
+    '|move|p1a: Pikachu|Thunderbolt|p2a: Magikarp',
+    '|-damage|p2a: Magikarp|40/100',
+    '|move|p2a: Magikarp|Splash|p2a: Magikarp',
+    '|upkeep',
+    '|turn|2',
+    '|move|p2a: Magikarp|Tackle|p1a: Pikachu',
+    '|-damage|p1a: Pikachu|0 fnt',
+    '|faint|p1a: Pikachu',
+    '|upkeep',
+    '|switch|p1a: Raichu|Raichu, L80, F|100/100',
+    '|turn|3',
+    '|move|p1a: Raichu|Volt Tackle|p2a: Magikarp',
+    '|-damage|p2a: Magikarp|0 fnt',
+    '|faint|p2a: Magikarp',
+    '|win|Alice',
+])
+
+
+class TestReplayProtocolLog(TestCase):
+    def setUp(self):
+        with open(BATTLE_EXAMPLE, 'r', encoding='utf-8') as file:
+            self.text = file.read()
+
+    def test_transitions(self):
+        transitions = list(replay_protocol_log(self.text))
+        first_battle = transitions[:7]
+        self.assertEqual([t.action for t in first_battle], [(0, 0), (4, 0), (0, 0), (5, 0), (1, 0), (8, 0), (0, 0)])
+        self.assertEqual([t.done for t in first_battle], [False] * 6 + [True])
+        self.assertEqual(first_battle[-1].reward, 0)  # Forfeited before TURN_THRESHOLD
+        for previous, current in zip(first_battle, first_battle[1:]):
+            self.assertTrue((previous.next_observation == current.observation).all())
+
+    def test_index_observations(self):
+        transition = next(replay_protocol_log(self.text, observation_mode='index'))
+        self.assertEqual(set(transition.observation), {'categories', 'numeric'})
+
+
+class TestReplayShowdownLog(TestCase):
+    def test_transitions(self):
+        transitions = list(replay_showdown_log(SHOWDOWN_LOG))
+        self.assertEqual([t.action for t in transitions], [(0, 0), (4, 0), (0, 0)])
+        self.assertEqual([t.done for t in transitions], [False, False, True])
+        self.assertEqual(transitions[-1].reward, 1)
+
+    def test_opponent_perspective(self):
+        transitions = list(replay_showdown_log(SHOWDOWN_LOG, player='p2'))
+        self.assertEqual([t.action for t in transitions], [(0, 0), (1, 0)])
+        self.assertFalse(any(t.done for t in transitions))  # Magikarp fainted before acting in the last turn
+
+
+class TestIterTransitions(TestCase):
+    def test_files(self):
+        with TemporaryDirectory() as directory:
+            json_path = join(directory, 'replay.json')
+            with open(json_path, 'w', encoding='utf-8') as file:
+                file.write(dumps({'log': SHOWDOWN_LOG}))
+            self.assertEqual(len(replay_file(json_path)), 3)
+            paths = [BATTLE_EXAMPLE, json_path]
+            sequential = list(iter_transitions(paths, processes=0))
+            parallel = list(iter_transitions(paths, processes=2))
+        self.assertEqual(len(sequential), len(parallel))
+        self.assertEqual(sorted(t.action for t in sequential), sorted(t.action for t in parallel))
+
+
+if __name__ == '__main__':
+    main()
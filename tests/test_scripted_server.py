@@ -0,0 +1,81 @@
+from os.path import dirname, join
+from threading import Thread
+from unittest import TestCase, main
+
+import numpy as np
+
+from pokebattle_rl_env import PokeBattleEnv, VecPokeBattleEnv
+from pokebattle_rl_env.matchmaking import Matchmaker
+from pokebattle_rl_env.scripted_server import ScriptedShowdownServer, read_battle_scripts
+from pokebattle_rl_env.showdown_simulator import ShowdownSimulator
+
+BATTLE_EXAMPLE = join(dirname(dirname(__file__)), 'battle_example.txt')
+
+
+def play(env):
+    env.reset()
+    done = False
+    while not done:
+        _, _, done, _ = env.step(np.flatnonzero(env.action_mask[:9])[0])
+    return env.simulator.state.state
+
+
+class TestReadBattleScripts(TestCase):
+    def test_scripts(self):
+        with open(BATTLE_EXAMPLE, 'r', encoding='utf-8') as file:
+            scripts = read_battle_scripts(file.read())
+        self.assertEqual([(script.player, script.opponent) for script in scripts],
+                         [('fsedfs', 'rahul5006'), ('gfhjfgh', 'opponent')])
+        self.assertEqual(len(scripts[0].steps), 8)
+        for script in scripts:
+            self.assertIn('|init|battle', script.steps[0][0])
+        self.assertIn('|win|agent', ''.join(scripts[0].frames(len(scripts[0].steps) - 1, 'agent')))
+
+
+class TestScriptedShowdownServer(TestCase):
+    def setUp(self):
+        with open(BATTLE_EXAMPLE, 'r', encoding='utf-8') as file:
+            self.server = ScriptedShowdownServer(read_battle_scripts(file.read())[:1])
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_search(self):
+        env = PokeBattleEnv(ShowdownSimulator(connection=self.server.connection), action_mode='discrete')
+        try:
+            self.assertEqual([play(env) for _ in range(2)], ['win', 'win'])
+            self.assertEqual(env.simulator.room_id, 'battle-gen7unratedrandombattle-2')
+        finally:
+            env.close()
+
+    def test_self_play(self):
+        matchmaker = Matchmaker()
+        envs = [PokeBattleEnv(ShowdownSimulator(self_play=True, connection=self.server.connection,
+                                                matchmaker=matchmaker), action_mode='discrete') for _ in range(2)]
+        results = {}
+        threads = [Thread(target=lambda i=i: results.update({i: play(envs[i])})) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+        self.assertEqual(results, {0: 'win', 1: 'win'})  # Both replay the same script
+        self.assertEqual(envs[0].simulator.room_id, envs[1].simulator.room_id)
+        for env in envs:
+            env.close()
+
+    def test_vec_env(self):
+        env = VecPokeBattleEnv(8, connection=self.server.connection, action_mode='discrete')
+        try:
+            env.reset()
+            dones = np.zeros(8, dtype=bool)
+            for _ in range(7):
+                _, rewards, done, infos = env.step(env.get_action_masks()[:, :9].argmax(axis=1))
+                dones |= done
+            self.assertTrue(dones.all())
+        finally:
+            env.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+from multiprocessing import get_context
+from unittest import TestCase, main
+
+import numpy as np
+
+from pokebattle_rl_env.shared_observations import SharedObservationRing, pack_observations, unpack_observations
+
+
+def write_batch(spec, observations, queue):
+    ring = SharedObservationRing.attach(spec)
+    queue.put(pack_observations({'obs': observations, 'rewards': np.zeros(len(observations))}, ring, keys=('obs',)))
+    ring.close()
+
+
+def sample_batches(observations, queue, done):
+    """Packs two batches like a worker that owns its ring, see `SharedObservationEvaluator` in agent.py."""
+    ring = SharedObservationRing(capacity=8, shape=observations.shape[1:])
+    for batch_observations in np.split(observations, [4]):
+        batch = {'observations': batch_observations, 'actions': np.arange(len(batch_observations))}
+        queue.put((ring.spec, pack_observations(batch, ring, keys=('observations',))))
+    done.wait(30)
+    ring.close()
+
+
+class InterleavingRing(SharedObservationRing):
+    """Runs `interleave` after the first time :attr:`written` is read, i.e. between the validation and the copy of
+    :meth:`read`."""
+    interleave = None
+
+    @property
+    def written(self):
+        written = super().written
+        interleave, self.interleave = self.interleave, None
+        if interleave is not None:
+            interleave()
+        return written
+
+
+class TestSharedObservationRing(TestCase):
+    def setUp(self):
+        self.ring = SharedObservationRing(capacity=8, shape=(3,))
+
+    def tearDown(self):
+        self.ring.close()
+
+    def test_wrap_around(self):
+        first = self.ring.write(np.ones((6, 3)))
+        second = self.ring.write(np.arange(15).reshape(5, 3))
+        self.assertEqual(second.tolist(), [6, 7, 8, 9, 10])
+        self.assertTrue(np.array_equal(self.ring.read(second), np.arange(15).reshape(5, 3)))
+        view = self.ring.read(second[2:])  # Consecutive slots at the start of the ring
+        self.assertFalse(view.flags.owndata or view.flags.writeable)
+        del view
+        self.assertTrue(np.array_equal(self.ring.read(first[3:]), np.ones((3, 3))))
+        with self.assertRaises(ValueError):
+            self.ring.read(first[:3])  # Overwritten
+        with self.assertRaises(ValueError):
+            self.ring.read([11])  # Not written yet
+        with self.assertRaises(ValueError):
+            self.ring.write(np.zeros((9, 3)))
+
+    def test_concurrent_overwrite(self):
+        ring = InterleavingRing(capacity=8, shape=(3,))
+        try:
+            sequence_numbers = ring.write(np.ones((6, 3)))
+            ring.interleave = lambda: ring.write(np.zeros((4, 3)))
+            with self.assertRaises(ValueError):
+                ring.read(sequence_numbers[[0, 2, 4]])
+            self.assertTrue(ring.holds(sequence_numbers[2]))
+            self.assertFalse(ring.holds(sequence_numbers[1]))
+        finally:
+            ring.close()
+
+    def test_other_process(self):
+        observations = np.random.rand(5, 3).astype(np.float32)
+        context = get_context('spawn')
+        queue = context.Queue()
+        process = context.Process(target=write_batch, args=(self.ring.spec, observations, queue))
+        process.start()
+        batch = queue.get(timeout=30)
+        process.join()
+        self.assertEqual(batch['obs'].dtype, np.int64)
+        sequence_numbers = batch['obs']
+        batch = unpack_observations(batch, self.ring, keys=('obs',))
+        self.assertTrue(np.array_equal(batch['obs'], observations))
+        self.assertFalse(batch['obs'].flags.owndata)  # Zero-copy
+        copied = unpack_observations({'obs': sequence_numbers}, self.ring, keys=('obs',), copy=True)
+        del batch
+        self.ring.write(np.zeros((8, 3)))  # Overwrites the whole ring
+        self.assertTrue(np.array_equal(copied['obs'], observations))
+
+
+
+class TestPackedBatches(TestCase):
+    def test_worker_to_learner(self):
+        observations = np.random.rand(7, 2, 3).astype(np.float32)
+        context = get_context('spawn')
+        queue = context.Queue()
+        done = context.Event()
+        process = context.Process(target=sample_batches, args=(observations, queue, done))
+        process.start()
+        try:
+            spec, first = queue.get(timeout=30)
+            _, second = queue.get(timeout=30)
+            ring = SharedObservationRing.attach(spec)
+            self.assertEqual(first['observations'].tolist(), [0, 1, 2, 3])
+            batches = [unpack_observations(batch, ring, keys=('observations',)) for batch in (first, second)]
+            self.assertTrue(ring.holds(0))
+            batch = {key: np.concatenate([batch[key] for batch in batches]) for key in first}
+            del batches, first, second
+            ring.close()
+        finally:
+            done.set()
+            process.join()
+        self.assertTrue(np.array_equal(batch['observations'], observations))
+        self.assertEqual(batch['actions'].tolist(), [0, 1, 2, 3, 0, 1, 2])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
-from json import dumps
+from json import dumps, loads
 from os.path import dirname, join
 from unittest import TestCase, main
 from websocket import WebSocket
 
+import numpy as np
+
+from pokebattle_rl_env.matchmaking import Matchmaker
 from pokebattle_rl_env.showdown_simulator import *
 from pokebattle_rl_env.util import generate_username, generate_token
 
@@ -191,6 +194,79 @@ class TestUpdateState(TestCase):
         self.assertTrue(simulator.state.player.force_switch)
 
 
+class TestMessageHandlers(TestCase):
+    def test_custom_handler(self):
+        simulator = ShowdownSimulator()
+        crits = []
+        simulator.message_handlers['-crit'] = lambda simulator, info, msg: crits.append(info[2])
+        simulator.message_handlers['-customend'] = lambda simulator, info, msg: True
+        self.assertFalse(simulator._parse_message('>battle-1\n|init|battle\n|-crit|p2a: Metagross\n|-unknown|x'))
+        self.assertEqual(crits, ['p2a: Metagross'])
+        self.assertTrue(simulator._parse_message('>battle-1\n|-customend'))
+        self.assertNotIn('-crit', ShowdownSimulator().message_handlers)
+
+    def test_other_room(self):
+        simulator = ShowdownSimulator()
+        simulator._parse_message('>battle-1\n|init|battle')
+        self.assertFalse(simulator._parse_message('>battle-2\n|win|fsedfs'))
+        self.assertEqual(simulator.state.state, 'init')
+
+
+class ScriptedWebSocket:
+    """Records the sent commands and answers `recv` from a list of frames."""
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.sent = []
+
+    def send(self, cmd):
+        self.sent.append(cmd)
+
+    def recv(self):
+        return self.frames.pop(0)
+
+
+class TestReset(TestCase):
+    def test_reset_does_not_wait_for_teardown(self):
+        simulator = ShowdownSimulator()
+        simulator.username = 'fsedfs'
+        simulator.ws = ScriptedWebSocket([
+            '>battle-1\n|player|p2|rahul5006|1\n|win|rahul5006',
+            '>battle-1\n|deinit',
+            '|updatesearch|{"searching":[],"games":null}',
+            '>battle-2\n|init|battle\n|player|p1|fsedfs|1',
+            '>battle-2\n|turn|1',
+        ])
+        simulator._parse_message('>battle-1\n|init|battle\n|turn|1')
+        self.assertEqual(simulator.state.state, 'ongoing')
+        simulator.reset()
+        self.assertEqual(simulator.ws.sent[:3], ['battle-1|/forfeit', '|/leave battle-1',
+                                                 '|/search gen7unratedrandombattle'])
+        self.assertEqual(simulator.room_id, 'battle-2')
+        self.assertEqual(simulator.state.state, 'ongoing')
+        self.assertEqual(simulator.state.opponent.name, None)  # The old room's messages were skipped
+
+    def test_pipelined_reset(self):
+        simulator = ShowdownSimulator(pipelined_reset=True)
+        simulator.username = 'fsedfs'
+        simulator.ws = ScriptedWebSocket([
+            '>battle-1\n|win|fsedfs',
+            '>battle-2\n|init|battle',
+            '>battle-2\n|turn|1',
+        ])
+        simulator._parse_message('>battle-1\n|init|battle\n|player|p1|fsedfs|1\n|turn|1')
+        simulator._update_state()
+        self.assertEqual(simulator.state.state, 'win')
+        self.assertEqual(simulator.ws.sent, ['|/search gen7unratedrandombattle'])  # Before reset
+        simulator.reset()
+        self.assertEqual(simulator.ws.sent[1:], ['|/leave battle-1', 'battle-2|/timer on'])
+        self.assertEqual(simulator.room_id, 'battle-2')
+        self.assertFalse(simulator.next_battle_requested)
+
+    def test_close_unconnected(self):
+        simulator = ShowdownSimulator(self_play=True, matchmaker=Matchmaker())
+        simulator.close()
+
+
 class TestRequestJson(TestCase):
     def test_force_switch(self):
         with open(join(dirname(__file__), 'json', 'force_switch.json'), 'r') as file:
@@ -280,6 +356,45 @@ class TestRequestJson(TestCase):
         self.assertEqual(state.player.pokemon[0].moves[0].id, 'outrage')
         self.assertEqual(state.player.pokemon[0].moves[0].disabled, False)
 
+    def test_cache(self):
+        with open(join(dirname(__file__), 'json', 'trapped_2.json'), 'r') as file:
+            request = loads(file.read())
+        request['side']['pokemon'].append(dict(request['side']['pokemon'][0], active=False))
+        cached_state, state, cache = GameState(), GameState(), {}
+        read_state_json(dumps(request), cached_state, cache)
+        moves = cached_state.player.pokemon[0].moves
+        request['rqid'] += 1
+        request['active'][0]['moves'][0]['pp'] -= 1
+        request['side']['pokemon'][1]['condition'] = '1/300'
+        for json in [dumps(request)] * 2:
+            read_state_json(json, cached_state, cache)
+        read_state_json(dumps(request), state)
+        self.assertTrue((cached_state.to_array() == state.to_array()).all())
+        self.assertIs(cached_state.player.pokemon[0].moves, moves)  # Only PP updated
+        self.assertEqual(moves[0].pp, request['active'][0]['moves'][0]['pp'])
+        read_state_json(dumps(request), GameState(), cache)  # A new state is filled in completely
+
+    def test_cache_matches_uncached(self):
+        with open(join(dirname(__file__), 'json', 'trapped_2.json'), 'r') as file:
+            request = loads(file.read())
+        request['side']['pokemon'].append(dict(request['side']['pokemon'][0], active=False, condition='100/300 tox'))
+        cached_state, state, cache = GameState(), GameState(), {}
+
+        class Simulator:
+            def __init__(self, state):
+                self.state = state
+
+        for turn in range(3):
+            for current_state in [cached_state, state]:
+                handle_upkeep(Simulator(current_state), ['', 'upkeep'], '|upkeep')
+                if turn == 1:  # E.g. a transform
+                    current_state.player.pokemon[1].change_species('Ditto', np.random.RandomState(0))
+            read_state_json(dumps(request), cached_state, cache)
+            read_state_json(dumps(request), state)
+            self.assertTrue((cached_state.to_array() == state.to_array()).all())
+        toxic = state.player.pokemon[1].statuses[0]
+        self.assertEqual((toxic.name, toxic.turn), ('tox', 3))  # Counted by the upkeeps
+
 
 if __name__ == '__main__':
     main()
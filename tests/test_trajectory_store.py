@@ -0,0 +1,84 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+import numpy as np
+
+from pokebattle_rl_env.trajectory_store import TrajectoryReader, TrajectoryWriter
+
+
+def write_steps(directory, count, chunk_size):
+    with TrajectoryWriter(directory, chunk_size=chunk_size) as writer:
+        for i in range(count):
+            writer.append(observation={'categories': np.full(3, i, dtype=np.int32),
+                                       'numeric': np.full(2, i, dtype=np.float32)},
+                          action=(i % 9, 0), action_mask=np.arange(9) <= i % 9, reward=np.float32(i), done=i % 5 == 4)
+
+
+class TestTrajectoryStore(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        write_steps(self.directory.name, count=23, chunk_size=10)
+        self.reader = TrajectoryReader(self.directory.name)
+
+    def tearDown(self):
+        del self.reader
+        self.directory.cleanup()
+
+    def test_columns(self):
+        self.assertEqual(len(self.reader), 23)
+        self.assertEqual(set(self.reader.columns), {'observation.categories', 'observation.numeric', 'action',
+                                                    'action_mask', 'reward', 'done'})
+        self.assertEqual([len(chunk) for chunk in self.reader.columns['reward']], [10, 10, 3])
+        self.assertTrue((self.reader.column('reward') == np.arange(23)).all())
+
+    def test_random_access(self):
+        step = self.reader[14]
+        self.assertIsInstance(self.reader.columns['reward'][1], np.memmap)
+        self.assertTrue((step['observation.categories'] == 14).all())
+        self.assertEqual(tuple(step['action']), (5, 0))
+        self.assertEqual(step['action_mask'].sum(), 6)
+        self.assertTrue(step['done'])
+        with self.assertRaises(IndexError):
+            self.reader[23]
+
+    def test_batch(self):
+        batch = self.reader.get_batch([22, 0, 15, 3])
+        self.assertTrue((batch['reward'] == [22, 0, 15, 3]).all())
+        self.assertEqual(batch['observation.numeric'].shape, (4, 2))
+        self.assertEqual(batch['observation.numeric'].dtype, np.float32)
+        sample = self.reader.sample(8, random_state=np.random.RandomState(0))
+        self.assertEqual(sample['action_mask'].shape, (8, 9))
+        self.assertTrue((sample['observation.categories'][:, 0] == sample['reward']).all())
+
+    def test_inconsistent_columns(self):
+        with TemporaryDirectory() as directory:
+            writer = TrajectoryWriter(directory)
+            writer.append(observation=np.zeros(2), reward=0)
+            with self.assertRaises(ValueError):
+                writer.append(observation=np.zeros(2))
+
+    def test_inconsistent_dtype(self):
+        with TemporaryDirectory() as directory:
+            writer = TrajectoryWriter(directory)
+            writer.append(reward=0)
+            with self.assertRaises(ValueError):
+                writer.append(reward=0.75)
+
+    def test_inconsistent_shape(self):
+        with TemporaryDirectory() as directory:
+            writer = TrajectoryWriter(directory)
+            writer.append(observation=np.zeros(2))
+            with self.assertRaises(ValueError):
+                writer.append(observation=np.zeros(1))
+
+    def test_append_to_store(self):
+        write_steps(self.directory.name, count=4, chunk_size=10)
+        reader = TrajectoryReader(self.directory.name)
+        self.assertEqual(len(reader), 27)
+        self.assertEqual(reader.column('reward')[[0, 22, 23, 26]].tolist(), [0, 22, 0, 3])
+        self.assertEqual(reader.columns['action'][0].shape, (10, 2))
+        del reader
+
+
+if __name__ == '__main__':
+    main()
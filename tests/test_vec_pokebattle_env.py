@@ -0,0 +1,81 @@
+from json import dumps, loads
+from os.path import dirname, join
+from unittest import TestCase, main
+
+import numpy as np
+
+from pokebattle_rl_env import VecPokeBattleEnv
+from pokebattle_rl_env.profiling import Profiler
+from tests.test_async_showdown_simulator import FakeWebSocket, USERNAME
+
+
+class WinningWebSocket(FakeWebSocket):
+    """Lets the player win the second battle room with the first action."""
+    async def send(self, msg):
+        if msg.startswith('battle-gen7unratedrandombattle-2|/') and '/timer' not in msg:
+            self.sent.append(msg)
+            self.received.put_nowait(f'>battle-gen7unratedrandombattle-2\n|win|{USERNAME}')
+        else:
+            await super().send(msg)
+
+
+class TestVecPokeBattleEnv(TestCase):
+    def setUp(self):
+        with open(join(dirname(__file__), 'json', 'can_z_move.json'), 'r') as file:
+            request = dumps(loads(file.read()))
+        self.env = VecPokeBattleEnv(3)
+        self.ws = WinningWebSocket(request)
+
+        async def start():
+            client = self.env.clients[0]
+            client.username = USERNAME
+            client.start(self.ws)
+        self.env.loop.run_until_complete(start())
+
+    def tearDown(self):
+        self.env.close()
+
+    def test_step(self):
+        observations = self.env.reset()
+        self.assertEqual(observations.shape, (3,) + self.env.observation_space.shape)
+        actions = np.random.random((3,) + self.env.action_space.shape)
+        observations, rewards, dones, infos = self.env.step(actions)
+        self.assertEqual(observations.shape, (3,) + self.env.observation_space.shape)
+        self.assertEqual(dones.tolist(), [False, True, False])
+        self.assertEqual(rewards.tolist(), [0, 1, 0])
+        self.assertIn('terminal_observation', infos[1])
+        masks = self.env.get_action_masks()
+        self.assertEqual(masks.shape, (3,) + self.env.action_space.shape)
+        self.assertTrue(all((info['action_mask'] == mask).all() for info, mask in zip(infos, masks)))
+        self.assertEqual(self.env.envs[1].simulator.room_id, 'battle-gen7unratedrandombattle-4')
+        self.assertEqual(self.env.envs[1].simulator.state.state, 'ongoing')
+
+    def test_failed_env(self):
+        self.env.reset()
+        failing = self.env.envs[2].simulator
+
+        async def fail(action, modifiers):
+            raise ConnectionError('Lost the battle room')
+        failing.act = fail
+        observations, rewards, dones, infos = self.env.step(np.random.random((3,) + self.env.action_space.shape))
+        self.assertEqual(dones.tolist(), [False, True, True])
+        self.assertIsInstance(infos[2]['error'], ConnectionError)
+        self.assertIn('terminal_observation', infos[2])
+        self.assertNotIn('error', infos[0])
+        self.assertEqual(self.env.envs[0].simulator.state.turn, 2)
+        self.assertEqual(failing.state.state, 'ongoing')
+
+    def test_profiler(self):
+        self.env.profiler = Profiler(report_interval=1)
+        self.env.reset()
+        infos = self.env.step(np.random.random((3,) + self.env.action_space.shape))[3]
+        metrics = infos[0]['metrics']
+        self.assertEqual(metrics['counters']['steps'], 1)
+        self.assertEqual(metrics['counters']['env_steps'], 3)
+        self.assertEqual(metrics['phases']['step']['count'], 1)
+        self.assertEqual(metrics['phases']['decode']['count'], 3)
+        self.assertEqual(set(metrics['phases']), {'decode', 'act', 'encode', 'step'})
+
+
+if __name__ == '__main__':
+    main()